@@ -0,0 +1,498 @@
+"""代理图的持久化 checkpoint 与步骤缓存
+
+multi_agent.py 的监督者一次请求要经过多轮模型调用与工具调用，进程中途退出时已完成的步骤全部丢失。
+本模块提供基于标准库 sqlite3 的本地持久化组件，编译图时传入即可：
+
+- `SqliteSaver`：LangGraph checkpointer，每个超步结束后把状态写入 SQLite（WAL 模式）。按 thread_id
+  区分会话，子代理图继承父图的 checkpointer，内部的模型 / 工具步骤同样落盘；`max_checkpoints`
+  限制每个 (thread_id, 命名空间) 保留的 checkpoint 数，超出时删除最早的，早于最旧保留根 checkpoint
+  的子图 checkpoint 一并删除
+- `invoke_resumable()` / `ainvoke_resumable()`：同一 thread_id 上次运行未完成时，忽略新输入，
+  从最后完成的节点继续执行；否则按新输入开始一次运行
+- `SqliteModelCache`：模型调用缓存（`ChatOpenAI(cache=...)`）。相同模型参数与相同消息（忽略每次运行
+  随机生成的消息 id 与 tool_call id）的调用直接复用上次的回复，重复的子步骤不再请求模型，跨 thread、跨进程有效
+
+保留数只裁剪旧 checkpoint，不影响从最新 checkpoint 恢复；但裁剪后无法再回溯到被删除的历史状态。
+图中使用 DeltaChannel 时不要开启保留数裁剪（本仓库的图只使用 add_messages 等普通 reducer）。
+
+用法：
+    llm = ollama_client.get_chat_model(model, cache=SqliteModelCache("agent_checkpoints.sqlite"))
+    saver = SqliteSaver("agent_checkpoints.sqlite", max_checkpoints=50)
+    graph = create_supervisor(model=llm, agents=[...]).compile(checkpointer=saver)
+    invoke_resumable(graph, {"messages": [question]}, thread_id="job-42")
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+_CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+_MODEL_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def _connect(path: str, schema: str) -> sqlite3.Connection:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    # WAL + synchronous=NORMAL：每个超步一次小事务，不必每次都 fsync，进程崩溃不会丢已提交的数据
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema)
+    return conn
+
+
+def _thread_ns(config: Mapping[str, Any]) -> Tuple[str, str]:
+    configurable = config["configurable"]
+    return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """基于 sqlite3 的 checkpointer；同一进程内可在多个线程 / 事件循环中共用。"""
+
+    def __init__(self, path: str, max_checkpoints: Optional[int] = None, serde: Any = None) -> None:
+        super().__init__(serde=serde)
+        if max_checkpoints is not None and max_checkpoints < 1:
+            raise ValueError("max_checkpoints 至少为 1")
+        self.path = path
+        self.max_checkpoints = max_checkpoints
+        self._conn = _connect(path, _CHECKPOINT_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # ------------------------------------------------------------------ 读取
+
+    def _writes(self, thread_id: str, ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        rows = self._conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        rows.sort(key=lambda r: writes_sort_key(r[5], r[0], r[1]))
+        return [(r[0], r[2], self.serde.loads_typed((r[3], r[4]))) for r in rows]
+
+    def _tuple(self, thread_id: str, ns: str, row: Sequence[Any]) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+
+        def config(cid: str) -> Dict[str, Any]:
+            return {
+                "configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": cid}
+            }
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config(parent_id) if parent_id else None,
+            pending_writes=self._writes(thread_id, ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
+        thread_id, ns = _thread_ns(config)
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, ns),
+                ).fetchone()
+            return self._tuple(thread_id, ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[Dict[str, Any]],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+                f"checkpoint, metadata_type, metadata FROM checkpoints {where} "
+                "ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+            tuples = []
+            for row in rows:
+                if limit is not None and len(tuples) >= limit:
+                    break
+                item = self._tuple(row[0], row[1], row[2:])
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                tuples.append(item)
+        yield from tuples
+
+    # ------------------------------------------------------------------ 写入
+
+    def put(
+        self,
+        config: Dict[str, Any],
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> Dict[str, Any]:
+        thread_id, ns = _thread_ns(config)
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob),
+            )
+            if self.max_checkpoints is not None:
+                self._trim(thread_id, ns, self.max_checkpoints)
+        return {
+            "configurable": {
+                "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]
+            }
+        }
+
+    def put_writes(
+        self,
+        config: Dict[str, Any],
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id, ns = _thread_ns(config)
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, i)
+            rows.append((idx, (thread_id, ns, checkpoint_id, task_id, idx, channel,
+                               *self.serde.dumps_typed(value), task_path)))
+        with self._transaction() as conn:
+            for idx, row in rows:
+                # 普通写入只记录第一次（与 InMemorySaver 一致），错误 / 中断等特殊写入覆盖旧值
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                conn.execute(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def _trim(self, thread_id: str, ns: str, keep: int) -> None:
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, ns, keep),
+        )]
+        for checkpoint_id in stale:
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(
+                    f"DELETE FROM {table} "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, ns, checkpoint_id),
+                )
+        if ns or not stale:
+            return
+        # 子图的命名空间带任务 id，每次调用都不同；早于最旧的保留根 checkpoint 的子图状态
+        # 已经汇总进根 checkpoint，恢复时不再需要（checkpoint id 按时间递增，可跨命名空间比较）
+        oldest = self._conn.execute(
+            "SELECT MIN(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+            (thread_id,),
+        ).fetchone()[0]
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} "
+                "WHERE thread_id = ? AND checkpoint_ns != '' AND checkpoint_id < ?",
+                (thread_id, oldest),
+            )
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """keep_latest 只保留每个命名空间最新的 checkpoint，delete 删除整个 thread。"""
+        if strategy == "delete":
+            for thread_id in thread_ids:
+                self.delete_thread(thread_id)
+            return
+        if strategy != "keep_latest":
+            raise ValueError(f"未知的 prune 策略: {strategy}")
+        with self._transaction() as conn:
+            for thread_id in thread_ids:
+                namespaces = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?",
+                    (str(thread_id),),
+                )]
+                for ns in namespaces:
+                    self._trim(str(thread_id), ns, 1)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._transaction() as conn:
+            for table in ("checkpoints", "writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),))
+
+    def count(self, thread_id: Optional[str] = None) -> int:
+        """checkpoint 数（不指定 thread_id 时统计全部）。"""
+        with self._lock:
+            if thread_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (str(thread_id),)
+            ).fetchone()[0]
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ------------------------------------------------------------------ 异步接口（在线程中执行，避免阻塞事件循环）
+
+    async def aget_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[Dict[str, Any]],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: Dict[str, Any],
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: Dict[str, Any],
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
+
+
+# 参与缓存键的消息字段；response_metadata / usage_metadata 等每次回复都不同，不影响模型输入的语义
+_KEY_FIELDS = ("type", "content", "name", "tool_calls", "tool_call_id", "status")
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """只保留消息的语义字段，去掉消息 id，并把 tool_call id 按出现顺序重新编号。"""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    call_ids: Dict[str, str] = {}
+
+    def call_id(value: Any) -> Any:
+        return call_ids.setdefault(value, f"call_{len(call_ids)}") if value else value
+
+    normalized = []
+    for message in messages:
+        kwargs = message.get("kwargs") if isinstance(message, dict) else None
+        if not isinstance(kwargs, dict):
+            normalized.append(message)
+            continue
+        fields = {k: kwargs[k] for k in _KEY_FIELDS if kwargs.get(k)}
+        if "tool_calls" in fields:
+            fields["tool_calls"] = [
+                {"name": c.get("name"), "args": c.get("args"), "id": call_id(c.get("id"))}
+                for c in fields["tool_calls"]
+            ]
+        if "tool_call_id" in fields:
+            fields["tool_call_id"] = call_id(fields["tool_call_id"])
+        normalized.append(fields)
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+class SqliteModelCache(BaseCache):
+    """模型调用缓存：相同的模型参数 + 相同的消息（忽略消息 id 与 tool_call id）直接复用上次的回复。
+
+    作为 `ChatOpenAI(cache=...)` 使用，代理内部的每次模型调用都会先查缓存，跨 thread、跨进程有效。
+    ttl 为条目有效期（秒，None 表示不过期），max_entries 限制条目数，超出时删除最早写入的。
+    """
+
+    def __init__(
+        self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = None
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = _connect(path, _MODEL_CACHE_SCHEMA)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        payload = f"{llm_string}\n{_normalize_prompt(prompt)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM model_cache WHERE key = ?", (key,)
+            ).fetchone()
+            expired = row is not None and self.ttl is not None and row[1] + self.ttl <= time.time()
+            self.stats["misses" if row is None or expired else "hits"] += 1
+        if row is None or expired:
+            return None
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            return loads(row[0], allowed_objects="core")
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        value = dumps(list(return_val))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO model_cache VALUES (?, ?, ?)",
+                (self._key(prompt, llm_string), value, time.time()),
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM model_cache WHERE key IN (SELECT key FROM model_cache "
+                    "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM model_cache")
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(
+        self, prompt: str, llm_string: str, return_val: Sequence[Generation]
+    ) -> None:
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear)
+
+
+def thread_config(thread_id: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), "thread_id": thread_id}
+    return config
+
+
+def invoke_resumable(
+    graph: Any, inputs: Any, thread_id: str, config: Optional[Dict[str, Any]] = None
+) -> Any:
+    """上次运行未完成（还有待执行的节点）时从最后完成的节点继续，否则按 inputs 开始新的运行。"""
+    config = thread_config(thread_id, config)
+    if graph.get_state(config).next:
+        inputs = None
+    return graph.invoke(inputs, config)
+
+
+async def ainvoke_resumable(
+    graph: Any, inputs: Any, thread_id: str, config: Optional[Dict[str, Any]] = None
+) -> Any:
+    config = thread_config(thread_id, config)
+    if (await graph.aget_state(config)).next:
+        inputs = None
+    return await graph.ainvoke(inputs, config)
@@ -0,0 +1,160 @@
+"""并行扇出的多 Agent 监督者
+
+multi_agent.py 中 `create_supervisor` 的主管被要求“一次将工作分配给一个代理”，同时需要
+math_agent 与 datetime_agent 的请求只能串行：主管 → 代理 A → 主管 → 代理 B → 主管，每一跳都是完整的模型往返。
+`build_fanout_supervisor()` 构建 plan → 并行分支 → join 的图：
+
+- plan：主管模型调用一次，把用户指令拆成相互独立的子任务，每个子任务是一次 `assign_<代理名>(task)`
+  工具调用（允许同时调用多个）；没有子任务时直接回答
+- 扇出：用 LangGraph 的 `Send` 把每个子任务发给对应代理节点，同一超步内的分支并发执行
+  （同步 invoke 在线程池中并行，异步 ainvoke 在事件循环中并发）
+- join：各分支结果经 reducer 汇总到 `results`，主管模型再调用一次整合为最终回答；
+  plan 每轮先清空 `results`，配合 checkpointer 多轮对话时上一轮的子任务结果不会混入本轮
+
+子任务之间有先后依赖（如“先取当前时间再据此计算”）时仍应使用串行的 supervisor。
+"""
+
+import operator
+from dataclasses import dataclass
+from typing import Annotated, Any, Dict, List, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.types import Overwrite, Send
+
+ASSIGN_PREFIX = "assign_"
+
+PLANNER_PROMPT = (
+    "你是管理多个代理的主管。先把用户的指令拆解成相互独立的子任务，"
+    "再为每个子任务调用一次对应代理的 assign 工具，task 参数需包含完成该子任务所需的全部信息。"
+    "相互独立的子任务请在同一次回复中同时分配。不要自己做任何工作。"
+)
+JOIN_PROMPT = "你是主管。根据各代理返回的子任务结果，直接给出对用户问题的完整回答，不要再分配任务。"
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """可被分配子任务的代理：名称、已编译的代理图与能力说明（作为 assign 工具的描述）。"""
+
+    name: str
+    graph: Any
+    description: str
+
+
+class FanoutState(TypedDict, total=False):
+    messages: Annotated[List[AnyMessage], add_messages]
+    subtasks: List[Dict[str, str]]
+    results: Annotated[List[Dict[str, str]], operator.add]
+
+
+def _assign_tool(spec: AgentSpec) -> Dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": f"{ASSIGN_PREFIX}{spec.name}",
+            "description": spec.description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "task": {"type": "string", "description": "分配给该代理的子任务"},
+                },
+                "required": ["task"],
+            },
+        },
+    }
+
+
+def _last_user_text(messages: Sequence[AnyMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.text
+    return ""
+
+
+def last_text(messages: Sequence[AnyMessage]) -> str:
+    """代理图输出中最后一条 AI 消息的文本。"""
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.text:
+            return message.text
+    return ""
+
+
+def format_results(results: Sequence[Dict[str, str]]) -> str:
+    return "\n".join(f"- [{r['agent']}] {r['task']}: {r['answer']}" for r in results)
+
+
+def build_fanout_supervisor(model: Any, agents: Sequence[AgentSpec], checkpointer: Any = None):
+    """构建并编译 plan → 并行代理分支 → join 的监督者图；传入 checkpointer 时按 thread_id 保存多轮状态。"""
+    by_name = {spec.name: spec for spec in agents}
+    planner = model.bind_tools([_assign_tool(spec) for spec in agents])
+
+    def _subtasks(state: FanoutState, response: AIMessage) -> Dict[str, Any]:
+        # results 的 reducer 是累加，用 Overwrite 绕过它清空上一轮的结果
+        update: Dict[str, Any] = {"results": Overwrite([])}
+        subtasks = []
+        for i, call in enumerate(response.tool_calls):
+            agent = call["name"][len(ASSIGN_PREFIX):]
+            if call["name"].startswith(ASSIGN_PREFIX) and agent in by_name:
+                task = (call.get("args") or {}).get("task") or _last_user_text(state["messages"])
+                subtasks.append({"id": call.get("id") or f"task_{i}", "agent": agent, "task": task})
+        if not subtasks:
+            # 不需要代理时主管直接回答
+            return {**update, "subtasks": [], "messages": [AIMessage(content=response.content)]}
+        return {**update, "subtasks": subtasks}
+
+    def plan(state: FanoutState) -> Dict[str, Any]:
+        return _subtasks(state, planner.invoke([SystemMessage(PLANNER_PROMPT), *state["messages"]]))
+
+    async def aplan(state: FanoutState) -> Dict[str, Any]:
+        response = await planner.ainvoke([SystemMessage(PLANNER_PROMPT), *state["messages"]])
+        return _subtasks(state, response)
+
+    def fan_out(state: FanoutState):
+        subtasks = state.get("subtasks") or []
+        if not subtasks:
+            return END
+        return [Send(task["agent"], task) for task in subtasks]
+
+    def _branch(spec: AgentSpec):
+        def result(task: Dict[str, str], output: Dict[str, Any]) -> Dict[str, Any]:
+            return {"results": [{**task, "answer": last_text(output["messages"])}]}
+
+        def run(task: Dict[str, str], config: RunnableConfig) -> Dict[str, Any]:
+            output = spec.graph.invoke({"messages": [HumanMessage(task["task"])]}, config)
+            return result(task, output)
+
+        async def arun(task: Dict[str, str], config: RunnableConfig) -> Dict[str, Any]:
+            output = await spec.graph.ainvoke({"messages": [HumanMessage(task["task"])]}, config)
+            return result(task, output)
+
+        return RunnableLambda(run, afunc=arun, name=spec.name)
+
+    def _join_messages(state: FanoutState) -> List[AnyMessage]:
+        order = {task["id"]: i for i, task in enumerate(state.get("subtasks") or [])}
+        results = sorted(state.get("results") or [], key=lambda r: order.get(r["id"], len(order)))
+        return [
+            SystemMessage(JOIN_PROMPT),
+            *state["messages"],
+            HumanMessage(f"子任务结果:\n{format_results(results)}"),
+        ]
+
+    def join(state: FanoutState) -> Dict[str, Any]:
+        response = model.invoke(_join_messages(state))
+        return {"messages": [AIMessage(content=response.content, name="supervisor")]}
+
+    async def ajoin(state: FanoutState) -> Dict[str, Any]:
+        response = await model.ainvoke(_join_messages(state))
+        return {"messages": [AIMessage(content=response.content, name="supervisor")]}
+
+    graph = StateGraph(FanoutState)
+    graph.add_node("plan", RunnableLambda(plan, afunc=aplan, name="plan"))
+    graph.add_node("join", RunnableLambda(join, afunc=ajoin, name="join"))
+    graph.add_edge(START, "plan")
+    graph.add_conditional_edges("plan", fan_out, [*by_name, END])
+    for spec in agents:
+        graph.add_node(spec.name, _branch(spec))
+        graph.add_edge(spec.name, "join")
+    graph.add_edge("join", END)
+    return graph.compile(checkpointer=checkpointer, name="fanout_supervisor")
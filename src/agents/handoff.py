@@ -0,0 +1,111 @@
+"""精简交接（lean handoff）的监督者
+
+`create_supervisor(..., output_mode="full_history")` 会把子代理内部的工具调用往返全部拷回主管上下文，
+之后每次路由决策都要重新 prefill 这些消息；子代理也会收到主管的完整历史。`build_lean_supervisor()` 改为：
+
+- 交接工具 `transfer_to_<代理名>(task)` 要求主管写明子任务，子代理只收到这一条任务消息
+- 子代理完成后只把最终回答（截断到 max_result_chars）作为一条带代理名的 AI 消息返回给主管，
+  不追加 handoff back 消息，中间的工具调用不会进入主管上下文
+- 主管的上下文因此只随“分配次数 × 结果摘要长度”增长，与子代理内部的调用轮数无关
+
+配合 `src.agents.token_usage.TokenUsageCallback` 可以按角色查看每次请求的 token 用量。
+"""
+
+from typing import Annotated, Any, Dict, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool, InjectedToolCallId, tool
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import InjectedState
+from langgraph.types import Command
+from langgraph_supervisor import create_supervisor
+from langgraph_supervisor.handoff import METADATA_KEY_HANDOFF_DESTINATION
+
+from src.agents.fanout import AgentSpec, last_text
+
+HANDOFF_PREFIX = "transfer_to_"
+
+
+def create_task_handoff_tool(agent_name: str, description: Optional[str] = None) -> BaseTool:
+    """创建带 task 参数的交接工具：主管必须写明交给代理的子任务。"""
+    name = f"{HANDOFF_PREFIX}{agent_name}"
+
+    @tool(name, description=description or f"把子任务交给 {agent_name}")
+    def handoff(
+        task: Annotated[str, "交给该代理的子任务，需包含完成所需的全部信息"],
+        state: Annotated[dict, InjectedState],
+        tool_call_id: Annotated[str, InjectedToolCallId],
+    ) -> Command:
+        tool_message = ToolMessage(
+            content=f"已交给 {agent_name}",
+            name=name,
+            tool_call_id=tool_call_id,
+            response_metadata={METADATA_KEY_HANDOFF_DESTINATION: agent_name},
+        )
+        return Command(
+            goto=agent_name,
+            graph=Command.PARENT,
+            update={**state, "messages": state["messages"] + [tool_message]},
+        )
+
+    handoff.metadata = {METADATA_KEY_HANDOFF_DESTINATION: agent_name}
+    return handoff
+
+
+def handoff_task(messages: Sequence[AnyMessage], agent_name: str) -> str:
+    """取出主管最近一次交给该代理的 task；没有时回退为最后一条用户消息。"""
+    name = f"{HANDOFF_PREFIX}{agent_name}"
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            for call in reversed(message.tool_calls):
+                if call["name"] == name and (call.get("args") or {}).get("task"):
+                    return call["args"]["task"]
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.text
+    return ""
+
+
+def compact_result(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[: max_chars - 1] + "…"
+
+
+def lean_agent(spec: AgentSpec, max_result_chars: int = 200):
+    """把代理包装成只接收 task、只返回结果摘要的子图（名称与原代理相同）。"""
+
+    def result(output: Dict[str, Any]) -> Dict[str, Any]:
+        summary = compact_result(last_text(output["messages"]), max_result_chars)
+        return {"messages": [AIMessage(content=summary, name=spec.name)]}
+
+    def run(state: MessagesState, config: RunnableConfig) -> Dict[str, Any]:
+        task = handoff_task(state["messages"], spec.name)
+        return result(spec.graph.invoke({"messages": [HumanMessage(task)]}, config))
+
+    async def arun(state: MessagesState, config: RunnableConfig) -> Dict[str, Any]:
+        task = handoff_task(state["messages"], spec.name)
+        return result(await spec.graph.ainvoke({"messages": [HumanMessage(task)]}, config))
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("run", RunnableLambda(run, afunc=arun, name=spec.name))
+    graph.add_edge(START, "run")
+    graph.add_edge("run", END)
+    return graph.compile(name=spec.name)
+
+
+def build_lean_supervisor(
+    model: Any,
+    agents: Sequence[AgentSpec],
+    prompt: Optional[str] = None,
+    max_result_chars: int = 200,
+):
+    """构建并编译精简交接模式的监督者图。"""
+    return create_supervisor(
+        model=model,
+        agents=[lean_agent(spec, max_result_chars) for spec in agents],
+        tools=[create_task_handoff_tool(spec.name, spec.description) for spec in agents],
+        prompt=prompt,
+        output_mode="last_message",
+        add_handoff_back_messages=False,
+    ).compile(name="lean_supervisor")
@@ -1,14 +1,37 @@
 import asyncio
+import os
 from typing import Type
 
 from langchain_core.tools import BaseTool
-from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
-from langgraph_supervisor import create_supervisor
+
+from src.common import ollama_client
+from src.common.lazy import LazyFactory
 
 ollama_model = "qwen3:4b"
-llm = ChatOpenAI(base_url = "http://127.0.0.1:11434/v1", model_name=ollama_model, api_key="ollama", temperature=0)
+
+# 模型、代理与各种监督者图都在首次访问（如 multi_agent.supervisor）时才构建并缓存，
+# langchain.agents、langgraph_supervisor 等重型依赖也推迟到对应的构建函数中导入
+factory = LazyFactory(__name__)
+ollama_client.on_close(factory.clear)
+__getattr__ = factory.module_getattr()
+
+
+# 模型分级：设置 AGENT_ROUTER_MODEL / AGENT_ANSWER_MODEL 后，路由与选工具用小模型、最终回答用大模型，
+# 小模型的工具调用未通过校验时自动升级；各角色的延迟与 token 记在 factory.get("tier_stats")
+@factory.register("tier_stats")
+def _build_tier_stats():
+    from src.common.model_tiers import TierStats
+
+    return TierStats()
+
+
+@factory.register("llm")
+def _build_llm():
+    from src.common.model_tiers import ModelTiers
+
+    tiers = ModelTiers.from_env("AGENT_", ollama_model)
+    return tiers.build(factory.get("tier_stats"), temperature=0)
 
 class AddArgs(BaseModel):
     """加法运算参数模型
@@ -37,7 +60,7 @@ class AddTool(BaseTool):
         return a + b
 
     async def _arun(self, a:int, b:int):
-        result = a - b
+        result = a + b
         print(f"异步调用: 正在计算{a} + {b}...")
         print(f"计算结果为: {result}")
         return a + b
@@ -63,7 +86,7 @@ class SubTool(BaseTool):
     args_schema : Type[BaseModel] = SubArgs
 
     def _run(self, a:int, b:int):
-        result = a + b
+        result = a - b
         print(f"同步调用:正在计算{a} - {b} = {result}")
         return result
 
@@ -73,6 +96,10 @@ class SubTool(BaseTool):
         return result
 
 
+class DatetimeArgs(BaseModel):
+    """时间工具参数模型（无参数）"""
+
+
 class DatetimeTool(BaseTool):
     """时间获取工具类
     
@@ -82,7 +109,7 @@ class DatetimeTool(BaseTool):
     """
     name: str = "get_current_time"
     description: str = "获取当前本地时间，格式为 YYYY-MM-DD HH:MM:SS。"
-    args_schema: Type[BaseModel] = BaseModel
+    args_schema: Type[BaseModel] = DatetimeArgs
 
     def _run(self):
         import datetime
@@ -97,33 +124,133 @@ class DatetimeTool(BaseTool):
         return current_time
 
 
-datetime_agent = create_agent(model=llm, tools=[DatetimeTool()], name="datetime_agent")
-math_agent = create_agent(model=llm, tools=[AddTool(), SubTool()], name="math_agent")
-supervisor = create_supervisor(model=llm, agents=[math_agent, datetime_agent], output_mode="full_history",
-                               prompt="""
+def _datetime_agent(llm):
+    from langchain.agents import create_agent
+
+    return create_agent(model=llm, tools=[DatetimeTool()], name="datetime_agent")
+
+
+def _math_agent(llm):
+    from langchain.agents import create_agent
+
+    return create_agent(model=llm, tools=[AddTool(), SubTool()], name="math_agent")
+
+
+factory.register("datetime_agent", lambda: _datetime_agent(factory.get("llm")))
+factory.register("math_agent", lambda: _math_agent(factory.get("llm")))
+
+
+SUPERVISOR_PROMPT = """
                                你是管理两个代理的主管: \n
                                - 时间代理 datetime: 将与时间相关的人物分配给此代理\n
                                - 数学代理 math: 将与数学计算相关的人物分配给此代理\n 
                                你需要先将用户的指令拆解成一个一个的子任务. 制定执行计划,再开始调用每个代理进行完成. \n
                                一次将工作分配给一个代理, 不要并行呼叫代理. \n 
                                不要自己做任何工作. \n
-                               """).compile()
+                               """
+
+
+def _supervisor_builder(llm, agents):
+    from langgraph_supervisor import create_supervisor
+
+    return create_supervisor(model=llm, agents=agents, output_mode="full_history",
+                             prompt=SUPERVISOR_PROMPT)
+
+
+@factory.register("supervisor")
+def _build_supervisor():
+    agents = [factory.get("math_agent"), factory.get("datetime_agent")]
+    return _supervisor_builder(factory.get("llm"), agents).compile()
+
+
+# 可恢复模式：每个超步（含子代理内部的模型 / 工具步骤）写入本地 SQLite，按 thread_id 恢复中断的运行；
+# 模型参数与消息完全相同的模型调用（如重复提交的同一请求）直接复用缓存的回复
+CHECKPOINT_DB = os.getenv("AGENT_CHECKPOINT_DB", "agent_checkpoints.sqlite")
+CHECKPOINT_RETENTION = int(os.getenv("AGENT_CHECKPOINT_RETENTION", "50"))
+MODEL_CACHE_TTL = float(os.getenv("AGENT_MODEL_CACHE_TTL", "86400"))
+
+
+@factory.register("durable_supervisor")
+def _build_durable_supervisor():
+    from src.agents.durable import SqliteModelCache, SqliteSaver
+    from src.common.model_tiers import ModelTiers
+
+    cache = SqliteModelCache(CHECKPOINT_DB, ttl=MODEL_CACHE_TTL)
+    tiers = ModelTiers.from_env("AGENT_", ollama_model)
+    llm = tiers.build(factory.get("tier_stats"), temperature=0, cache=cache)
+    agents = [_math_agent(llm), _datetime_agent(llm)]
+    saver = SqliteSaver(CHECKPOINT_DB, max_checkpoints=CHECKPOINT_RETENTION)
+    return _supervisor_builder(llm, agents).compile(checkpointer=saver, name="durable_supervisor")
+
+
+@factory.register("agent_specs")
+def _build_agent_specs():
+    from src.agents.fanout import AgentSpec
+
+    return [
+        AgentSpec("math_agent", factory.get("math_agent"), "数学代理: 负责加法、减法等数学计算"),
+        AgentSpec("datetime_agent", factory.get("datetime_agent"),
+                  "时间代理: 负责获取当前时间等与时间相关的任务"),
+    ]
+
+
+# 并行模式：主管一次规划出所有独立子任务，各代理作为并行分支同时执行，最后汇总回答
+@factory.register("parallel_supervisor")
+def _build_parallel_supervisor():
+    from src.agents.fanout import build_fanout_supervisor
+
+    return build_fanout_supervisor(factory.get("llm"), factory.get("agent_specs"))
+
+
+# 精简交接模式：子代理只收到分配的 task，主管只收到结果摘要，上下文不随子代理内部轮数增长
+@factory.register("lean_supervisor")
+def _build_lean_supervisor():
+    from src.agents.handoff import build_lean_supervisor
+
+    return build_lean_supervisor(factory.get("llm"), factory.get("agent_specs"),
+                                 prompt=SUPERVISOR_PROMPT)
+
+
+# 向量路由：与示例句足够相似的请求直接交给对应代理，跳过主管的路由调用；不确定时回退到 supervisor，
+# 并从 supervisor 的单代理路由结果中学习新示例
+ROUTER_EMBEDDING_MODEL = os.getenv("AGENT_ROUTER_EMBEDDING_MODEL", "turingdance/m3e-base")
+ROUTER_EXEMPLARS = {
+    "math_agent": ["请帮我计算一下123+10-4等于多少", "25加17等于几", "100减去37是多少"],
+    "datetime_agent": ["告诉我现在几点了?", "现在是什么时间", "今天是几月几号"],
+}
+
+
+@factory.register("router")
+def _build_router():
+    from src.agents.semantic_router import SemanticRouter
+
+    return SemanticRouter(
+        lambda text: ollama_client.embed(text, ROUTER_EMBEDDING_MODEL, timeout=30), ROUTER_EXEMPLARS
+    )
+
+
+@factory.register("routed_supervisor")
+def _build_routed_supervisor():
+    from src.agents.semantic_router import RoutedSupervisor
+
+    agents = {spec.name: spec.graph for spec in factory.get("agent_specs")}
+    return RoutedSupervisor(factory.get("router"), agents, factory.get("supervisor"))
 
 
 async def call_agent_1():
     print("call_agent_1")
     # TODO: 需要实现 supervisor 调用逻辑
-    res = await math_agent.ainvoke({"messages":["请帮我计算一下123+10-4等于多少"]})
+    res = await factory.get("math_agent").ainvoke({"messages":["请帮我计算一下123+10-4等于多少"]})
     print("TODO: 实现 supervisor 调用")
 
 def call_agent_2():
     print("call_agent_2")
     # TODO: 需要实现 supervisor 调用逻辑
-    res = math_agent.invoke({"messages":["请帮我计算一下123+10-4等于多少"]})
+    res = factory.get("math_agent").invoke({"messages":["请帮我计算一下123+10-4等于多少"]})
     print("TODO: 实现 supervisor 调用")
 
 
 if __name__ == '__main__':
     # asyncio.run(call_agent_1())
     # call_agent_2()
-    res = supervisor.invoke({"messages":["告诉我现在几点了?"]})
\ No newline at end of file
+    res = factory.get("supervisor").invoke({"messages":["告诉我现在几点了?"]})
\ No newline at end of file
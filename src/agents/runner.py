@@ -0,0 +1,273 @@
+"""代理图的高吞吐异步批量运行器
+
+single_agent.py 的 `call_agent_1` / `call_agent_2` 一次只处理一条消息。`AgentRunner` 把一队请求
+（算术、时间查询……）并发地推过同一个代理图：
+
+- `arun()`：每条请求一个 `ainvoke`，由信号量限制同时在途的请求数；可按 id 取消单条请求或全部取消，
+  也可为每条请求设置超时（超时按取消处理）
+- `abatch()`：交给 Runnable 的 `abatch(..., max_concurrency=N)` 执行，适用于 LangGraph 编译出的图
+- 两种方式都走图的异步路径：模型通过共享异步连接池调用（所有请求复用同一个 ChatOpenAI 与 httpx 连接池），
+  工具走 `BaseTool._arun`
+- `AgentRunReport` 汇总请求数、失败 / 取消数、吞吐（requests/s）、端到端延迟 p50/p95/p99、排队等待时间与工具调用次数
+
+用法：
+    python -m src.agents.runner --target multi_agent:routed_supervisor -n 200 -c 16
+    python -m src.agents.runner --target single_agent:agent -n 100 --mode abatch --json report.json
+
+并发上限建议不超过连接池大小（OLLAMA_MAX_CONNECTIONS），否则多出的请求只会在连接池中排队。
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from src.common.stats import LatencySummary
+
+DEFAULT_QUESTIONS = [
+    "请帮我计算一下123+10-4等于多少",
+    "告诉我现在几点了?",
+]
+
+
+@dataclass
+class AgentRequest:
+    """一条代理请求；timeout 为 None 时使用运行器的默认超时。"""
+
+    text: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    timeout: Optional[float] = None
+
+
+@dataclass
+class AgentResult:
+    """一条请求的结果与开销（elapsed 为拿到并发名额之后的耗时，queued 为排队等待时间）。"""
+
+    request: AgentRequest
+    output: Optional[Dict[str, Any]] = None
+    elapsed: float = 0.0
+    queued: float = 0.0
+    error: Optional[str] = None
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.cancelled
+
+    @property
+    def answer(self) -> str:
+        messages = (self.output or {}).get("messages") or []
+        return messages[-1].text if messages else ""
+
+    @property
+    def tool_calls(self) -> List[str]:
+        """本次请求中执行过的工具名（不含交接工具）。"""
+        return [
+            m.name for m in (self.output or {}).get("messages") or []
+            if m.type == "tool" and m.name and not m.name.startswith("transfer_")
+        ]
+
+
+@dataclass
+class AgentRunReport:
+    """一批代理请求的汇总指标。"""
+
+    requests: int
+    failures: int
+    cancelled: int
+    elapsed: float
+    latency: LatencySummary
+    queued: LatencySummary
+    tool_calls: Dict[str, int]
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def requests_per_second(self) -> float:
+        completed = self.requests - self.failures - self.cancelled
+        return completed / self.elapsed if self.elapsed else 0.0
+
+    @classmethod
+    def from_results(cls, results: List[AgentResult], elapsed: float) -> "AgentRunReport":
+        ok = [r for r in results if r.ok]
+        return cls(
+            requests=len(results),
+            failures=sum(r.error is not None for r in results),
+            cancelled=sum(r.cancelled for r in results),
+            elapsed=elapsed,
+            latency=LatencySummary.from_samples([r.elapsed for r in ok]),
+            queued=LatencySummary.from_samples([r.queued for r in ok]),
+            tool_calls=dict(Counter(name for r in ok for name in r.tool_calls)),
+            errors=[r.error for r in results if r.error][:10],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "elapsed_seconds": round(self.elapsed, 4),
+            "requests_per_second": round(self.requests_per_second, 3),
+            "latency": self.latency.to_dict(),
+            "queued": self.queued.to_dict(),
+            "tool_calls": self.tool_calls,
+            "errors": self.errors,
+        }
+
+    def format(self) -> str:
+        return (
+            f"请求数: {self.requests}（失败 {self.failures}, 取消 {self.cancelled}）, "
+            f"总耗时: {self.elapsed:.2f}s, 吞吐: {self.requests_per_second:.2f} req/s\n"
+            f"端到端延迟: {self.latency.format_ms()}\n"
+            f"排队等待: {self.queued.format_ms()}\n"
+            f"工具调用: {self.tool_calls}"
+        )
+
+
+def _as_request(request: Union[str, AgentRequest]) -> AgentRequest:
+    return request if isinstance(request, AgentRequest) else AgentRequest(request)
+
+
+class AgentRunner:
+    """在单个事件循环中并发运行代理图；同一运行器可多次调用 arun / abatch。"""
+
+    def __init__(
+        self,
+        graph: Any,
+        concurrency: int = 8,
+        timeout: Optional[float] = None,
+        config: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.graph = graph
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.config = config
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def cancel(self, request_id: str) -> bool:
+        """取消一条排队中或执行中的请求；请求不存在或已完成时返回 False。"""
+        task = self._tasks.get(request_id)
+        return task is not None and task.cancel()
+
+    def cancel_all(self) -> int:
+        return sum(task.cancel() for task in list(self._tasks.values()))
+
+    @property
+    def in_flight(self) -> List[str]:
+        return [rid for rid, task in self._tasks.items() if not task.done()]
+
+    async def _invoke(self, request: AgentRequest, queued: float) -> AgentResult:
+        result = AgentResult(request, queued=queued)
+        start = time.perf_counter()
+        timeout = request.timeout if request.timeout is not None else self.timeout
+        try:
+            call = self.graph.ainvoke({"messages": [request.text]}, self.config)
+            result.output = await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            result.cancelled = True
+        except Exception as e:  # noqa: BLE001  单条失败不影响整批
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def arun(self, requests: Iterable[Union[str, AgentRequest]]) -> AgentRunReport:
+        """每条请求一个 ainvoke，信号量限制同时在途的请求数。"""
+        requests = [_as_request(r) for r in requests]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(request: AgentRequest) -> AgentResult:
+            submitted = time.perf_counter()
+            async with semaphore:
+                return await self._invoke(request, time.perf_counter() - submitted)
+
+        start = time.perf_counter()
+        for request in requests:
+            self._tasks[request.id] = asyncio.ensure_future(run_one(request))
+        try:
+            results = []
+            for request in requests:
+                task = self._tasks[request.id]
+                try:
+                    results.append(await task)
+                except asyncio.CancelledError:
+                    # 只吞掉单条请求被取消的情况；整个 arun 被取消时继续向上抛出
+                    if asyncio.current_task().cancelling() or not task.cancelled():
+                        raise
+                    results.append(AgentResult(request, cancelled=True))
+        finally:
+            for request in requests:
+                task = self._tasks.pop(request.id, None)
+                if task is not None and not task.done():
+                    task.cancel()
+        return AgentRunReport.from_results(results, time.perf_counter() - start)
+
+    async def abatch(self, requests: Iterable[Union[str, AgentRequest]]) -> AgentRunReport:
+        """通过 Runnable.abatch 执行（max_concurrency 即并发上限）；图没有 abatch 时改用 arun。"""
+        if not hasattr(self.graph, "abatch"):
+            return await self.arun(requests)
+        requests = [_as_request(r) for r in requests]
+        config = {**(self.config or {}), "max_concurrency": self.concurrency}
+        start = time.perf_counter()
+        outputs = await self.graph.abatch(
+            [{"messages": [r.text]} for r in requests], config, return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+        results = []
+        for request, output in zip(requests, outputs):
+            # abatch 不提供逐条耗时，逐条延迟记为整批耗时
+            if isinstance(output, BaseException):
+                results.append(AgentResult(
+                    request, elapsed=elapsed, error=f"{type(output).__name__}: {output}"
+                ))
+            else:
+                results.append(AgentResult(request, output=output, elapsed=elapsed))
+        return AgentRunReport.from_results(results, elapsed)
+
+
+def build_requests(questions: List[str], n: int) -> List[AgentRequest]:
+    """循环使用问题列表构造 n 条请求。"""
+    return [AgentRequest(q) for q in itertools.islice(itertools.cycle(questions), n)]
+
+
+def load_target(target: str) -> Any:
+    """按 `模块:属性` 取出代理图，如 `multi_agent:routed_supervisor`（模块名相对 src.agents）。"""
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(f"src.agents.{module_name}")
+    return getattr(module, attr or "agent")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="代理图异步批量运行器")
+    parser.add_argument("--target", default="multi_agent:routed_supervisor",
+                        help="模块:属性，如 single_agent:agent、multi_agent:math_agent")
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, help="单条请求超时（秒），超时按取消处理")
+    parser.add_argument("--mode", choices=["ainvoke", "abatch"], default="ainvoke")
+    parser.add_argument("--questions", help="问题文件，每行一个；默认交替使用算术与时间问题")
+    parser.add_argument("--json", dest="json_path", help="把报告写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+    runner = AgentRunner(load_target(args.target), args.concurrency, args.timeout)
+    requests = build_requests(questions, args.requests)
+    run = runner.abatch if args.mode == "abatch" else runner.arun
+    report = asyncio.run(run(requests))
+
+    print(report.format())
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""基于向量相似度的代理路由缓存
+
+multi_agent.py 的 supervisor 对每个请求都要先花一次完整的 qwen3:4b 调用，只为在 math_agent 与
+datetime_agent 之间做选择。`SemanticRouter` 把请求向量化后与带标签的示例句比较：
+
+- 最相似示例的得分不低于 threshold，且领先其它代理的最佳得分至少 margin 时视为确定，
+  `RoutedSupervisor` 直接调用对应代理图，省掉主管的路由调用
+- 否则（多段请求、未见过的问法）回退到 LLM supervisor；主管本次只交给了一个代理时，
+  把 (请求, 代理) 记为新示例，之后相同或相近的请求直接命中
+- 每个代理的学习示例数有上限，超出时淘汰最早学到的（初始示例始终保留）
+- `astream_events` 同样先路由，命中时先产出一条 `route` 自定义事件（供 streaming.py 报告路由决策）
+
+embedder 与 fast_path 相同，是 `text -> 向量` 的函数；初始示例在第一次路由时才向量化。
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agents.handoff import HANDOFF_PREFIX
+
+Embedder = Callable[[str], Sequence[float]]
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+@dataclass
+class Exemplar:
+    text: str
+    agent: str
+    vector: List[float]
+    learned: bool = False
+
+
+@dataclass
+class RouteDecision:
+    """agent 为 None 表示不确定，需要回退到 supervisor。"""
+
+    agent: Optional[str]
+    score: float
+    margin: float
+    nearest: Optional[str] = None
+
+
+class SemanticRouter:
+    """按示例句向量相似度选择代理，并从 supervisor 的路由结果中学习。"""
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        exemplars: Mapping[str, Sequence[str]],
+        threshold: float = 0.82,
+        margin: float = 0.05,
+        max_learned_per_agent: int = 200,
+    ) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.margin = margin
+        self.max_learned_per_agent = max_learned_per_agent
+        self._seeds = {agent: list(texts) for agent, texts in exemplars.items()}
+        self._exemplars: Optional[List[Exemplar]] = None
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "fallbacks": 0, "learned": 0}
+
+    def _ensure_exemplars(self) -> List[Exemplar]:
+        if self._exemplars is None:
+            seeds = [
+                Exemplar(text, agent, _normalize(self.embedder(text)))
+                for agent, texts in self._seeds.items()
+                for text in texts
+            ]
+            with self._lock:
+                if self._exemplars is None:
+                    self._exemplars = seeds
+        return self._exemplars
+
+    @property
+    def agents(self) -> List[str]:
+        return list(self._seeds)
+
+    def decide(self, vector: Sequence[float]) -> RouteDecision:
+        """按已向量化的请求做路由决策。"""
+        vector = _normalize(vector)
+        best: Dict[str, float] = {}
+        nearest: Dict[str, str] = {}
+        self._ensure_exemplars()
+        with self._lock:
+            exemplars = list(self._exemplars)
+        for exemplar in exemplars:
+            score = _dot(vector, exemplar.vector)
+            if score > best.get(exemplar.agent, -1.0):
+                best[exemplar.agent] = score
+                nearest[exemplar.agent] = exemplar.text
+        if not best:
+            return RouteDecision(None, 0.0, 0.0)
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        agent, score = ranked[0]
+        margin = score - ranked[1][1] if len(ranked) > 1 else score
+        confident = score >= self.threshold and margin >= self.margin
+        return RouteDecision(agent if confident else None, score, margin, nearest[agent])
+
+    def route(self, text: str) -> RouteDecision:
+        return self.decide(self.embedder(text))
+
+    def record(self, routed: bool, seconds: float) -> None:
+        """记录一次请求走的是直接路由还是 supervisor 回退，以及端到端耗时。"""
+        with self._lock:
+            self.stats["routed" if routed else "fallbacks"] += 1
+            key = "routed_seconds" if routed else "fallback_seconds"
+            self.stats[key] = self.stats.get(key, 0.0) + seconds
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["routed"] + self.stats["fallbacks"]
+        return self.stats["routed"] / total if total else 0.0
+
+    def learn(self, text: str, agent: str, vector: Optional[Sequence[float]] = None) -> None:
+        """把 supervisor 的一次路由结果记为示例。"""
+        vector = _normalize(vector if vector is not None else self.embedder(text))
+        exemplars = self._ensure_exemplars()
+        with self._lock:
+            if any(e.agent == agent and e.text == text for e in exemplars):
+                return
+            exemplars.append(Exemplar(text, agent, vector, learned=True))
+            learned = [e for e in exemplars if e.learned and e.agent == agent]
+            if len(learned) > self.max_learned_per_agent:
+                exemplars.remove(learned[0])
+            self.stats["learned"] += 1
+
+    def save(self, path: str) -> None:
+        """保存学到的示例（含向量），下次启动用 load 恢复。"""
+        with self._lock:
+            learned = [
+                {"text": e.text, "agent": e.agent, "vector": e.vector}
+                for e in self._exemplars or []
+                if e.learned
+            ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(learned, f, ensure_ascii=False)
+
+    def load(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                self.learn(item["text"], item["agent"], item["vector"])
+
+
+def request_text(state: Mapping[str, Any]) -> str:
+    """取出输入中最后一条用户消息的文本（兼容字符串、消息对象与 dict）。"""
+    for message in reversed(state.get("messages") or []):
+        if isinstance(message, str):
+            return message
+        if isinstance(message, HumanMessage):
+            return message.text
+        if isinstance(message, dict) and message.get("role") in ("user", "human"):
+            return message.get("content") or ""
+    return ""
+
+
+def routed_agents(messages: Sequence[Any]) -> List[str]:
+    """supervisor 输出中依次交接过的代理名（去重、保持顺序）。"""
+    agents: List[str] = []
+    for message in messages:
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                if call["name"].startswith(HANDOFF_PREFIX):
+                    agent = call["name"][len(HANDOFF_PREFIX):]
+                    if agent not in agents:
+                        agents.append(agent)
+    return agents
+
+
+class RoutedSupervisor:
+    """在 supervisor 之前加一层向量路由：确定的请求直接交给代理图，其余回退到 supervisor。"""
+
+    def __init__(
+        self,
+        router: SemanticRouter,
+        agents: Mapping[str, Any],
+        supervisor: Any,
+    ) -> None:
+        self.router = router
+        self.agents = dict(agents)
+        self.supervisor = supervisor
+
+    def _learn(self, text: str, vector: Sequence[float], output: Mapping[str, Any]) -> None:
+        agents = routed_agents(output.get("messages") or [])
+        # 只从单代理请求中学习；多段请求交给多个代理，不能代表任何一个代理
+        if len(agents) == 1 and agents[0] in self.agents:
+            self.router.learn(text, agents[0], vector)
+
+    def invoke(self, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Any:
+        start = time.perf_counter()
+        text = request_text(state)
+        vector = self.router.embedder(text)
+        decision = self.router.decide(vector)
+        if decision.agent is not None and decision.agent in self.agents:
+            output = self.agents[decision.agent].invoke(state, config)
+            self.router.record(True, time.perf_counter() - start)
+            return output
+        output = self.supervisor.invoke(state, config)
+        self._learn(text, vector, output)
+        self.router.record(False, time.perf_counter() - start)
+        return output
+
+    async def ainvoke(self, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Any:
+        start = time.perf_counter()
+        text = request_text(state)
+        vector = await asyncio.to_thread(self.router.embedder, text)
+        decision = await asyncio.to_thread(self.router.decide, vector)
+        if decision.agent is not None and decision.agent in self.agents:
+            output = await self.agents[decision.agent].ainvoke(state, config)
+            self.router.record(True, time.perf_counter() - start)
+            return output
+        output = await self.supervisor.ainvoke(state, config)
+        self._learn(text, vector, output)
+        self.router.record(False, time.perf_counter() - start)
+        return output
+
+    async def abatch(
+        self,
+        states: Sequence[Dict[str, Any]],
+        config: Optional[Dict[str, Any]] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """与 Runnable.abatch 相同的接口：逐条 ainvoke，config 中的 max_concurrency 限制并发。"""
+        config = dict(config or {})
+        semaphore = asyncio.Semaphore(config.pop("max_concurrency", None) or len(states) or 1)
+
+        async def run_one(state: Dict[str, Any]) -> Any:
+            async with semaphore:
+                return await self.ainvoke(state, config)
+
+        return list(await asyncio.gather(
+            *(run_one(state) for state in states), return_exceptions=return_exceptions
+        ))
+
+    async def astream_events(
+        self, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式版本：命中时先产出一条 `route` 自定义事件，再转发所选代理图的 astream_events。"""
+        start = time.perf_counter()
+        text = request_text(state)
+        vector = await asyncio.to_thread(self.router.embedder, text)
+        decision = await asyncio.to_thread(self.router.decide, vector)
+        if decision.agent is not None and decision.agent in self.agents:
+            yield {
+                "event": "on_custom_event",
+                "name": "route",
+                "run_id": "",
+                "parent_ids": [],
+                "tags": [],
+                "metadata": {"langgraph_node": "semantic_router"},
+                "data": {"to": decision.agent, "score": round(decision.score, 4)},
+            }
+            async for event in self.agents[decision.agent].astream_events(state, config, **kwargs):
+                yield event
+            self.router.record(True, time.perf_counter() - start)
+            return
+        output = None
+        async for event in self.supervisor.astream_events(state, config, **kwargs):
+            if event["event"] == "on_chain_end" and not event["parent_ids"]:
+                output = event["data"].get("output")
+            yield event
+        if output is not None:
+            self._learn(text, vector, output)
+        self.router.record(False, time.perf_counter() - start)
@@ -2,12 +2,35 @@ import asyncio
 from typing import Type
 
 from langchain_core.tools import BaseTool
-from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from src.common import ollama_client
+from src.common.lazy import LazyFactory
+
 ollama_model = "qwen3:4b"
-llm = ChatOpenAI(base_url = "http://127.0.0.1:11434/v1", model_name=ollama_model, api_key="ollama", temperature=0)
+
+# llm 与 agent 在首次访问 single_agent.llm / single_agent.agent 时才构建（并缓存），
+# 导入本模块不会加载 langchain_openai 与 langchain.agents
+factory = LazyFactory(__name__)
+ollama_client.on_close(factory.clear)
+__getattr__ = factory.module_getattr()
+
+
+# 模型分级：设置 AGENT_ROUTER_MODEL / AGENT_ANSWER_MODEL 后，选工具用小模型、最终回答用大模型，
+# 小模型的工具调用未通过校验时自动升级；各角色的延迟与 token 记在 factory.get("tier_stats")
+@factory.register("tier_stats")
+def _build_tier_stats():
+    from src.common.model_tiers import TierStats
+
+    return TierStats()
+
+
+@factory.register("llm")
+def _build_llm():
+    from src.common.model_tiers import ModelTiers
+
+    tiers = ModelTiers.from_env("AGENT_", ollama_model)
+    return tiers.build(factory.get("tier_stats"), temperature=0)
 
 class AddArgs(BaseModel):
     """加法运算参数模型
@@ -35,7 +58,7 @@ class AddTool(BaseTool):
         return a + b
 
     async def _arun(self, a:int, b:int):
-        result = a - b
+        result = a + b
         print(f"异步调用: 正在计算{a} + {b}...")
         print(f"计算结果为: {result}")
         return a + b
@@ -60,7 +83,7 @@ class SubTool(BaseTool):
     args_schema : Type[BaseModel] = SubArgs
 
     def _run(self, a:int, b:int):
-        result = a + b
+        result = a - b
         print(f"同步调用:正在计算{a} - {b} = {result}")
         return result
 
@@ -70,16 +93,21 @@ class SubTool(BaseTool):
         return result
 
 
-agent = create_agent(model=llm, tools=[AddTool(), SubTool()])
+@factory.register("agent")
+def _build_agent():
+    from langchain.agents import create_agent
+
+    return create_agent(model=factory.get("llm"), tools=[AddTool(), SubTool()])
+
 
 async def call_agent_1():
     print("call_agent_1")
-    res = await agent.ainvoke({"messages":["请帮我计算一下123+10-4等于多少"]})
+    res = await factory.get("agent").ainvoke({"messages":["请帮我计算一下123+10-4等于多少"]})
     print(res)
 
 def call_agent_2():
     print("call_agent_2")
-    res = agent.invoke({"messages":["请帮我计算一下123+10-4等于多少"]})
+    res = factory.get("agent").invoke({"messages":["请帮我计算一下123+10-4等于多少"]})
     print(res)
 
 
@@ -0,0 +1,325 @@
+"""代理图的逐 token 流式输出
+
+`supervisor.invoke` / `agent.invoke` 要等整个多代理运行结束才返回，用户可能 10 秒以上看不到任何输出。
+`AgentStream` 基于 `astream_events(version="v2")`，在事件发生时就把它们翻译成精简的 `StreamEvent`：
+
+- `route`：路由决策（主管调用 `transfer_to_*` 交接工具、并行模式 plan 的 `assign_*`、向量路由直接分配）
+- `tool_start` / `tool_end`：工具开始与结束（含参数、结果与耗时，交接工具不重复报告）
+- `token`：模型输出的文本增量，`agent` 为正在输出的代理（supervisor、math_agent……）
+- `done`：运行结束，data 中为最终回答；运行出错时为 `error`
+
+背压：生产者通过容量为 `max_buffer` 的队列把事件交给消费者。队列满时，`overflow="block"` 让生产者等待，
+不再从 astream_events 拉取事件，图在当前超步结束后暂停推进；`overflow="coalesce"` 则把同一代理
+连续的 token 合并成一个事件继续运行，内存只随队列容量增长。
+
+每个流结束后 `stream.stats` 给出首 token 延迟（TTFT）、首个事件延迟、总耗时、token 事件数、路由与工具序列。
+
+用法：
+    async with AgentStream(multi_agent.supervisor, "告诉我现在几点了?") as stream:
+        async for event in stream:
+            if event.type == "token":
+                print(event.data["text"], end="", flush=True)
+    print(stream.stats.to_dict())
+
+    python -m src.agents.streaming --target multi_agent:supervisor "请帮我计算一下123+10-4等于多少"
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from src.agents.token_usage import role_from_metadata
+
+ROUTE = "route"
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+TOKEN = "token"
+DONE = "done"
+ERROR = "error"
+
+# 交接工具前缀：langgraph_supervisor / handoff.py 的 transfer_to_，fanout.py 的 assign_
+ROUTE_PREFIXES = ("transfer_to_", "assign_")
+OVERFLOW_POLICIES = ("block", "coalesce")
+
+_SENTINEL = object()
+
+
+@dataclass
+class StreamEvent:
+    """一条流式事件；elapsed 为距请求开始的秒数。"""
+
+    type: str
+    agent: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, "agent": self.agent, "data": self.data,
+                "elapsed": round(self.elapsed, 4)}
+
+
+@dataclass
+class StreamStats:
+    """一次流式请求的时延与事件统计（秒）。ttft 为第一个 token 事件的延迟，没有输出 token 时为 None。"""
+
+    request_id: str
+    ttft: Optional[float] = None
+    first_event: Optional[float] = None
+    elapsed: float = 0.0
+    tokens: int = 0
+    coalesced: int = 0
+    events: Dict[str, int] = field(default_factory=dict)
+    routes: List[str] = field(default_factory=list)
+    tools: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "request_id": self.request_id,
+            "ttft_ms": ms(self.ttft),
+            "first_event_ms": ms(self.first_event),
+            "elapsed_ms": ms(self.elapsed),
+            "tokens": self.tokens,
+            "coalesced": self.coalesced,
+            "events": dict(self.events),
+            "routes": list(self.routes),
+            "tools": list(self.tools),
+        }
+
+
+def _agent(metadata: Optional[Dict[str, Any]]) -> str:
+    metadata = metadata or {}
+    # 分级模型的 model_role 后缀对流式输出没有意义，只保留代理 / 节点名
+    return metadata.get("lc_agent_name") or role_from_metadata(metadata).split("/", 1)[0]
+
+
+def _route_target(name: str) -> Optional[str]:
+    for prefix in ROUTE_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return None
+
+
+def _content(output: Any) -> Any:
+    return getattr(output, "content", output)
+
+
+def translate(raw: Dict[str, Any]) -> List[StreamEvent]:
+    """把一条 astream_events v2 事件翻译成零到多条 StreamEvent（elapsed 由调用方填写）。"""
+    kind = raw.get("event")
+    name = raw.get("name") or ""
+    data = raw.get("data") or {}
+    agent = _agent(raw.get("metadata"))
+
+    if kind == "on_chat_model_stream":
+        text = getattr(data.get("chunk"), "text", "")
+        return [StreamEvent(TOKEN, agent, {"text": text})] if text else []
+    if kind == "on_chat_model_end":
+        # 并行模式的 plan 一次给出多个 assign_* 调用，不经过工具节点，在模型结束时报告
+        calls = getattr(data.get("output"), "tool_calls", None) or []
+        return [
+            StreamEvent(ROUTE, agent, {"to": target, "task": (call.get("args") or {}).get("task")})
+            for call in calls
+            if call["name"].startswith("assign_") and (target := _route_target(call["name"]))
+        ]
+    if kind == "on_tool_start":
+        target = _route_target(name)
+        if target is not None:
+            return [StreamEvent(ROUTE, agent, {"to": target, **(data.get("input") or {})})]
+        return [StreamEvent(TOOL_START, agent, {"name": name, "input": data.get("input")})]
+    if kind == "on_tool_end" and _route_target(name) is None:
+        output = _content(data.get("output"))
+        return [StreamEvent(TOOL_END, agent, {"name": name, "output": output})]
+    if kind == "on_custom_event" and name == ROUTE:
+        return [StreamEvent(ROUTE, agent, dict(data))]
+    return []
+
+
+class AgentStream:
+    """单个请求的事件流；用 `async with` 保证提前退出时取消后台运行。"""
+
+    def __init__(
+        self,
+        graph: Any,
+        request: Any,
+        config: Optional[Dict[str, Any]] = None,
+        max_buffer: int = 64,
+        overflow: str = "block",
+        request_id: Optional[str] = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow 只能是 {OVERFLOW_POLICIES}，收到 {overflow!r}")
+        self.graph = graph
+        self.inputs = {"messages": [request]} if isinstance(request, str) else request
+        self.config = config
+        self.overflow = overflow
+        self.stats = StreamStats(request_id or uuid.uuid4().hex[:12])
+        self.output: Optional[Dict[str, Any]] = None
+        self._queue: asyncio.Queue = asyncio.Queue(max(1, max_buffer))
+        self._pending: Optional[StreamEvent] = None
+        self._task: Optional[asyncio.Task] = None
+        self._finished = False
+        self._start = 0.0
+        self._tool_starts: Dict[str, float] = {}
+
+    @property
+    def answer(self) -> str:
+        messages = (self.output or {}).get("messages") or []
+        return messages[-1].text if messages else ""
+
+    # ---------------- 生产者 ----------------
+
+    def _stamp(self, event: StreamEvent) -> StreamEvent:
+        event.elapsed = time.perf_counter() - self._start
+        stats = self.stats
+        if stats.first_event is None:
+            stats.first_event = event.elapsed
+        stats.events[event.type] = stats.events.get(event.type, 0) + 1
+        if event.type == TOKEN:
+            stats.tokens += 1
+            if stats.ttft is None:
+                stats.ttft = event.elapsed
+        elif event.type == ROUTE:
+            stats.routes.append(event.data.get("to"))
+        elif event.type == TOOL_START:
+            stats.tools.append(event.data["name"])
+        return event
+
+    async def _put(self, event: StreamEvent) -> None:
+        if self.overflow == "coalesce" and event.type == TOKEN:
+            pending = self._pending
+            if pending is not None and pending.agent == event.agent:
+                pending.data["text"] += event.data["text"]
+                self.stats.coalesced += 1
+            else:
+                await self._flush()
+                self._pending = event
+            if not self._queue.full():
+                self._queue.put_nowait(self._pending)
+                self._pending = None
+            return
+        await self._flush()
+        await self._queue.put(event)
+
+    async def _flush(self) -> None:
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            await self._queue.put(pending)
+
+    def _track_tool(self, raw: Dict[str, Any], event: StreamEvent) -> None:
+        run_id = str(raw.get("run_id"))
+        if event.type == TOOL_START:
+            self._tool_starts[run_id] = event.elapsed
+        elif event.type == TOOL_END:
+            started = self._tool_starts.pop(run_id, event.elapsed)
+            event.data["seconds"] = round(event.elapsed - started, 6)
+
+    async def _produce(self) -> None:
+        try:
+            async for raw in self.graph.astream_events(self.inputs, self.config, version="v2"):
+                if raw.get("event") == "on_chain_end" and not raw.get("parent_ids"):
+                    self.output = (raw.get("data") or {}).get("output")
+                for event in translate(raw):
+                    self._stamp(event)
+                    self._track_tool(raw, event)
+                    await self._put(event)
+            await self._put(self._stamp(StreamEvent(DONE, "", {"answer": self.answer})))
+        except Exception as e:  # noqa: BLE001  错误作为事件交给消费者
+            error = f"{type(e).__name__}: {e}"
+            await self._put(self._stamp(StreamEvent(ERROR, "", {"error": error})))
+        finally:
+            self.stats.elapsed = time.perf_counter() - self._start
+        await self._flush()
+        await self._queue.put(_SENTINEL)
+
+    # ---------------- 消费者 ----------------
+
+    def start(self) -> "AgentStream":
+        if self._task is None:
+            self._start = time.perf_counter()
+            self._task = asyncio.ensure_future(self._produce())
+        return self
+
+    def __aiter__(self) -> "AgentStream":
+        return self.start()
+
+    async def __anext__(self) -> StreamEvent:
+        if self._finished:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is _SENTINEL:
+            self._finished = True
+            await self._task
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self) -> None:
+        """取消后台运行（已结束时无操作）。"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self.stats.elapsed = time.perf_counter() - self._start
+
+    async def __aenter__(self) -> "AgentStream":
+        return self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+
+async def stream_agent(graph: Any, request: Any, **kwargs: Any) -> AsyncIterator[StreamEvent]:
+    """AgentStream 的生成器形式，提前退出循环时自动取消运行。"""
+    async with AgentStream(graph, request, **kwargs) as stream:
+        async for event in stream:
+            yield event
+
+
+def _print_event(event: StreamEvent) -> None:
+    if event.type == TOKEN:
+        print(event.data["text"], end="", flush=True)
+    elif event.type == ROUTE:
+        print(f"\n[{event.elapsed * 1000:.0f}ms] {event.agent} -> {event.data.get('to')}")
+    elif event.type == TOOL_START:
+        print(f"\n[{event.elapsed * 1000:.0f}ms] {event.agent} 调用 {event.data['name']}"
+              f"({event.data['input']})")
+    elif event.type == TOOL_END:
+        print(f"[{event.elapsed * 1000:.0f}ms] {event.data['name']} -> {event.data['output']}")
+    elif event.type == ERROR:
+        print(f"\n出错: {event.data['error']}")
+
+
+async def _amain(args: argparse.Namespace) -> StreamStats:
+    from src.agents.runner import load_target
+
+    graph = load_target(args.target)
+    async with AgentStream(graph, args.question, max_buffer=args.buffer,
+                           overflow=args.overflow) as stream:
+        async for event in stream:
+            _print_event(event)
+    return stream.stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式运行代理图，实时输出路由、工具与回答 token")
+    parser.add_argument("question", nargs="?", default="请帮我计算一下123+10-4等于多少")
+    parser.add_argument("--target", default="multi_agent:supervisor",
+                        help="模块:属性，如 single_agent:agent、multi_agent:routed_supervisor")
+    parser.add_argument("--buffer", type=int, default=64, help="事件队列容量")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="block")
+    args = parser.parse_args()
+
+    stats = asyncio.run(_amain(args))
+    print("\n" + json.dumps(stats.to_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
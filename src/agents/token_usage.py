@@ -0,0 +1,123 @@
+"""按图节点统计每次请求的模型 token 用量
+
+LangGraph 调用模型时会在回调 metadata 中带上 `checkpoint_ns`（如 `math_agent:<id>|model:<id>`），
+`TokenUsageCallback` 取其第一段作为角色（supervisor、math_agent、plan、join……），
+累计每个角色的调用次数与 input/output tokens，用于观察监督者的 prefill 是否随代理数量和轮次增长。
+分级模型（src.common.model_tiers）的内层调用带有 `model_role`，记为 `supervisor/router` 这样的角色。
+
+用法：
+    usage = TokenUsageCallback()
+    supervisor.invoke({"messages": [question]}, config={"callbacks": [usage]})
+    print(usage.format())
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+@dataclass
+class RoleUsage:
+    """一个角色累计的模型调用次数与 token 数。"""
+
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+def role_from_metadata(metadata: Optional[Dict[str, Any]]) -> str:
+    """从 LangGraph 回调 metadata 中取出最外层节点名（分级模型调用附加 `/<model_role>`）。"""
+    metadata = metadata or {}
+    namespace = metadata.get("checkpoint_ns") or metadata.get("langgraph_checkpoint_ns") or ""
+    if namespace:
+        role = namespace.split("|", 1)[0].split(":", 1)[0]
+    else:
+        role = metadata.get("langgraph_node") or "unknown"
+    model_role = metadata.get("model_role")
+    return f"{role}/{model_role}" if model_role else role
+
+
+def _usage(response: LLMResult) -> Dict[str, int]:
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                return {
+                    "input_tokens": usage.get("input_tokens", 0),
+                    "output_tokens": usage.get("output_tokens", 0),
+                }
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return {
+        "input_tokens": token_usage.get("prompt_tokens", 0),
+        "output_tokens": token_usage.get("completion_tokens", 0),
+    }
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """按角色累计 token 用量，并保留每次调用的明细（顺序与调用完成顺序一致）。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._roles: Dict[UUID, str] = {}
+        self.by_role: Dict[str, RoleUsage] = {}
+        self.calls: List[Dict[str, Any]] = []
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            self._roles[run_id] = role_from_metadata(metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = _usage(response)
+        with self._lock:
+            role = self._roles.pop(run_id, "unknown")
+            totals = self.by_role.setdefault(role, RoleUsage())
+            totals.calls += 1
+            totals.input_tokens += usage["input_tokens"]
+            totals.output_tokens += usage["output_tokens"]
+            self.calls.append({"role": role, **usage})
+
+    @property
+    def total(self) -> RoleUsage:
+        total = RoleUsage()
+        for usage in self.by_role.values():
+            total.calls += usage.calls
+            total.input_tokens += usage.input_tokens
+            total.output_tokens += usage.output_tokens
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "roles": {role: usage.to_dict() for role, usage in self.by_role.items()},
+            "total": self.total.to_dict(),
+            "calls": list(self.calls),
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"{role}: 调用 {u.calls} 次, input {u.input_tokens}, output {u.output_tokens}"
+            for role, u in self.by_role.items()
+        ]
+        total = self.total
+        lines.append(f"合计: 调用 {total.calls} 次, input {total.input_tokens}, "
+                     f"output {total.output_tokens}")
+        return "\n".join(lines)
@@ -0,0 +1,4 @@
+"""性能基准模块
+
+包含向量库、模型调用等各类基准测试脚本。
+"""
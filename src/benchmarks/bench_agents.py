@@ -0,0 +1,362 @@
+"""Agent 入口基准：单 Agent 计算器与多 Agent 监督者。"""
+
+QUESTION = "请帮我计算一下123+10-4等于多少"
+
+
+def test_single_agent_invoke(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import single_agent
+
+    res = benchmark(single_agent.agent.invoke, {"messages": [QUESTION]})
+    assert res["messages"]
+
+
+def test_single_agent_ainvoke(benchmark, fake_ollama, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import single_agent
+
+    # 每轮一个新的事件循环：共享的异步客户端按当前事件循环取连接池，缓存的 ChatOpenAI 可跨循环复用
+    res = benchmark(lambda: asyncio.run(single_agent.agent.ainvoke({"messages": [QUESTION]})))
+    assert res["messages"]
+
+
+def test_multi_agent_supervisor(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import multi_agent
+
+    res = benchmark(multi_agent.supervisor.invoke, {"messages": [QUESTION]})
+    assert res["messages"]
+
+
+# 同时需要时间代理与数学代理的多段请求：串行主管逐个分配，并行模式在同一超步内扇出
+MULTI_PART_QUESTION = "告诉我现在几点了? 另外请帮我计算一下123+10-4等于多少"
+
+
+def test_multi_agent_supervisor_multi_part(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import multi_agent
+
+    res = benchmark(multi_agent.supervisor.invoke, {"messages": [MULTI_PART_QUESTION]})
+    # 串行模式：主管依次转交两个代理，每个代理都执行了自己的工具
+    assert {m.name for m in res["messages"] if m.type == "ai"} >= {"math_agent", "datetime_agent"}
+    tools = {m.name for m in res["messages"] if m.type == "tool"}
+    assert {"get_current_time", "add", "sub"} <= tools
+    assert res["messages"][-1].name == "supervisor" and res["messages"][-1].content
+
+
+def test_multi_agent_parallel_multi_part(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import multi_agent
+
+    res = benchmark(multi_agent.parallel_supervisor.invoke, {"messages": [MULTI_PART_QUESTION]})
+    assert sorted(r["agent"] for r in res["results"]) == ["datetime_agent", "math_agent"]
+    assert all(r["answer"] for r in res["results"])
+    assert res["messages"][-1].content
+
+
+def test_fanout_results_reset_per_turn(benchmark, fake_ollama, in_tmp_cwd):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from src.agents import multi_agent
+    from src.agents.fanout import build_fanout_supervisor
+
+    graph = build_fanout_supervisor(multi_agent.factory.get("llm"),
+                                    multi_agent.factory.get("agent_specs"),
+                                    checkpointer=InMemorySaver())
+    turns = iter(range(10 ** 6))
+
+    def run():
+        config = {"configurable": {"thread_id": f"fanout-{next(turns)}"}}
+        first = graph.invoke({"messages": [MULTI_PART_QUESTION]}, config)
+        second = graph.invoke({"messages": [MULTI_PART_QUESTION]}, config)
+        return first, second
+
+    first, second = benchmark(run)
+    # 同一 thread 的第二轮：消息历史累积，但 results 只含本轮的两个子任务结果
+    assert len(second["messages"]) > len(first["messages"])
+    assert len(first["results"]) == len(second["results"]) == 2
+
+
+def _supervisor_usage(supervisor, question):
+    from src.agents.token_usage import TokenUsageCallback
+
+    usage = TokenUsageCallback()
+    res = supervisor.invoke({"messages": [question]}, config={"callbacks": [usage]})
+    return res, usage
+
+
+def test_multi_agent_lean_handoff(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import multi_agent
+
+    res, usage = benchmark(_supervisor_usage, multi_agent.lean_supervisor, QUESTION)
+    _, full = _supervisor_usage(multi_agent.supervisor, QUESTION)
+    benchmark.extra_info.update(lean=usage.to_dict()["roles"], full_history=full.to_dict()["roles"])
+    # 子代理的中间工具调用不会回到主管上下文
+    assert not any(m.type == "tool" and m.name in ("add", "sub") for m in res["messages"])
+    assert usage.total.input_tokens < full.total.input_tokens
+
+
+def test_multi_agent_routed(benchmark, fake_ollama, in_tmp_cwd):
+    from src.agents import multi_agent
+
+    res = benchmark(multi_agent.routed_supervisor.invoke, {"messages": [QUESTION]})
+    benchmark.extra_info.update(multi_agent.router.stats, hit_rate=multi_agent.router.hit_rate)
+    assert res["messages"] and multi_agent.router.stats["routed"] > 0
+
+
+def test_agent_runner_async(benchmark, fake_ollama, in_tmp_cwd, capsys):
+    import asyncio
+
+    from src.agents import multi_agent
+    from src.agents.runner import DEFAULT_QUESTIONS, AgentRunner, build_requests
+
+    # 算术与时间请求交替，经向量路由直接交给 math_agent / datetime_agent，工具走 _arun
+    runner = AgentRunner(multi_agent.routed_supervisor, concurrency=8)
+    loop = asyncio.new_event_loop()
+    try:
+        report = benchmark(
+            lambda: loop.run_until_complete(runner.arun(build_requests(DEFAULT_QUESTIONS, 16)))
+        )
+    finally:
+        loop.close()
+    benchmark.extra_info.update(report.to_dict())
+    assert report.failures == 0 and report.cancelled == 0
+    assert {"add", "sub", "get_current_time"} <= set(report.tool_calls)
+    assert "同步调用" not in capsys.readouterr().out
+
+
+def test_agent_runner_cancel_and_timeout(benchmark, fake_ollama, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import multi_agent
+    from src.agents.runner import AgentRequest, AgentRunner
+
+    runner = AgentRunner(multi_agent.routed_supervisor, concurrency=2)
+
+    async def scenario():
+        # 并发 2：前两条在途，其余排队；取消一条在途、一条排队，另一条在途请求超时
+        requests = [AgentRequest(QUESTION), AgentRequest(QUESTION, timeout=0.05)]
+        requests += [AgentRequest(QUESTION) for _ in range(3)]
+        run = asyncio.ensure_future(runner.arun(requests))
+        await asyncio.sleep(0.02)
+        assert runner.cancel(requests[0].id) and runner.cancel(requests[3].id)
+        assert not runner.cancel("missing")
+        return await run
+
+    # 每次模型调用 100ms：取消与超时都发生在请求完成之前
+    fake_ollama.config.latency_ms = 100.0
+    try:
+        report = benchmark.pedantic(lambda: asyncio.run(scenario()), rounds=3)
+    finally:
+        fake_ollama.config.latency_ms = 0.0
+    benchmark.extra_info.update(report.to_dict())
+    assert report.requests == 5 and report.cancelled == 3 and report.failures == 0
+    # 其余两条请求照常完成：空出的名额交给了排队中的请求
+    assert report.latency.count == 2 and {"add", "sub"} <= set(report.tool_calls)
+    assert not runner.in_flight
+
+
+def test_agent_runner_abatch_routed(benchmark, fake_ollama, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import multi_agent
+    from src.agents.runner import DEFAULT_QUESTIONS, AgentRunner, build_requests
+
+    # RoutedSupervisor 不是 Runnable，abatch 由它自己按 max_concurrency 并发 ainvoke
+    runner = AgentRunner(multi_agent.routed_supervisor, concurrency=8)
+    report = benchmark(lambda: asyncio.run(runner.abatch(build_requests(DEFAULT_QUESTIONS, 8))))
+    benchmark.extra_info.update(report.to_dict())
+    assert report.failures == 0 and report.requests == 8
+
+
+def test_sub_tool_sync_and_async_agree(benchmark, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import multi_agent, single_agent
+
+    tools = [multi_agent.SubTool(), single_agent.SubTool()]
+    # 同步路径与异步路径结果一致（123 - 10）
+    assert benchmark(lambda: [t.invoke({"a": 123, "b": 10}) for t in tools]) == [113, 113]
+    assert [asyncio.run(t.ainvoke({"a": 123, "b": 10})) for t in tools] == [113, 113]
+
+
+def _crash_on_model_call(n):
+    """第 n 次模型调用开始时抛出异常，模拟进程在运行中途退出。"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class CrashCallback(BaseCallbackHandler):
+        raise_error = True
+        calls = 0
+
+        def on_chat_model_start(self, *args, **kwargs):
+            self.calls += 1
+            if self.calls == n:
+                raise RuntimeError("simulated crash")
+
+    return CrashCallback()
+
+
+def test_multi_agent_durable_resume(benchmark, fake_ollama, in_tmp_cwd):
+    import uuid
+
+    from src.agents import multi_agent
+    from src.agents.durable import invoke_resumable, thread_config
+
+    graph = multi_agent.durable_supervisor
+
+    def crashed_thread():
+        # 每轮用不同的问题，避免模型调用缓存掩盖恢复本身的效果
+        thread_id = uuid.uuid4().hex
+        question = f"{QUESTION} ({thread_id[:6]})"
+        try:
+            graph.invoke({"messages": [question]},
+                         thread_config(thread_id, {"callbacks": [_crash_on_model_call(3)]}))
+        except RuntimeError:
+            pass
+        assert graph.get_state(thread_config(thread_id)).next
+        return (graph, {"messages": [question]}, thread_id), {}
+
+    before = fake_ollama.stats.get("/v1/chat/completions", 0)
+    res = benchmark.pedantic(invoke_resumable, setup=crashed_thread, rounds=5)
+    benchmark.extra_info["chat_requests_per_round"] = (
+        fake_ollama.stats.get("/v1/chat/completions", 0) - before) / 5
+    assert res["messages"][-1].content
+
+
+def test_multi_agent_durable_repeat(benchmark, fake_ollama, in_tmp_cwd):
+    import uuid
+
+    from src.agents import multi_agent
+    from src.agents.durable import invoke_resumable
+
+    graph = multi_agent.durable_supervisor
+    invoke_resumable(graph, {"messages": [QUESTION]}, uuid.uuid4().hex)
+    before = fake_ollama.stats.get("/v1/chat/completions", 0)
+    # 新 thread 上重复提交相同请求：每一步模型调用都命中缓存，不再请求模型
+    res = benchmark(lambda: invoke_resumable(graph, {"messages": [QUESTION]}, uuid.uuid4().hex))
+    assert res["messages"][-1].content
+    assert fake_ollama.stats.get("/v1/chat/completions", 0) == before
+
+
+def _tiered_supervisor(stats, router="granite4:3b"):
+    from src.agents import multi_agent
+    from src.common.model_tiers import ModelTiers
+
+    llm = ModelTiers(router=router, answer="qwen3:4b").build(stats, temperature=0)
+    agents = [multi_agent._math_agent(llm), multi_agent._datetime_agent(llm)]
+    return multi_agent._supervisor_builder(llm, agents).compile()
+
+
+def test_multi_agent_tiered(benchmark, fake_ollama, in_tmp_cwd):
+    from src.common.model_tiers import TierStats
+
+    stats = TierStats()
+    supervisor = _tiered_supervisor(stats)
+    res, usage = benchmark(_supervisor_usage, supervisor, QUESTION)
+    benchmark.extra_info.update(tiers=stats.to_dict(), usage=usage.to_dict()["roles"])
+    # 路由与选工具走小模型，只有最终回答走大模型
+    assert {"supervisor/router", "math_agent/router", "supervisor/answer"} <= set(usage.by_role)
+    assert stats.roles["router"].calls == stats.roles["answer"].calls
+    assert not stats.escalations and res["messages"][-1].content.startswith("[fake:qwen3:4b]")
+
+
+def test_multi_agent_tiered_vs_single(benchmark, fake_ollama, in_tmp_cwd):
+    import time
+
+    from src.common.model_tiers import TierStats
+
+    # 小模型比大模型快 5 倍：分级后决策步骤走小模型、回答步骤直接走大模型，总耗时应低于只用大模型
+    fake_ollama.config.model_latency_ms = {"granite4:3b": 10.0, "qwen3:4b": 50.0}
+    stats = TierStats()
+    tiered, single = _tiered_supervisor(stats), _tiered_supervisor(TierStats(), router="qwen3:4b")
+
+    def mean_seconds(graph, runs=3):
+        start = time.perf_counter()
+        for _ in range(runs):
+            graph.invoke({"messages": [QUESTION]})
+        return (time.perf_counter() - start) / runs
+
+    try:
+        single_seconds = mean_seconds(single)
+        tiered_seconds = mean_seconds(tiered)
+        benchmark.pedantic(tiered.invoke, args=({"messages": [QUESTION]},), rounds=3)
+    finally:
+        fake_ollama.config.model_latency_ms = {}
+    benchmark.extra_info.update(single_seconds=single_seconds, tiered_seconds=tiered_seconds,
+                                tiers=stats.to_dict())
+    assert tiered_seconds < single_seconds
+    # 回答步骤不再先让小模型试一遍：每次运行只有两次决策（supervisor、math_agent）与两次回答
+    assert stats.roles["router"].calls == stats.roles["answer"].calls
+
+
+def test_multi_agent_tiered_escalation(benchmark, fake_ollama, in_tmp_cwd):
+    from src.common.model_tiers import TierStats
+
+    stats = TierStats()
+    supervisor = _tiered_supervisor(stats)
+    # 小模型返回不存在的工具名：每次决策都升级给大模型重做，结果与不分级时一致
+    fake_ollama.config.garbled_tool_models = ["granite4:3b"]
+    try:
+        res = benchmark(supervisor.invoke, {"messages": [QUESTION]})
+    finally:
+        fake_ollama.config.garbled_tool_models = []
+    benchmark.extra_info.update(stats.to_dict())
+    assert stats.escalations["unknown_tool"] == stats.roles["escalation"].calls
+    assert {"add", "sub"} <= {m.name for m in res["messages"] if m.type == "tool"}
+
+
+def _stream_events(graph, question, delay=0.0, **kwargs):
+    import asyncio
+
+    from src.agents.streaming import AgentStream
+
+    async def run():
+        async with AgentStream(graph, question, **kwargs) as stream:
+            events = []
+            async for event in stream:
+                events.append(event)
+                if delay:
+                    await asyncio.sleep(delay)
+        return stream, events
+
+    return run()
+
+
+def _supervisor_text(events):
+    return "".join(e.data["text"] for e in events if e.type == "token" and e.agent == "supervisor")
+
+
+def test_multi_agent_streaming(benchmark, fake_ollama, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import multi_agent
+
+    loop = asyncio.new_event_loop()
+    try:
+        stream, events = benchmark(
+            lambda: loop.run_until_complete(_stream_events(multi_agent.supervisor, QUESTION))
+        )
+    finally:
+        loop.close()
+    stats = stream.stats
+    benchmark.extra_info.update(stats.to_dict())
+    # 路由与工具事件先于回答 token 到达，最终回答逐 token 拼出
+    assert stats.routes == ["math_agent"] and {"add", "sub"} <= set(stats.tools)
+    assert stats.first_event < stats.ttft < stats.elapsed
+    assert events[-1].type == "done" and _supervisor_text(events) == stream.answer
+
+
+def test_multi_agent_streaming_slow_consumer(benchmark, fake_ollama, in_tmp_cwd):
+    import asyncio
+
+    from src.agents import multi_agent
+
+    # 消费者每个事件耗时 2ms、队列容量 4：coalesce 把积压的 token 合并，回答内容不丢失
+    loop = asyncio.new_event_loop()
+    try:
+        stream, events = benchmark(lambda: loop.run_until_complete(_stream_events(
+            multi_agent.supervisor, QUESTION, delay=0.002, max_buffer=4, overflow="coalesce"
+        )))
+    finally:
+        loop.close()
+    benchmark.extra_info.update(stream.stats.to_dict())
+    assert stream.stats.coalesced > 0
+    assert len(events) < sum(stream.stats.events.values())
+    assert _supervisor_text(events) == stream.answer
@@ -0,0 +1,89 @@
+"""录制 / 回放基准：同一组 chat（含流式）与向量化请求，实时请求替身服务与离线回放的耗时对比。
+
+两者之差即模型（替身服务）耗时，回放的耗时就是客户端解析等管线自身开销。
+"""
+
+import json
+
+import httpx
+import openai
+import pytest
+
+from src.common.cassette import Cassette, CassetteMiss
+from src.common.ollama_client import ClientSettings
+
+MESSAGES = [{"role": "user", "content": "请告诉我现在几点钟"}]
+
+
+def _calls(http_client: httpx.Client, base_url: str) -> None:
+    client = openai.OpenAI(base_url=f"{base_url}/v1", api_key="ollama", http_client=http_client)
+    client.chat.completions.create(model="qwen3:4b", messages=MESSAGES)
+    for _ in client.chat.completions.create(model="qwen3:4b", messages=MESSAGES, stream=True):
+        pass
+    http_client.post(f"{base_url}/api/embed", json={"model": "nomic-embed-text", "input": ["a"]})
+
+
+def test_live_calls(benchmark, fake_ollama):
+    with httpx.Client() as http_client:
+        benchmark(_calls, http_client, fake_ollama.base_url)
+
+
+def test_replayed_calls(benchmark, fake_ollama, tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    recorder = Cassette(path, mode="record")
+    with httpx.Client(transport=recorder.transport(httpx.HTTPTransport())) as http_client:
+        _calls(http_client, fake_ollama.base_url)
+    assert len(recorder) == 3
+
+    cassette = Cassette(path, mode="replay", strict=True)
+    with httpx.Client(transport=cassette.transport(None)) as http_client:
+        benchmark(_calls, http_client, fake_ollama.base_url)
+    assert cassette.stats["misses"] == 0
+
+
+def test_replay_strict_miss(benchmark, fake_ollama, tmp_path, monkeypatch):
+    path = str(tmp_path / "calls.jsonl")
+    url = f"{fake_ollama.base_url}/api/embed"
+    recorder = Cassette(path, mode="record")
+    with httpx.Client(transport=recorder.transport(httpx.HTTPTransport())) as http_client:
+        http_client.post(url, json={"model": "nomic-embed-text", "input": ["旧的 prompt"]})
+
+    # 默认严格匹配：请求体变化后不会回放旧的录制
+    with httpx.Client(transport=Cassette(path).transport(None)) as http_client:
+        with pytest.raises(CassetteMiss):
+            http_client.post(url, json={"model": "nomic-embed-text", "input": ["新的 prompt"]})
+
+    # 显式关闭严格匹配（OLLAMA_CASSETTE_STRICT=0）时才按录制顺序回退
+    monkeypatch.setenv("OLLAMA_CASSETTE_STRICT", "0")
+    assert ClientSettings.from_env().cassette_strict is False
+    loose = Cassette(path, strict=False)
+    with httpx.Client(transport=loose.transport(None)) as http_client:
+        body = {"model": "nomic-embed-text", "input": ["新的 prompt"]}
+        response = benchmark(http_client.post, url, json=body)
+    assert response.status_code == 200 and loose.stats["fallback_hits"] >= 1
+
+
+def test_replay_compressed_response(benchmark, tmp_path):
+    import gzip
+
+    payload = {"model": "nomic-embed-text", "embeddings": [[0.1, 0.2]]}
+
+    def upstream(request):
+        body = gzip.compress(json.dumps(payload).encode("utf-8"))
+        return httpx.Response(200, content=body, headers={
+            "content-type": "application/json", "content-encoding": "gzip",
+        })
+
+    path = str(tmp_path / "gzip.jsonl")
+    url = "http://ollama.test/api/embed"
+    body = {"model": "nomic-embed-text", "input": ["a"]}
+    recorder = Cassette(path, mode="record")
+    with httpx.Client(transport=recorder.transport(httpx.MockTransport(upstream))) as client:
+        assert client.post(url, json=body).json() == payload
+
+    # 磁带中保存的是压缩后的原始字节，回放时带上 content-encoding，客户端照常解压
+    cassette = Cassette(path)
+    with httpx.Client(transport=cassette.transport(None)) as client:
+        response = benchmark(client.post, url, json=body)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == payload
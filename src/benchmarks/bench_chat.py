@@ -0,0 +1,72 @@
+"""流式聊天基准：AsyncChat 在共享异步连接池上并发执行多路流式对话。"""
+
+import asyncio
+
+from src.python_basics.deepseek import DEFAULT_MESSAGES, AsyncChat, summarize
+
+
+def _run(loop, coro_factory):
+    return loop.run_until_complete(coro_factory())
+
+
+def test_async_chat_concurrent_streams(benchmark, fake_ollama):
+    fake_ollama.config.reasoning_tokens = 8
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        chat = AsyncChat(max_concurrency=8, buffer_size=4)
+        start = loop.time()
+        streams = await chat.chat_many([DEFAULT_MESSAGES] * 16)
+        return streams, summarize(streams, loop.time() - start)
+
+    try:
+        streams, report = benchmark(_run, loop, run)
+    finally:
+        fake_ollama.config.reasoning_tokens = 0
+        loop.close()
+    benchmark.extra_info.update(report)
+    assert report["failures"] == 0 and report["ttft"]["count"] == 16
+    # 推理过程与正文分开累计，正文不含 reasoning 增量
+    assert all(s.reasoning.startswith("思考0") and s.content.startswith("[fake:") for s in streams)
+    assert all(s.stats.max_buffered <= 4 for s in streams)
+
+
+def test_async_chat_cancel(benchmark, fake_ollama):
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        # 消费一个增量后取消：后台任务关闭响应并释放并发名额，下一路对话不被阻塞
+        chat = AsyncChat(max_concurrency=1, buffer_size=1)
+        stream = chat.stream()
+        async for _ in stream:
+            stream.cancel()
+        await stream.wait()
+        follow_up = await chat.chat()
+        return stream, follow_up
+
+    try:
+        stream, follow_up = benchmark(_run, loop, run)
+    finally:
+        loop.close()
+    assert stream.stats.cancelled and stream.stats.content_tokens < 32
+    assert follow_up.stats.error is None and not follow_up.stats.cancelled
+
+
+def test_async_chat_early_break(benchmark, fake_ollama):
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        # 只读一个增量就 break：async with 退出时取消后台任务，唯一的并发名额立即归还
+        chat = AsyncChat(max_concurrency=1, buffer_size=1)
+        async with chat.stream() as stream:
+            async for _ in stream:
+                break
+        follow_up = await asyncio.wait_for(chat.chat(), timeout=5)
+        return stream, follow_up
+
+    try:
+        stream, follow_up = benchmark(_run, loop, run)
+    finally:
+        loop.close()
+    assert stream.done and stream.stats.cancelled
+    assert follow_up.stats.error is None and follow_up.stats.content_tokens > 0
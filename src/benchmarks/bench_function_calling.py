@@ -0,0 +1,345 @@
+"""函数调用入口基准：完整执行 function_tool.py / function_learn.py 的工具调用对话。"""
+
+import asyncio
+import importlib
+
+
+def _module(name: str):
+    # 在 fake_ollama 配置好 base_url 之后再导入，模块级的模型客户端才会指向替身服务
+    return importlib.import_module(f"src.function_calling.{name}")
+
+
+def _run(name: str, **kwargs):
+    module = _module(name)
+    return module.run_conversation(module.build_messages(), **kwargs)
+
+
+def test_function_tool_loop(benchmark, fake_ollama, in_tmp_cwd):
+    result = benchmark(_run, "function_tool")
+    assert result.messages[-1].content
+
+
+def test_function_learn_loop(benchmark, fake_ollama, in_tmp_cwd):
+    result = benchmark(_run, "function_learn")
+    assert result.messages[-1]["role"] == "assistant"
+
+
+def test_function_tool_loop_streaming(benchmark, fake_ollama, in_tmp_cwd):
+    result = benchmark(_run, "function_tool", stream=True)
+    assert result.messages[-1].content
+
+
+def test_function_learn_loop_streaming(benchmark, fake_ollama, in_tmp_cwd):
+    result = benchmark(_run, "function_learn", stream=True)
+    assert result.messages[-1]["role"] == "assistant"
+
+
+def test_function_tool_loop_tiered(benchmark, fake_ollama, in_tmp_cwd, monkeypatch):
+    module = _module("function_tool")
+    # 选工具由小模型决定，最终回答由大模型流式生成
+    monkeypatch.setenv("TOOL_ROUTER_MODEL", "granite4:3b")
+    monkeypatch.setenv("TOOL_ANSWER_MODEL", "qwen3:4b")
+    module.factory.clear()
+    module.tier_stats.reset()
+    try:
+        result = benchmark(_run, "function_tool", stream=True)
+    finally:
+        monkeypatch.undo()
+        module.factory.clear()
+    benchmark.extra_info.update(module.tier_stats.to_dict())
+    assert result.messages[-1].content.startswith("[fake:qwen3:4b]")
+    assert set(module.tier_stats.roles) == {"router", "answer"}
+
+
+def test_function_tool_batch_async(benchmark, fake_ollama, in_tmp_cwd):
+    from src.function_calling.batch_runner import arun_batch, build_conversations
+
+    module = _module("function_tool")
+    loop = asyncio.new_event_loop()
+
+    def run():
+        conversations = build_conversations(module.build_messages, [module.DEFAULT_QUESTION], 16)
+        return loop.run_until_complete(arun_batch(module.arun_conversation, conversations, 8))
+
+    try:
+        report = benchmark(run)
+    finally:
+        loop.close()
+    benchmark.extra_info.update(report.to_dict())
+    assert report.failures == 0
+
+
+def test_function_learn_batch_threads(benchmark, fake_ollama, in_tmp_cwd):
+    from src.function_calling.batch_runner import build_conversations, run_batch
+
+    module = _module("function_learn")
+
+    def run():
+        conversations = build_conversations(module.build_messages, [module.DEFAULT_QUESTION], 16)
+        return run_batch(module.run_conversation, conversations, 8)
+
+    report = benchmark(run)
+    benchmark.extra_info.update(report.to_dict())
+    assert report.failures == 0
+
+
+FAST_PATH_QUERIES = [
+    "请告诉我现在几点钟, 并告诉我和1980年1月1日相差多少天",
+    "现在几点了？",
+    "2020年1月1日到2021-03-01相隔多少天",
+    "请告诉我现在几点钟, 还有上海和北京的天气怎么样?",
+    "北京天气怎么样",
+]
+
+
+def test_fast_path_route(benchmark):
+    from src.function_calling.fast_path import FastPathRouter
+
+    router = FastPathRouter()
+    matches = benchmark(lambda: [router.route(q) for q in FAST_PATH_QUERIES])
+    hits = sum(m is not None for m in matches)
+    benchmark.extra_info["hit_rate"] = hits / len(FAST_PATH_QUERIES)
+    assert hits == 3
+
+
+# 形似时间问题、但快速路径给不出正确答案的请求：必须回退到模型循环
+FAST_PATH_NEGATIVES = [
+    "1980年1月1日是星期几？",
+    "2025年3月1日下午几点开会",
+    "1980年1月1日出生的人现在多少岁",
+    "1980年1月1日是几号",
+    "和1980年1月1日相差多少天是周几",
+    "纽约现在几点",
+    "东京时间现在几点",
+    "UTC现在几点",
+]
+
+
+def test_fast_path_rejects(benchmark):
+    from src.function_calling.fast_path import FastPathRouter
+
+    router = FastPathRouter()
+    matches = benchmark(lambda: [router.route(q) for q in FAST_PATH_NEGATIVES])
+    assert [q for q, m in zip(FAST_PATH_NEGATIVES, matches) if m is not None] == []
+
+
+def test_fast_path_accepts_langchain_messages(benchmark, fake_ollama, in_tmp_cwd, monkeypatch):
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from src.function_calling.fast_path import FastPathRouter
+
+    function_tool = _module("function_tool")
+    monkeypatch.setattr(function_tool, "fast_path_router", FastPathRouter())
+    question = "请告诉我现在几点钟"
+    # dict 与 LangChain 消息都能路由；最后一条不是用户消息时不走快速路径
+    assert function_tool._route_fast_path([{"role": "user", "content": question}]) is not None
+    assert function_tool._route_fast_path([HumanMessage(question), AIMessage("好的")]) is None
+    match = benchmark(function_tool._route_fast_path, [HumanMessage(question)])
+    assert match is not None and match.intents
+
+
+def test_tool_registry_dispatch(benchmark):
+    from typing import Annotated
+
+    from src.function_calling.tool_registry import ToolRegistry
+
+    registry = ToolRegistry()
+    for i in range(300):
+        def lookup(city: Annotated[str, "城市名称"], days: int = 1, metric: bool = True):
+            """查询城市数据"""
+            return days
+
+        registry.register(lookup, name=f"lookup_{i}")
+    assert len(registry.schemas) == 300
+
+    calls = [(f"lookup_{i}", {"city": "北京", "days": str(i % 7), "metric": "true"})
+             for i in range(0, 300, 7)]
+    results = benchmark(lambda: [registry.dispatch(name, args) for name, args in calls])
+    assert results[1] == 0 and registry.schemas is registry.schemas
+
+
+def test_stream_turn_invalid_and_duplicate_ids(benchmark):
+    from langchain_core.messages import AIMessageChunk
+
+    from src.function_calling.stream_tools import stream_langchain_turn
+    from src.function_calling.tool_executor import ToolExecutor
+
+    executed = []
+
+    def echo(x: int = 0):
+        executed.append(x)
+        return x
+
+    # 两个调用复用同一个 id、一个缺 id、最后一个参数截断成非法 JSON
+    fragments = [
+        (0, "dup", "echo", '{"x": 1}'), (1, "dup", "echo", '{"x": 2}'),
+        (2, None, "echo", '{"x": 3}'), (3, "bad", "echo", '{"x": '),
+    ]
+    chunks = [
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"index": i, "id": call_id, "name": name, "args": args}
+        ])
+        for i, call_id, name, args in fragments
+    ]
+
+    class StubLLM:
+        def stream(self, messages):
+            return iter(chunks)
+
+    executor = ToolExecutor({"echo": echo})
+
+    def run():
+        executed.clear()
+        return stream_langchain_turn(StubLLM(), [], executor)
+
+    turn = benchmark(run)
+    ids = [call["id"] for call in turn.message.tool_calls]
+    assert len(set(ids)) == 4 and set(ids) == set(turn.results)
+    assert sorted(executed) == [1, 2, 3]
+    bad = turn.results["bad"]
+    assert not bad.ok and "不是合法的 JSON" in bad.content and bad.value is None
+
+
+def test_tool_executor_timeout_from_submit(benchmark):
+    import time
+
+    from src.function_calling.tool_executor import ToolCall, ToolExecutor
+
+    def slow(seconds: float = 0.3):
+        time.sleep(seconds)
+        return seconds
+
+    def fast(x: int = 0):
+        return x
+
+    def broken():
+        raise RuntimeError("boom")
+
+    executor = ToolExecutor({"slow": slow, "fast": fast, "broken": broken},
+                            timeouts={"slow": 0.1})
+    calls = [
+        ToolCall("1", "slow"), ToolCall("2", "fast", {"x": 2}), ToolCall("3", "slow"),
+        ToolCall("4", "missing"), ToolCall("5", "broken"), ToolCall("6", "slow"),
+    ]
+
+    def run():
+        start = time.perf_counter()
+        results = executor.run(calls)
+        return results, time.perf_counter() - start
+
+    try:
+        results, elapsed = benchmark.pedantic(run, rounds=1, iterations=1)
+    finally:
+        executor.shutdown(wait=True)
+    # 三个慢调用的截止时间都从提交时刻起算：总等待约 0.1s，而不是逐个收集时累加到 0.3s
+    assert elapsed < 0.25
+    # 结果按提交顺序返回；超时、未知工具与异常都转换为结构化错误
+    assert [r.tool_call_id for r in results] == ["1", "2", "3", "4", "5", "6"]
+    assert [r.ok for r in results] == [False, True, False, False, False, False]
+    assert all("超时" in results[i].error for i in (0, 2, 5))
+    assert results[1].value == 2 and "未知工具" in results[3].error
+    assert isinstance(results[4].exception, RuntimeError)
+
+
+def test_tool_result_cache_ttl_and_lru(benchmark):
+    from src.function_calling.tool_cache import MISSING, CachePolicy, ToolResultCache
+
+    now = [0.0]
+    policies = {
+        "pure": CachePolicy(cacheable=True),
+        "weather": CachePolicy(cacheable=True, ttl=300),
+        "clock": CachePolicy(cacheable=False),
+        "zero_ttl": CachePolicy(cacheable=True, ttl=0),
+    }
+    cache = ToolResultCache(policies, max_entries=3, clock=lambda: now[0])
+
+    # TTL：过期时间由注入的时钟决定，到期后的查询算一次未命中并删除条目
+    cache.put("weather", {"city": "北京"}, "晴")
+    now[0] = 299.0
+    assert cache.get("weather", {"city": "北京"}) == "晴"
+    now[0] = 300.0
+    assert cache.get("weather", {"city": "北京"}) is MISSING and len(cache) == 0
+
+    # 不可缓存或 ttl=0 的工具既不写入也不计入命中率
+    cache.put("clock", {}, "12:00")
+    cache.put("zero_ttl", {}, 1)
+    assert cache.get("clock", {}) is MISSING and len(cache) == 0
+
+    # LRU：容量 3，最近访问过的 a 保留，最久未用的 b 被淘汰；参数顺序不影响键
+    for key in ("a", "b", "c"):
+        cache.put("pure", {"x": key, "y": 1}, key)
+    assert cache.get("pure", {"y": 1, "x": "a"}) == "a"
+    cache.put("pure", {"x": "d", "y": 1}, "d")
+    assert cache.get("pure", {"x": "b", "y": 1}) is MISSING
+    now[0] = 10 ** 9  # 没有 ttl 的条目永不过期
+    assert [cache.get("pure", {"x": k, "y": 1}) for k in "acd"] == ["a", "c", "d"]
+    assert cache.stats() == {"hits": 5, "misses": 2, "size": 3}
+
+    lookups = [("pure", {"x": k, "y": 1}) for k in "abcd"] * 25
+    results = benchmark(lambda: [cache.get(name, args) for name, args in lookups])
+    assert results.count(MISSING) == 25
+
+
+def _tool_group(call_id: str, name: str, args: dict, result: str):
+    import json
+
+    return [
+        {"role": "assistant", "content": None, "tool_calls": [{
+            "id": call_id, "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)},
+        }]},
+        {"role": "tool", "tool_call_id": call_id, "content": result},
+    ]
+
+
+def test_history_compaction_under_budget(benchmark):
+    from src.function_calling.history import HistoryManager, message_role
+
+    system = {"role": "system", "content": "你是一个得力的助手" * 10}
+    earlier_turn = [
+        {"role": "user", "content": "昨天北京天气怎么样" * 5},
+        *_tool_group("w1", "get_weather", {"city": "北京"}, "晴" * 400),
+        {"role": "assistant", "content": "北京晴" * 20},
+    ]
+    current_turn = [
+        {"role": "user", "content": "现在几点，距离2025年1月1日多久了"},
+        *_tool_group("t1", "get_current_time", {}, "2025-06-01 12:00:00" * 30),
+        *_tool_group("t2", "computing_time", {"start_time": "2025-01-01"}, "151 天"),
+    ]
+    messages = [system, *earlier_turn, *current_turn]
+    snapshot = list(messages)
+
+    roomy = HistoryManager(token_budget=10 ** 6)
+    assert roomy.compact(messages) == messages and roomy.last_stats.collapsed_groups == 0
+
+    history = HistoryManager(token_budget=300, max_result_chars=20)
+    compacted = benchmark(history.compact, messages)
+    stats = history.last_stats
+    assert messages == snapshot  # 只返回新列表，不修改调用方的历史
+    assert stats.tokens_before > 300 >= stats.tokens_after == history.count_tokens(compacted)
+    # system 前缀原样保留；折叠两组后仍超预算，于是丢弃已结束的上一轮
+    assert compacted[0] is system and stats.collapsed_groups == 2 and stats.dropped_turns == 1
+    assert compacted[1] is current_turn[0]
+    summary = compacted[2]
+    assert summary["content"].startswith("[已调用工具] get_current_time() -> 2025-06-01")
+    assert summary["content"].endswith("…") and "tool_calls" not in summary
+    # 当前轮最近的调用组原样保留，tool_call_id 仍成对出现
+    assert compacted[-2:] == current_turn[-2:]
+    assert [message_role(m) for m in compacted] == ["system", "user", "assistant",
+                                                    "assistant", "tool"]
+
+    # 压缩是确定性的：追加新消息后，已折叠部分保持不变，便于复用前缀缓存
+    more = messages + _tool_group("t3", "get_current_time", {}, "12:01")
+    assert HistoryManager(token_budget=300, max_result_chars=20).compact(more)[:3] == compacted[:3]
+
+    # 折叠已结束的轮次就能满足预算时，当前轮的调用组原样保留（不改写当前轮已发送过的前缀）
+    small_turn = [
+        {"role": "user", "content": "现在几点"},
+        *_tool_group("s1", "get_current_time", {}, "12:00"),
+        *_tool_group("s2", "get_current_time", {}, "12:01"),
+    ]
+    folded = [system, earlier_turn[0], history.summarize_group(earlier_turn[1:3]),
+              earlier_turn[3], *small_turn]
+    fits = HistoryManager(token_budget=history.count_tokens(folded), max_result_chars=20)
+    assert fits.compact([system, *earlier_turn, *small_turn]) == folded
+    assert fits.last_stats.collapsed_groups == 1 and fits.last_stats.dropped_turns == 0
@@ -0,0 +1,48 @@
+"""导入耗时基准：在全新的子进程中导入各入口模块，记录导入耗时与加载的模块数。
+
+导入示例模块不应加载 langgraph_supervisor、langchain_openai、openai、chromadb 等重型依赖，
+它们推迟到第一次构建模型 / 代理 / 向量库时才导入（见 src.common.lazy.LazyFactory）。
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from src.benchmarks.conftest import PROJECT_ROOT
+
+HEAVY_MODULES = ("langgraph_supervisor", "langchain_openai", "openai", "chromadb")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "modules": len(sys.modules), "heavy": heavy}}))
+"""
+
+
+def _import_in_subprocess(module):
+    probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=PROJECT_ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", [
+    "src.agents",
+    "src.function_calling",
+    "src.rag",
+    "src.agents.single_agent",
+    "src.agents.multi_agent",
+    "src.function_calling.function_tool",
+    "src.function_calling.function_learn",
+    "src.rag.rag_test",
+])
+def test_import_time(benchmark, module):
+    result = benchmark.pedantic(_import_in_subprocess, args=(module,), rounds=3, iterations=1)
+    benchmark.extra_info.update(result)
+    assert result["heavy"] == []
@@ -0,0 +1,85 @@
+"""日志热路径基准：同步 FileHandler 与队列 + 后台写入在调用线程中的开销对比。"""
+
+import logging
+import logging.handlers
+import queue
+
+from src.common.logging_setup import JsonFormatter, LazyQueueHandler, SamplingFilter
+
+MESSAGE = "工具执行结果: %s（耗时 %.3f 秒）"
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def _emit(logger: logging.Logger) -> None:
+    for i in range(100):
+        logger.info(MESSAGE, f"城市北京的天气是晴天, 温度是{i}度", 0.012, extra={"tool": "get_weather"})
+
+
+def test_sync_file_handler(benchmark, tmp_path):
+    handler = logging.FileHandler(tmp_path / "sync.log", encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    try:
+        benchmark(_emit, _logger("sync", handler))
+    finally:
+        handler.close()
+
+
+def test_queue_json_handler(benchmark, tmp_path):
+    file_handler = logging.handlers.RotatingFileHandler(
+        tmp_path / "queue.log", maxBytes=1024 * 1024, backupCount=2, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    try:
+        benchmark(_emit, _logger("queue", LazyQueueHandler(log_queue)))
+    finally:
+        listener.stop()
+        file_handler.close()
+    assert (tmp_path / "queue.log").stat().st_size > 0
+
+
+def test_queue_handler_sampled(benchmark, tmp_path):
+    log_queue = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(0.1))
+    file_handler = logging.FileHandler(tmp_path / "sampled.log", encoding="utf-8")
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    try:
+        benchmark(_emit, _logger("sampled", handler))
+    finally:
+        listener.stop()
+        file_handler.close()
+
+
+def test_setup_logging_keeps_host_handlers(benchmark, tmp_path):
+    import importlib
+
+    from src.common.logging_setup import setup_logging, shutdown_logging
+
+    root = logging.getLogger()
+    host = logging.NullHandler()
+    root.addHandler(host)
+    level = root.level
+    try:
+        # 作为库导入不配置日志；入口调用 setup_logging 时只追加队列 handler，不移除宿主的 handler
+        importlib.import_module("src.function_calling.function_tool")
+        assert host in root.handlers and root.level == level
+        setup_logging(str(tmp_path / "tool.log"), console=False)
+        assert host in root.handlers and len(root.handlers) >= 2
+        logger = logging.getLogger("bench.setup")
+        logger.setLevel(logging.INFO)  # 根 logger 的级别由宿主（pytest）决定，不被覆盖
+        benchmark(_emit, logger)
+    finally:
+        shutdown_logging()
+        root.removeHandler(host)
+    assert (tmp_path / "tool.log").stat().st_size > 0
@@ -0,0 +1,103 @@
+"""可观测性基准：共享连接池响应钩子采集的 Ollama 指标，以及 RAG 检索链路的阶段 span。"""
+
+import os
+
+import pytest
+
+from src.common import metrics, ollama_client, tracing
+
+
+def _series(name):
+    metric = metrics.REGISTRY.get(name)
+    return set(metric.snapshot()) if metric is not None else set()
+
+
+def test_metrics_embed(benchmark, fake_ollama):
+    model = "turingdance/m3e-base"
+    metrics.REGISTRY.clear()
+    vector = benchmark(ollama_client.embed, "指标采集", model)
+    assert len(vector) == fake_ollama.config.embedding_dim
+    # 单条向量化仍走 /api/embeddings（与已有向量库一致的未归一化向量），只有客户端请求耗时
+    key = ("/api/embeddings", model)
+    assert key in _series("ollama_request_duration_seconds")
+    assert not _series("ollama_total_duration_seconds")
+
+    # embed_batch 走 /api/embed：带服务端总耗时与加载耗时，可以算出排队耗时；没有 prefill / decode 之分
+    assert len(ollama_client.embed_batch(["a", "b"], model)) == 2
+    key = ("/api/embed", model)
+    for name in ("ollama_request_duration_seconds", "ollama_total_duration_seconds",
+                 "ollama_load_duration_seconds", "ollama_queue_duration_seconds",
+                 "ollama_prompt_tokens"):
+        assert key in _series(name), name
+    assert not _series("ollama_eval_duration_seconds")
+
+
+def test_metrics_chat(benchmark, fake_ollama):
+    client = ollama_client.get_openai_client()
+    messages = [{"role": "user", "content": "指标采集"}]
+
+    def run():
+        client.chat.completions.create(model="qwen3:4b", messages=messages)
+        stream = client.chat.completions.create(
+            model="qwen3:4b", messages=messages, stream=True,
+            stream_options={"include_usage": True},
+        )
+        for _ in stream:
+            pass
+
+    metrics.REGISTRY.clear()
+    benchmark(run)
+    key = ("/v1/chat/completions", "qwen3:4b")
+    rounds = metrics.REGISTRY.get("ollama_requests_total").snapshot()[(*key, "200")]
+    assert rounds % 2 == 0
+    # 非流式只有 usage；流式在客户端计时首个 chunk 与 decode，并从最后一个 chunk 取 usage
+    hist = metrics.REGISTRY.get("ollama_completion_tokens").snapshot()
+    assert sum(hist[key][0]) == rounds
+    for name in ("ollama_stream_first_chunk_seconds", "ollama_stream_decode_seconds"):
+        counts, _ = metrics.REGISTRY.get(name).snapshot()[key]
+        assert sum(counts) == rounds // 2, name
+    # OpenAI 兼容接口不返回服务端计时字段
+    assert not _series("ollama_total_duration_seconds")
+    assert "ollama_stream_first_chunk_seconds" in metrics.render_prometheus()
+
+
+def test_tracing_rag_query_spans(benchmark, fake_ollama, in_tmp_cwd):
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.vector_store import ChromaVectorStore, VectorRecord
+
+    texts = ["2025年年终奖按绩效发放", "迟到超过3次扣绩效", "2024年年终奖已发放"]
+    kb = KnowledgeBase(ChromaVectorStore("trace_kb", path=os.path.join(in_tmp_cwd, "chroma")))
+    kb.store.upsert([
+        VectorRecord(id=f"kb_{i}", vector=kb.embedding(text), content=text)
+        for i, text in enumerate(texts)
+    ])
+    # 未配置 exporter 时 span() 返回共享的空实现
+    assert not tracing.is_enabled() and tracing.span("rag.query") is tracing.span("x")
+
+    exporter = tracing.InMemoryExporter()
+    tracing.configure_tracing(exporter)
+    try:
+        def run():
+            exporter.records.clear()
+            return kb.query_vector("年终奖怎么发？")
+
+        answer, hits = benchmark(run)
+        with pytest.raises(ValueError), tracing.span("rag.failing"):
+            raise ValueError("bad")
+    finally:
+        tracing.disable_tracing()
+
+    assert answer and len(hits) == 3
+    spans = {r["name"]: r for r in exporter.records}
+    root = spans["rag.query"]
+    # 子 span 先结束、先导出；同属一个 trace，父节点是 rag.query
+    assert [r["name"] for r in exporter.records[:-1]] == [
+        "rag.embed_query", "rag.search", "rag.generate", "rag.query"]
+    for name in ("rag.embed_query", "rag.search", "rag.generate"):
+        assert spans[name]["parent_id"] == root["span_id"], name
+        assert spans[name]["trace_id"] == root["trace_id"], name
+        assert 0 <= spans[name]["duration_ms"] <= root["duration_ms"], name
+    assert root["parent_id"] is None and root["attributes"] == {"top_k": 3}
+    assert spans["rag.search"]["attributes"] == {"backend": "ChromaVectorStore", "hits": 3}
+    assert spans["rag.generate"]["attributes"]["answer_chars"] == len(answer)
+    assert spans["rag.failing"]["error"] == "ValueError: bad"
@@ -0,0 +1,42 @@
+"""模型性能探针基准：debug_ollama probe 对替身服务中的向量与对话模型测量加载、吞吐与 TTFT。"""
+
+import asyncio
+import json
+
+from src.python_basics.debug_ollama import ProbeConfig, aprobe, compare
+
+CONFIG = ProbeConfig(batch_sizes=[1, 8], prompt_tokens=[16, 128], concurrency=[1, 4],
+                     max_tokens=8, repeat=2)
+
+
+def test_debug_ollama_probe(benchmark, fake_ollama):
+    fake_ollama.config.load_latency_ms = 20
+    loop = asyncio.new_event_loop()
+
+    def run():
+        return loop.run_until_complete(aprobe(["turingdance/m3e-base", "qwen3:4b"], CONFIG))
+
+    try:
+        result = benchmark.pedantic(run, rounds=2, iterations=1)
+    finally:
+        fake_ollama.config.load_latency_ms = 0.0
+        loop.close()
+    embedder, chat = result["models"]["turingdance/m3e-base"], result["models"]["qwen3:4b"]
+    assert embedder["kind"] == "embedding" and chat["kind"] == "chat"
+    assert chat["quantization_level"] == "Q4_K_M"
+    for model in (embedder, chat):
+        # 冷加载先卸载模型，包含服务端的加载耗时；热加载命中已加载的模型
+        assert model["load"]["cold"]["load_seconds"] >= 0.02
+        assert model["load"]["warm"]["load_seconds"] == 0
+        assert set(model["concurrency"]) == {"1", "4"}
+    assert set(embedder["embedding"]) == {"1", "8"}
+    assert embedder["embedding"]["8"]["texts_per_second"] > 0
+    assert chat["chat"]["128"]["prompt_tokens"] > chat["chat"]["16"]["prompt_tokens"]
+    assert all(r["failures"] == 0 for r in chat["chat"].values())
+    assert chat["concurrency"]["4"]["streams"] == 8
+
+    # 结果可以序列化后对比；相同结果之间没有变化
+    loaded = json.loads(json.dumps(result, sort_keys=True))
+    assert loaded["config"]["batch_sizes"] == [1, 8]
+    assert all(row["change_pct"] == 0 for row in compare(loaded, result))
+    benchmark.extra_info["metrics"] = len(compare(loaded, result))
@@ -0,0 +1,171 @@
+"""RAG 入口基准：rag_test.rag_answer 与基于 Chroma 的 KnowledgeBase 检索问答。"""
+
+import os
+
+import pytest
+
+KB_TEXTS = [
+    "2025年公司年终奖发放规则：全年绩效达标者发放3个月工资",
+    "2025年考勤规则：每月迟到超3次扣绩效，无年终奖",
+    "2024年年终奖已发放完毕，标准为2个月工资",
+]
+QUESTION = "2025年公司的年终奖怎么发？5月份我有4次迟到,会影响年终奖吗？"
+
+
+def test_rag_answer(benchmark, fake_ollama, in_tmp_cwd):
+    from src.rag import rag_test
+
+    answer = benchmark(rag_test.rag_answer, QUESTION, KB_TEXTS)
+    assert answer
+
+
+def test_rag_answer_collection_cache(benchmark, fake_ollama, in_tmp_cwd):
+    from src.rag import rag_test
+
+    cache = rag_test.collection_cache
+    previous = cache.max_collections, cache.max_documents
+    cache.clear()
+    cache.max_collections, cache.max_documents = 2, 100
+    a, b, c = KB_TEXTS, KB_TEXTS[:1], KB_TEXTS[1:]
+    # 缓存只容纳两个知识库：每一步之后的 (hits, misses, evictions)
+    steps = [(a, (0, 1, 0)), (b, (0, 2, 0)), (c, (0, 3, 1)), (c, (1, 3, 1)),
+             (a, (1, 4, 2)), (a, (2, 4, 2))]
+
+    try:
+        for texts, expected in steps:
+            assert rag_test.rag_answer(QUESTION, texts)
+            stats = cache.stats()
+            assert (stats["hits"], stats["misses"], stats["evictions"]) == expected
+        names = {col.name for col in rag_test._chroma_client().list_collections()}
+        # 淘汰的集合已从 Chroma 客户端删除，只剩缓存中的 c 与 a
+        kb_names = {f"kb_{rag_test.collection_key(t)[:32]}": t for t in (a, b, c)}
+        assert sorted(map(len, (kb_names[n] for n in names & set(kb_names)))) == [2, 3]
+
+        # 只对单次命中缓存的调用计时
+        embeds = fake_ollama.stats.get("/api/embeddings", 0)
+        assert benchmark(rag_test.rag_answer, QUESTION, a)
+        stats = cache.stats()
+        # 命中时只向量化问题本身，不重建集合
+        assert stats["misses"] == 4 and stats["evictions"] == 2
+        assert fake_ollama.stats["/api/embeddings"] - embeds == stats["hits"] - 2
+    finally:
+        cache.clear()
+        cache.max_collections, cache.max_documents = previous
+    benchmark.extra_info.update(stats)
+
+
+def test_collection_cache_concurrent_build(benchmark, fake_ollama, in_tmp_cwd):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.rag import rag_test
+
+    cache = rag_test.CollectionCache()
+    fake_ollama.config.embedding_latency_ms = 20
+
+    def run():
+        # 同一知识库的并发请求共享一次构建；不同知识库在锁外并行构建
+        cache.clear()
+        embeds = fake_ollama.stats.get("/api/embeddings", 0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            collections = list(pool.map(cache.get, [KB_TEXTS] * 6 + [KB_TEXTS[:1]] * 2))
+        return collections, fake_ollama.stats["/api/embeddings"] - embeds
+
+    try:
+        collections, embeds = benchmark(run)
+        stats = cache.stats()
+    finally:
+        fake_ollama.config.embedding_latency_ms = 0.0
+        cache.clear()
+    assert len({id(col) for col in collections[:6]}) == 1 and collections[6] is collections[7]
+    assert stats["misses"] == 2 and stats["hits"] == 6
+    assert embeds == len(KB_TEXTS) + 1
+
+
+def test_collection_cache_skips_partial_build(benchmark, fake_ollama, in_tmp_cwd, monkeypatch):
+    from src.rag import rag_test
+
+    cache = rag_test.CollectionCache()
+    embedding = rag_test.get_embedding
+    failures = {KB_TEXTS[1]}
+
+    def flaky(text):
+        # 第一次构建时一条文本向量化失败（瞬时故障），之后恢复
+        if text in failures:
+            failures.discard(text)
+            return None
+        return embedding(text)
+
+    monkeypatch.setattr(rag_test, "get_embedding", flaky)
+    try:
+        partial = cache.get(KB_TEXTS)
+        # 不完整的集合本次照常返回，但不缓存
+        assert partial.count() == len(KB_TEXTS) - 1 and cache.stats()["collections"] == 0
+        full = cache.get(KB_TEXTS)
+        assert full.count() == len(KB_TEXTS)
+        assert cache.stats() == {"hits": 0, "misses": 2, "evictions": 0,
+                                 "collections": 1, "documents": len(KB_TEXTS)}
+        assert benchmark(cache.get, KB_TEXTS) is full
+    finally:
+        cache.clear()
+
+
+def test_knowledge_base_query(benchmark, fake_ollama, in_tmp_cwd):
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.vector_store import ChromaVectorStore, VectorRecord
+
+    kb = KnowledgeBase(ChromaVectorStore("bench_kb", path=os.path.join(in_tmp_cwd, "chroma")))
+    kb.store.upsert([
+        VectorRecord(id=f"kb_{i}", vector=kb.embedding(text), content=text)
+        for i, text in enumerate(KB_TEXTS)
+    ])
+    answer, hits = benchmark(kb.query_vector, QUESTION)
+    assert answer and hits
+
+
+def _vector_store(backend: str, root: str, dimension: int):
+    from src.rag.vector_store import create_vector_store
+
+    if backend == "milvus":
+        pytest.importorskip("milvus_lite")
+        return create_vector_store("milvus", "bench_round_trip",
+                                   path=os.path.join(root, "milvus.db"), dimension=dimension)
+    return create_vector_store("chroma", "bench_round_trip", path=os.path.join(root, "chroma"))
+
+
+@pytest.mark.parametrize("backend", ["chroma", "milvus"])
+def test_vector_store_round_trip(benchmark, fake_ollama, in_tmp_cwd, backend):
+    from src.common import ollama_client
+    from src.rag.vector_store import SearchHit, VectorRecord
+
+    model = "turingdance/m3e-base"
+    vectors = {text: ollama_client.embed(text, model) for text in KB_TEXTS}
+    store = _vector_store(backend, in_tmp_cwd, len(vectors[KB_TEXTS[0]]))
+    try:
+        store.add([VectorRecord(id=f"kb_{i}", vector=vectors[t], content=t, metadata={"n": i})
+                   for i, t in enumerate(KB_TEXTS)])
+        assert store.count() == 3
+        # upsert 按字符串 id 覆盖已有记录，不新增
+        store.upsert([VectorRecord(id="kb_0", vector=vectors[KB_TEXTS[0]], content="已更新")])
+        assert store.count() == 3
+        store.delete(["kb_2"])
+        assert store.count() == 2
+
+        hits = benchmark(store.search, vectors[KB_TEXTS[0]], 3)
+        assert all(isinstance(h, SearchHit) for h in hits)
+        assert [h.id for h in hits][0] == "kb_0" and hits[0].content == "已更新"
+        assert {h.id for h in hits} == {"kb_0", "kb_1"}
+        assert next(h for h in hits if h.id == "kb_1").metadata == {"n": 1}
+    finally:
+        close = getattr(getattr(store, "client", None), "close", None)
+        if backend == "milvus" and close:
+            close()
+
+
+def test_knowledge_base_insert_markdown(benchmark, fake_ollama, in_tmp_cwd):
+    pytest.importorskip("unstructured")
+    from src.rag.sync_embedding import SyncEmbedding
+
+    sync = SyncEmbedding("bench_markdown_kb", path=os.path.join(in_tmp_cwd, "chroma"))
+    kb_file = os.path.join(os.path.dirname(__file__), "..", "rag", "知识库_考核要求.md")
+    inserted = benchmark(sync.insert_vector, kb_file)
+    assert inserted > 0
@@ -0,0 +1,49 @@
+"""pytest-benchmark 基准套件的公共夹具
+
+替身服务默认监听随机端口，并通过 `ollama_client.configure()` 让所有入口的共享连接池指向它；
+设置 FAKE_OLLAMA_PORT 可固定端口（端口被占用时跳过整套基准）。
+
+运行：
+    pytest --benchmark-only
+"""
+
+import os
+import sys
+
+import pytest
+
+from src.benchmarks.fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from src.common import ollama_client
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    """在会话期间启动离线 Ollama 替身服务。"""
+    port = int(os.getenv("FAKE_OLLAMA_PORT", "0"))
+    config = FakeOllamaConfig(
+        latency_ms=float(os.getenv("FAKE_OLLAMA_LATENCY_MS", "0")),
+        token_latency_ms=float(os.getenv("FAKE_OLLAMA_TOKEN_LATENCY_MS", "0")),
+        embedding_latency_ms=float(os.getenv("FAKE_OLLAMA_EMBEDDING_LATENCY_MS", "0")),
+    )
+    try:
+        server = FakeOllamaServer("127.0.0.1", port, config)
+    except OSError as e:
+        pytest.skip(f"端口 {port} 不可用: {e}")
+    previous = ollama_client.get_settings()
+    with server:
+        ollama_client.configure(base_url=server.base_url)
+        try:
+            yield server
+        finally:
+            ollama_client.configure(base_url=previous.base_url)
+
+
+@pytest.fixture
+def in_tmp_cwd(tmp_path, monkeypatch):
+    """在临时目录中运行，避免示例脚本把日志与向量库写进仓库。"""
+    monkeypatch.chdir(tmp_path)
+    if PROJECT_ROOT not in sys.path:
+        monkeypatch.syspath_prepend(PROJECT_ROOT)
+    return tmp_path
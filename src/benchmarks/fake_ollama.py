@@ -0,0 +1,535 @@
+"""离线 Ollama 替身服务
+
+用标准库 http.server 实现一个可复现的 Ollama 替身，供性能基准与离线调试使用：
+
+- `/api/embeddings`、`/api/embed`：按 (模型, 文本) 哈希做种生成确定性的单位向量
+- `/v1/chat/completions`：返回固定模板的回答；请求带 tools 时按关键词挑选工具返回 tool_calls，
+  支持 `stream=True` 的 SSE 流式输出（含 tool_calls 增量）；监督者的 `transfer_to_*` 每次转交一个代理，
+  同时问时间与计算的问题会在第一个代理交回后再转交另一个
+- `/v1/models`、`/api/tags`、`/api/version`：列出配置的模型
+- `/api/generate`（空 prompt，仅加载 / 卸载模型）、`/api/show`（模型详情与能力）：供性能探针测量加载耗时；
+  模型首次使用时按 load_latency_ms 模拟冷加载，`keep_alive=0` 卸载
+- 可按模型单独设置延迟，并让指定模型返回不存在的工具名，用于模拟大小模型分级与小模型选错工具
+- 可在流式回答前输出 `delta.reasoning` 推理 token，模拟 qwen3 等推理模型
+
+所有延迟都可配置（单次请求固定延迟 + 流式逐 token 延迟），不引入随机抖动，
+使基准结果只反映被测代码本身的开销。
+
+用法：
+    python -m src.benchmarks.fake_ollama --port 11434 --latency-ms 20 --token-latency-ms 2
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_MODELS = ["turingdance/m3e-base", "granite4:3b", "qwen3:4b"]
+
+
+@dataclass
+class FakeOllamaConfig:
+    """替身服务的行为配置。"""
+
+    models: List[str] = field(default_factory=lambda: list(DEFAULT_MODELS))
+    embedding_dim: int = 768
+    latency_ms: float = 0.0  # 每个 chat 请求的固定延迟（模拟 prefill）
+    token_latency_ms: float = 0.0  # 流式输出时每个 token 的延迟（模拟 decode）
+    embedding_latency_ms: float = 0.0  # 每个向量化请求的延迟
+    completion_tokens: int = 32  # 普通回答的 token 数
+    max_tool_calls: int = 4  # 单轮最多返回的工具调用数
+    model_latency_ms: Dict[str, float] = field(default_factory=dict)  # 按模型覆盖 latency_ms
+    garbled_tool_models: List[str] = field(default_factory=list)  # 这些模型返回的工具名不存在
+    load_latency_ms: float = 0.0  # 模型冷加载耗时（已加载的模型不再等待）
+    embedding_models: List[str] = field(default_factory=lambda: [DEFAULT_MODELS[0]])
+    reasoning_tokens: int = 0  # 回答前的推理 token 数（放在 delta.reasoning，模拟 qwen3 等推理模型）
+
+
+def fake_embedding(model: str, text: str, dim: int) -> List[float]:
+    """由 (模型, 文本) 的哈希做种生成确定性的单位向量。"""
+    digest = hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+    seed = int.from_bytes(digest[:8], "big")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _count_tokens(text: str) -> int:
+    # 粗略估算：不区分中英文，每 2 个字符计 1 个 token（只用于生成稳定的 usage 数值）
+    return max(1, len(text) // 2) if text else 0
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _bigrams(text: str) -> set:
+    text = re.sub(r"\s+", "", text.lower())
+    return {text[i: i + 2] for i in range(len(text) - 1)}
+
+
+# 用户意图关键词 → 工具名称/描述关键词，弥补字面重合匹配不到的情况
+_INTENT_KEYWORDS = [
+    (r"几点|时间|现在|日期|time|date", r"时间|time"),
+    (r"相差|多少天|间隔|diff", r"计算|差|comput"),
+    (r"天气|气温|weather", r"天气|weather"),
+    (r"[+＋]|加|和是", r"和|add"),
+    (r"[-－]|减", r"差|sub"),
+]
+
+
+def _tool_matches(user_text: str, function: Dict[str, Any]) -> bool:
+    tool_text = f"{function.get('name', '')} {function.get('description', '')}"
+    for user_pattern, tool_pattern in _INTENT_KEYWORDS:
+        if re.search(user_pattern, user_text, re.I) and re.search(tool_pattern, tool_text, re.I):
+            return True
+    return bool(_bigrams(user_text) & _bigrams(tool_text))
+
+
+def _pending_user_text(messages: List[Dict[str, Any]], tool_names: set) -> Optional[str]:
+    """若最后一条用户消息之后还没有调用过本次请求中的任何工具，返回该用户消息文本。"""
+    for message in reversed(messages):
+        role = message.get("role")
+        if role == "user":
+            return _message_text(message)
+        if role == "assistant":
+            for tc in message.get("tool_calls") or []:
+                if (tc.get("function") or {}).get("name") in tool_names:
+                    return None
+    return None
+
+
+def _handoffs_since_user(messages: List[Dict[str, Any]]) -> Tuple[str, set]:
+    """返回最后一条用户消息的文本，以及其后已经调用过的 transfer_to_* 工具名。"""
+    called: set = set()
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return _message_text(message), called
+        for tc in message.get("tool_calls") or []:
+            name = (tc.get("function") or {}).get("name") or ""
+            if name.startswith("transfer_to_"):
+                called.add(name)
+    return "", called
+
+
+def _handoff_targets(user_text: str, handoffs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按问题包含的意图挑选代理：时间类交给名字含 time/date 的代理，计算类或其他问题交给第一个其他代理。"""
+    wants_time = bool(re.search(r"时间|几点|日期|time|date", user_text, re.I))
+    wants_other = not wants_time or bool(re.search(r"计算|\d\s*[+\-*/×÷]|加|减|乘|除", user_text))
+    time_agents = [f for f in handoffs if re.search(r"time|date", f["name"])]
+    other_agents = [f for f in handoffs if f not in time_agents]
+    targets = (time_agents[:1] if wants_time else []) + (other_agents[:1] if wants_other else [])
+    return targets or handoffs[:1]
+
+
+class FakeOllamaServer:
+    """可在后台线程中启动的替身服务，支持 with 语句。"""
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, config: Optional[FakeOllamaConfig] = None
+    ) -> None:
+        self.config = config or FakeOllamaConfig()
+        self.stats: Dict[str, int] = {}
+        self.loaded: set = set()
+        self._lock = threading.Lock()
+        handler = type("_BoundHandler", (_FakeOllamaHandler,), {"server_ref": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fake-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def load(self, model: str, keep_alive: Any = None) -> int:
+        """模拟模型加载，返回本次加载耗时（纳秒）；keep_alive 为 0 时卸载并返回 0。"""
+        if keep_alive in (0, "0", "0s"):
+            with self._lock:
+                self.loaded.discard(model)
+            return 0
+        with self._lock:
+            if model in self.loaded:
+                return 0
+            self.loaded.add(model)
+        start = time.perf_counter_ns()
+        if self.config.load_latency_ms > 0:
+            time.sleep(self.config.load_latency_ms / 1000.0)
+        return time.perf_counter_ns() - start
+
+    # ---------------- 响应生成 ----------------
+
+    def completion_text(self, model: str, messages: List[Dict[str, Any]]) -> str:
+        prompt = _message_text(messages[-1]) if messages else ""
+        digest = hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+        words = [f"词{int(digest[i % 64], 16)}" for i in range(self.config.completion_tokens)]
+        return f"[fake:{model}] " + " ".join(words)
+
+    def choose_tool_calls(
+        self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]
+    ) -> List[dict]:
+        functions = [
+            t.get("function") or {} for t in tools if t.get("type", "function") == "function"
+        ]
+        handoffs = [f for f in functions if (f.get("name") or "").startswith("transfer_to_")]
+        if handoffs:
+            # 模拟监督者路由：每次只转交一个代理，多部分问题在代理交回后转交下一个，都处理完才回答
+            user_text, called = _handoffs_since_user(messages)
+            targets = _handoff_targets(user_text, handoffs)
+            remaining = [f for f in targets if f["name"] not in called]
+            return [self._tool_call(remaining[0], user_text)] if remaining else []
+
+        names = {f.get("name") for f in functions}
+        user_text = _pending_user_text(messages, names)
+        if user_text is None:
+            return []
+
+        chosen = [f for f in functions if _tool_matches(user_text, f)]
+        return [self._tool_call(f, user_text) for f in chosen[: self.config.max_tool_calls]]
+
+    @staticmethod
+    def _tool_call(function: Dict[str, Any], user_text: str) -> dict:
+        params = (function.get("parameters") or {}).get("properties") or {}
+        numbers = [int(n) for n in re.findall(r"\d+", user_text)]
+        args: Dict[str, Any] = {}
+        for name, schema in params.items():
+            kind = schema.get("type")
+            if kind in ("integer", "number"):
+                args[name] = numbers.pop(0) if numbers else 1
+            elif "start" in name and "time" in name:
+                args[name] = "1980-01-01 00:00:00"
+            elif "time" in name:
+                args[name] = "2026-01-01 00:00:00"
+            elif name == "city":
+                args[name] = "北京"
+            else:
+                args[name] = user_text[:16]
+        call_id = "call_" + hashlib.sha256(
+            f"{function.get('name')}\0{user_text}".encode("utf-8")
+        ).hexdigest()[:12]
+        return {
+            "id": call_id,
+            "type": "function",
+            "function": {
+                "name": function.get("name"),
+                "arguments": json.dumps(args, ensure_ascii=False),
+            },
+        }
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_ref: FakeOllamaServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002  静默访问日志
+        pass
+
+    # ---------------- 基础工具 ----------------
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"{}")
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sleep(self, ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    # ---------------- 路由 ----------------
+
+    def do_GET(self):  # noqa: N802
+        srv = self.server_ref
+        path = self.path.split("?", 1)[0]
+        srv.count(path)
+        now = int(time.time())
+        if path == "/v1/models":
+            self._send_json({
+                "object": "list",
+                "data": [
+                    {"id": m, "object": "model", "created": now, "owned_by": "library"}
+                    for m in srv.config.models
+                ],
+            })
+        elif path == "/api/tags":
+            models = [{"name": m, "model": m, "size": 0} for m in srv.config.models]
+            self._send_json({"models": models})
+        elif path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": f"not found: {path}"}, status=404)
+
+    def do_POST(self):  # noqa: N802
+        srv = self.server_ref
+        path = self.path.split("?", 1)[0]
+        srv.count(path)
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError as e:
+            self._send_json({"error": f"invalid json: {e}"}, status=400)
+            return
+        if path == "/api/embeddings":
+            self._handle_embeddings(body)
+        elif path == "/api/embed":
+            self._handle_embed(body)
+        elif path == "/v1/chat/completions":
+            self._handle_chat(body)
+        elif path == "/api/generate":
+            self._handle_generate(body)
+        elif path == "/api/show":
+            self._handle_show(body)
+        else:
+            self._send_json({"error": f"not found: {path}"}, status=404)
+
+    def _handle_embeddings(self, body: Dict[str, Any]) -> None:
+        cfg = self.server_ref.config
+        self._sleep(cfg.embedding_latency_ms)
+        vec = fake_embedding(body.get("model", ""), body.get("prompt", ""), cfg.embedding_dim)
+        self._send_json({"embedding": vec})
+
+    def _handle_embed(self, body: Dict[str, Any]) -> None:
+        cfg = self.server_ref.config
+        start = time.perf_counter_ns()
+        inputs = body.get("input", "")
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        model = body.get("model", "")
+        load_ns = self.server_ref.load(model, body.get("keep_alive"))
+        self._sleep(cfg.embedding_latency_ms)
+        vectors = [fake_embedding(model, t, cfg.embedding_dim) for t in texts]
+        self._send_json({
+            "model": model,
+            "embeddings": vectors,
+            "total_duration": time.perf_counter_ns() - start,
+            "load_duration": load_ns,
+            "prompt_eval_count": sum(_count_tokens(t) for t in texts),
+        })
+
+    def _handle_generate(self, body: Dict[str, Any]) -> None:
+        srv = self.server_ref
+        model = body.get("model", "")
+        if model in srv.config.embedding_models:
+            self._send_json({"error": f'"{model}" does not support generate'}, status=400)
+            return
+        start = time.perf_counter_ns()
+        keep_alive = body.get("keep_alive")
+        unload = keep_alive in (0, "0", "0s")
+        load_ns = srv.load(model, keep_alive)
+        prompt = body.get("prompt") or ""
+        response = ""
+        if prompt and not unload:
+            response = srv.completion_text(model, [{"role": "user", "content": prompt}])
+        self._send_json({
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": response,
+            "done": True,
+            "done_reason": "unload" if unload else ("stop" if response else "load"),
+            "total_duration": time.perf_counter_ns() - start,
+            "load_duration": load_ns,
+        })
+
+    def _handle_show(self, body: Dict[str, Any]) -> None:
+        srv = self.server_ref
+        model = body.get("model") or body.get("name") or ""
+        if model not in srv.config.models:
+            self._send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+        embedding = model in srv.config.embedding_models
+        self._send_json({
+            "details": {
+                "format": "gguf",
+                "family": model.split(":", 1)[0].split("/")[-1],
+                "parameter_size": model.split(":", 1)[1] if ":" in model else "",
+                "quantization_level": "F16" if embedding else "Q4_K_M",
+            },
+            "capabilities": ["embedding"] if embedding else ["completion", "tools"],
+        })
+
+    def _handle_chat(self, body: Dict[str, Any]) -> None:
+        srv = self.server_ref
+        cfg = srv.config
+        model = body.get("model", "")
+        srv.load(model, body.get("keep_alive"))
+        messages = body.get("messages") or []
+        tool_calls = srv.choose_tool_calls(messages, body.get("tools") or [])
+        if model in cfg.garbled_tool_models:
+            for call in tool_calls:
+                call["function"]["name"] += "_v2"
+        content = "" if tool_calls else srv.completion_text(model, messages)
+        prompt_tokens = sum(_count_tokens(_message_text(m)) for m in messages)
+        completion_tokens = (
+            cfg.completion_tokens + cfg.reasoning_tokens if content else len(tool_calls) * 8
+        )
+        self._sleep(cfg.model_latency_ms.get(model, cfg.latency_ms))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            message: Dict[str, Any] = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def write_chunk(choices: List[dict], extra: Optional[dict] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def emit(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+            write_chunk([{"index": 0, "delta": delta, "finish_reason": finish}])
+
+        emit({"role": "assistant", "content": ""})
+        if tool_calls:
+            for index, tc in enumerate(tool_calls):
+                emit({"tool_calls": [{
+                    "index": index,
+                    "id": tc["id"],
+                    "type": "function",
+                    "function": {"name": tc["function"]["name"], "arguments": ""},
+                }]})
+                args = tc["function"]["arguments"]
+                for i in range(0, len(args), 8):
+                    self._sleep(cfg.token_latency_ms)
+                    piece = {"index": index, "function": {"arguments": args[i: i + 8]}}
+                    emit({"tool_calls": [piece]})
+        else:
+            for i in range(cfg.reasoning_tokens):
+                self._sleep(cfg.token_latency_ms)
+                emit({"reasoning": f"思考{i} "})
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                self._sleep(cfg.token_latency_ms)
+                emit({"content": word if i == 0 else " " + word})
+        emit({}, finish=finish_reason)
+        if include_usage:
+            write_chunk([], extra={"usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线 Ollama 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个 chat 请求的固定延迟")
+    parser.add_argument(
+        "--token-latency-ms", type=float, default=0.0, help="流式输出每个 token 的延迟"
+    )
+    parser.add_argument(
+        "--embedding-latency-ms", type=float, default=0.0, help="每个向量化请求的延迟"
+    )
+    parser.add_argument("--completion-tokens", type=int, default=32)
+    parser.add_argument("--max-tool-calls", type=int, default=4)
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=MS",
+        help="按模型覆盖 chat 请求延迟，可重复，如 --model-latency granite4:3b=5",
+    )
+    parser.add_argument("--garbled-tool-models", nargs="*", default=[],
+                        help="返回不存在的工具名的模型")
+    parser.add_argument("--load-latency-ms", type=float, default=0.0, help="模型冷加载耗时")
+    parser.add_argument("--reasoning-tokens", type=int, default=0,
+                        help="流式回答前输出的推理 token 数（delta.reasoning）")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        models=args.models,
+        embedding_dim=args.embedding_dim,
+        latency_ms=args.latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        completion_tokens=args.completion_tokens,
+        max_tool_calls=args.max_tool_calls,
+        model_latency_ms={
+            model: float(ms) for model, _, ms in (v.rpartition("=") for v in args.model_latency)
+        },
+        garbled_tool_models=args.garbled_tool_models,
+        load_latency_ms=args.load_latency_ms,
+        reasoning_tokens=args.reasoning_tokens,
+    )
+    server = FakeOllamaServer(args.host, args.port, config)
+    print(f"fake ollama 已启动: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
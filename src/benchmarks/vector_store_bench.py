@@ -0,0 +1,176 @@
+"""向量库后端基准测试
+
+在同一份录制好的语料与查询集上回放 Chroma 与 Milvus Lite，输出写入吞吐（rows/s）、
+查询延迟 p50/p95/p99 以及落盘大小。录制阶段调用 Ollama 做一次向量化并保存结果，
+回放阶段不再访问模型，只度量存储后端本身。
+
+用法：
+    # 1. 录制：切分 Markdown 并向量化，保存语料与查询
+    python -m src.benchmarks.vector_store_bench record \\
+        --kb src/rag/知识库_考核要求.md --query "年终奖怎么发？" --out bench_data
+
+    # 2. 回放：对每个后端写入并查询
+    python -m src.benchmarks.vector_store_bench run \\
+        --corpus bench_data/corpus.jsonl --queries bench_data/queries.jsonl --backends chroma milvus
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+from src.common.stats import LatencySummary
+from src.rag.vector_store import VectorRecord, create_vector_store, directory_size
+
+
+def _read_jsonl(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _write_jsonl(path: str, rows: List[dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def record(
+    kb_files: List[str],
+    queries: List[str],
+    out_dir: str,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> None:
+    """切分并向量化知识库与查询，写出 corpus.jsonl / queries.jsonl。"""
+    from src.rag.knowledge_base import embed_text, load_markdown, split_documents
+
+    os.makedirs(out_dir, exist_ok=True)
+    corpus: List[dict] = []
+    for file_path in kb_files:
+        base_name = os.path.basename(file_path)
+        docs = split_documents(load_markdown(file_path), chunk_size, chunk_overlap)
+        for idx, doc in enumerate(docs, start=1):
+            corpus.append({
+                "id": f"{base_name}_{idx}",
+                "text": doc.page_content,
+                "metadata": doc.metadata,
+                "vector": embed_text(doc.page_content),
+            })
+    query_rows = [{"text": q, "vector": embed_text(q)} for q in queries]
+    _write_jsonl(os.path.join(out_dir, "corpus.jsonl"), corpus)
+    _write_jsonl(os.path.join(out_dir, "queries.jsonl"), query_rows)
+    print(f"已录制 {len(corpus)} 条语料、{len(query_rows)} 条查询到 {out_dir}")
+
+
+def bench_backend(
+    backend: str,
+    corpus: List[dict],
+    queries: List[dict],
+    workdir: str,
+    batch_size: int,
+    top_k: int,
+    rounds: int,
+) -> Dict[str, object]:
+    """在一个全新的存储目录上写入语料并执行查询，返回指标字典。"""
+    path = os.path.join(workdir, f"{backend}_store")
+    if backend == "milvus":
+        path += ".db"
+    dimension = len(corpus[0]["vector"]) if corpus else 768
+    kwargs = {"dimension": dimension} if backend == "milvus" else {}
+    store = create_vector_store(backend, "bench_collection", path=path, **kwargs)
+
+    records = [
+        VectorRecord(
+            id=row["id"],
+            vector=row["vector"],
+            content=row["text"],
+            metadata=row.get("metadata") or {},
+        )
+        for row in corpus
+    ]
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        store.add(records[i: i + batch_size])
+    ingest_seconds = time.perf_counter() - start
+
+    latencies: List[float] = []
+    for _ in range(rounds):
+        for q in queries:
+            t0 = time.perf_counter()
+            store.search(q["vector"], top_k=top_k)
+            latencies.append(time.perf_counter() - t0)
+
+    summary = LatencySummary.from_samples(latencies)
+    return {
+        "backend": backend,
+        "rows": store.count(),
+        "ingest_seconds": ingest_seconds,
+        "ingest_rows_per_s": len(records) / ingest_seconds if ingest_seconds > 0 else 0.0,
+        "query": summary.to_dict(),
+        "disk_bytes": directory_size(path),
+    }
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, object]]:
+    corpus = _read_jsonl(args.corpus)
+    queries = _read_jsonl(args.queries)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vector_store_bench_")
+    results = []
+    try:
+        for backend in args.backends:
+            res = bench_backend(
+                backend, corpus, queries, workdir, args.batch_size, args.top_k, args.rounds
+            )
+            q = res["query"]
+            print(
+                f"[{backend}] rows={res['rows']} ingest={res['ingest_rows_per_s']:.1f} rows/s "
+                f"query p50={q['p50'] * 1000:.2f}ms p95={q['p95'] * 1000:.2f}ms "
+                f"p99={q['p99'] * 1000:.2f}ms "
+                f"disk={res['disk_bytes'] / 1024:.1f}KiB"
+            )
+            results.append(res)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量库后端基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="录制语料与查询向量")
+    rec.add_argument("--kb", nargs="+", required=True, help="Markdown 知识库文件")
+    rec.add_argument("--query", nargs="+", required=True, help="查询问题")
+    rec.add_argument("--out", required=True, help="输出目录")
+    rec.add_argument("--chunk-size", type=int, default=1000)
+    rec.add_argument("--chunk-overlap", type=int, default=200)
+
+    runp = sub.add_parser("run", help="在各后端上回放语料与查询")
+    runp.add_argument("--corpus", required=True)
+    runp.add_argument("--queries", required=True)
+    runp.add_argument(
+        "--backends", nargs="+", default=["chroma", "milvus"], choices=["chroma", "milvus"]
+    )
+    runp.add_argument("--batch-size", type=int, default=64)
+    runp.add_argument("--top-k", type=int, default=3)
+    runp.add_argument("--rounds", type=int, default=20, help="查询集重复回放的轮数")
+    runp.add_argument("--workdir", help="存储目录（默认临时目录，结束后删除）")
+    runp.add_argument("--keep", action="store_true", help="保留临时存储目录")
+    runp.add_argument("--json", help="将结果写入 JSON 文件")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.kb, args.query, args.out, args.chunk_size, args.chunk_overlap)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""公共基础模块
+
+存放被多个示例模块共用的基础设施代码（统计工具等）。
+"""
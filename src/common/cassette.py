@@ -0,0 +1,431 @@
+"""模型调用录制 / 回放（cassette）
+
+函数调用循环、Agent 与 RAG 都依赖实时模型调用，耗时不确定，也无法离线做回归测试。
+本模块在 httpx 传输层录制每一对请求/响应（chat、tool_calls、向量化、流式输出），
+按请求哈希保存为紧凑的 JSONL 磁带文件；回放时直接返回录制的响应，可选按录制时的
+首字节时间与流式分块间隔重放延迟。不开启计时回放时，模型耗时为零，剩下的就是管线自身的开销。
+
+由于所有模型调用都走 `ollama_client` 的共享连接池，只需设置环境变量即可对整个进程生效：
+    OLLAMA_CASSETTE=calls.jsonl OLLAMA_CASSETTE_MODE=record python -m src.rag.rag_test
+    OLLAMA_CASSETTE=calls.jsonl OLLAMA_CASSETTE_MODE=replay python -m src.rag.rag_test
+    OLLAMA_CASSETTE_TIMING=1 ...   # 回放时重现录制时的延迟
+    OLLAMA_CASSETTE_STRICT=0 ...   # 允许按录制顺序回退（见下文）
+
+模式：
+- record：请求真实服务并追加录制
+- replay：只回放，不访问网络；未录制的请求抛出 CassetteMiss
+- auto：已录制的请求回放，未录制的请求转发并录制
+
+请求键为 “方法 + 路径 + 规范化 JSON 请求体” 的 sha256，与 base_url 无关。规范化时会把
+“YYYY-MM-DD HH:MM:SS” 形式的时间替换为占位符（get_current_time 每次返回不同的时间）。
+默认严格匹配：请求体（如 prompt）变化后精确匹配失败即视为未录制，回放抛出 CassetteMiss，
+不会把旧回答悄悄当作新请求的结果，磁带才能用作回归测试。`strict=False`（OLLAMA_CASSETTE_STRICT=0）时
+按同一 (方法, 路径, 模型, 是否流式) 的录制顺序回放下一条未用过的录制（fallback），
+用于工具结果含实时 / 随机值、请求体无法逐字复现的多轮对话。
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay", "auto")
+_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?")
+# 录制的是传输层的原始字节流（未解压），回放时须保留编码与长度头，客户端才会按原样解码
+_KEPT_HEADERS = ("content-type", "content-encoding", "content-length")
+
+
+class CassetteMiss(LookupError):
+    """回放模式下请求未被录制。"""
+
+
+def mask_datetimes(value: Any) -> Any:
+    """递归地把字符串中的时间戳替换为占位符。"""
+    if isinstance(value, str):
+        return _DATETIME_RE.sub("<datetime>", value)
+    if isinstance(value, list):
+        return [mask_datetimes(v) for v in value]
+    if isinstance(value, dict):
+        return {k: mask_datetimes(v) for k, v in value.items()}
+    return value
+
+
+DEFAULT_NORMALIZERS: Tuple[Callable[[Any], Any], ...] = (mask_datetimes,)
+
+
+def _parse_body(body: bytes) -> Any:
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+def request_key(
+    method: str,
+    path: str,
+    body: bytes,
+    normalizers: Sequence[Callable[[Any], Any]] = DEFAULT_NORMALIZERS,
+) -> str:
+    """计算请求哈希：方法 + 路径（含查询串）+ 规范化后的请求体。"""
+    data = _parse_body(body)
+    if data is None:
+        canonical = body.decode("utf-8", errors="replace")
+    else:
+        for normalize in normalizers:
+            data = normalize(data)
+        canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256(f"{method} {path}\n{canonical}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _route(method: str, path: str, body: bytes) -> str:
+    data = _parse_body(body)
+    if not isinstance(data, dict):
+        return f"{method} {path}"
+    return f"{method} {path} {data.get('model', '')} stream={bool(data.get('stream'))}"
+
+
+def _encode(chunk: bytes) -> Any:
+    try:
+        return chunk.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(chunk).decode("ascii")}
+
+
+def _decode(chunk: Any) -> bytes:
+    if isinstance(chunk, dict):
+        return base64.b64decode(chunk["b64"])
+    return chunk.encode("utf-8")
+
+
+@dataclass
+class Interaction:
+    """一次录制的请求/响应。chunks 为 [(相对请求开始的秒数, 数据)]。"""
+
+    key: str
+    route: str
+    status: int
+    headers: Dict[str, str]
+    chunks: List[Tuple[float, bytes]] = field(default_factory=list)
+    used: bool = field(default=False, compare=False)
+
+    def to_json(self) -> Dict[str, Any]:
+        record: Dict[str, Any] = {
+            "key": self.key,
+            "route": self.route,
+            "status": self.status,
+            "headers": self.headers,
+        }
+        if len(self.chunks) == 1:
+            record["t"] = round(self.chunks[0][0], 6)
+            record["body"] = _encode(self.chunks[0][1])
+        else:
+            record["chunks"] = [[round(t, 6), _encode(c)] for t, c in self.chunks]
+        return record
+
+    @classmethod
+    def from_json(cls, record: Dict[str, Any]) -> "Interaction":
+        if "body" in record:
+            chunks = [(record.get("t", 0.0), _decode(record["body"]))]
+        else:
+            chunks = [(t, _decode(c)) for t, c in record.get("chunks", [])]
+        return cls(
+            key=record["key"],
+            route=record.get("route", ""),
+            status=record["status"],
+            headers=record.get("headers", {}),
+            chunks=chunks,
+        )
+
+    @property
+    def elapsed(self) -> float:
+        return self.chunks[-1][0] if self.chunks else 0.0
+
+
+class Cassette:
+    """磁带文件：加载已有录制，线程安全地追加新录制并按请求查找回放。"""
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        timing: bool = False,
+        strict: bool = True,
+        normalizers: Sequence[Callable[[Any], Any]] = DEFAULT_NORMALIZERS,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"未知的 cassette 模式: {mode}，可选 {MODES}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.strict = strict
+        self.normalizers = tuple(normalizers)
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[Interaction]] = defaultdict(list)
+        self._by_route: Dict[str, List[Interaction]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self.stats = {"hits": 0, "fallback_hits": 0, "misses": 0, "recorded": 0}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(Interaction.from_json(json.loads(line)))
+        except FileNotFoundError:
+            pass
+
+    def _index(self, interaction: Interaction) -> None:
+        self._by_key[interaction.key].append(interaction)
+        self._by_route[interaction.route].append(interaction)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._by_key.values())
+
+    def key_for(self, request: httpx.Request) -> Tuple[str, str]:
+        body = request.content
+        path = request.url.raw_path.decode("ascii")
+        return request_key(request.method, path, body, self.normalizers), _route(
+            request.method, request.url.path, body
+        )
+
+    def _take(self, name: str, candidates: List[Interaction]) -> Interaction:
+        """优先返回尚未回放过的录制；全部用过后循环复用。"""
+        for interaction in candidates:
+            if not interaction.used:
+                interaction.used = True
+                return interaction
+        idx = self._cursor[name]
+        self._cursor[name] = idx + 1
+        return candidates[idx % len(candidates)]
+
+    def lookup(self, key: str, route: str) -> Optional[Interaction]:
+        """按请求键查找；非严格模式下键不存在时按同一路由的录制顺序回退到下一条未回放的录制。"""
+        with self._lock:
+            candidates = self._by_key.get(key)
+            if candidates:
+                self.stats["hits"] += 1
+                return self._take(key, candidates)
+            if not self.strict and self._by_route.get(route):
+                self.stats["fallback_hits"] += 1
+                return self._take(route, self._by_route[route])
+            self.stats["misses"] += 1
+            return None
+
+    def record(self, interaction: Interaction) -> None:
+        line = json.dumps(interaction.to_json(), ensure_ascii=False)
+        with self._lock:
+            self._index(interaction)
+            self.stats["recorded"] += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def transport(self, wrapped: Optional[httpx.BaseTransport]) -> "CassetteTransport":
+        return CassetteTransport(self, wrapped)
+
+    def async_transport(
+        self, wrapped: Optional[httpx.AsyncBaseTransport]
+    ) -> "AsyncCassetteTransport":
+        return AsyncCassetteTransport(self, wrapped)
+
+
+def _response_headers(response: httpx.Response) -> Dict[str, str]:
+    return {k: response.headers[k] for k in _KEPT_HEADERS if k in response.headers}
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, interaction: Interaction, timing: bool) -> None:
+        self.interaction = interaction
+        self.timing = timing
+
+    def __iter__(self) -> Iterator[bytes]:
+        start = time.perf_counter()
+        for offset, chunk in self.interaction.chunks:
+            if self.timing:
+                delay = offset - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield chunk
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, interaction: Interaction, timing: bool) -> None:
+        self.interaction = interaction
+        self.timing = timing
+
+    async def __aiter__(self):
+        start = time.perf_counter()
+        for offset, chunk in self.interaction.chunks:
+            if self.timing:
+                delay = offset - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+
+class _Recorder:
+    """录制一次响应的分块及其时间，响应关闭时写入磁带。"""
+
+    def __init__(self, cassette: Cassette, key: str, route: str, response: httpx.Response,
+                 start: float) -> None:
+        self.cassette = cassette
+        self.interaction = Interaction(
+            key=key, route=route, status=response.status_code,
+            headers=_response_headers(response),
+        )
+        self.start = start
+        self.saved = False
+
+    def add(self, chunk: bytes) -> None:
+        if chunk:
+            self.interaction.chunks.append((time.perf_counter() - self.start, chunk))
+
+    def save(self) -> None:
+        if self.saved:
+            return
+        self.saved = True
+        if not self.interaction.chunks:
+            self.interaction.chunks.append((time.perf_counter() - self.start, b""))
+        elif not self.interaction.headers.get("content-type", "").startswith(
+            ("text/event-stream", "application/x-ndjson")
+        ):
+            # 非流式响应合并为一个分块，时间取最后一块到达的时刻
+            offset = self.interaction.chunks[-1][0]
+            body = b"".join(c for _, c in self.interaction.chunks)
+            self.interaction.chunks = [(offset, body)]
+        self.cassette.record(self.interaction)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, recorder: _Recorder) -> None:
+        self.stream = stream
+        self.recorder = recorder
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.stream:
+            self.recorder.add(chunk)
+            yield chunk
+        self.recorder.save()
+
+    def close(self) -> None:
+        # SSE 客户端读到 [DONE] 后可能不再迭代而直接关闭，此时也要落盘
+        self.recorder.save()
+        self.stream.close()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, recorder: _Recorder) -> None:
+        self.stream = stream
+        self.recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.recorder.add(chunk)
+            yield chunk
+        self.recorder.save()
+
+    async def aclose(self) -> None:
+        self.recorder.save()
+        await self.stream.aclose()
+
+
+def _replay_response(request: httpx.Request, interaction: Interaction, stream: Any):
+    return httpx.Response(
+        interaction.status, headers=interaction.headers, stream=stream, request=request
+    )
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """同步 httpx 传输层：按磁带模式回放或录制。"""
+
+    def __init__(self, cassette: Cassette, wrapped: Optional[httpx.BaseTransport]) -> None:
+        self.cassette = cassette
+        self.wrapped = wrapped
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key, route = self.cassette.key_for(request)
+        if self.cassette.mode != "record":
+            interaction = self.cassette.lookup(key, route)
+            if interaction is not None:
+                stream = _ReplayStream(interaction, self.cassette.timing)
+                return _replay_response(request, interaction, stream)
+            if self.cassette.mode == "replay" or self.wrapped is None:
+                raise CassetteMiss(f"cassette 中没有该请求: {route} ({key})")
+        start = time.perf_counter()
+        response = self.wrapped.handle_request(request)
+        recorder = _Recorder(self.cassette, key, route, response, start)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, recorder),
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        if self.wrapped is not None:
+            self.wrapped.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """异步 httpx 传输层。"""
+
+    def __init__(
+        self, cassette: Cassette, wrapped: Optional[httpx.AsyncBaseTransport]
+    ) -> None:
+        self.cassette = cassette
+        self.wrapped = wrapped
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key, route = self.cassette.key_for(request)
+        if self.cassette.mode != "record":
+            interaction = self.cassette.lookup(key, route)
+            if interaction is not None:
+                stream = _AsyncReplayStream(interaction, self.cassette.timing)
+                return _replay_response(request, interaction, stream)
+            if self.cassette.mode == "replay" or self.wrapped is None:
+                raise CassetteMiss(f"cassette 中没有该请求: {route} ({key})")
+        start = time.perf_counter()
+        response = await self.wrapped.handle_async_request(request)
+        recorder = _Recorder(self.cassette, key, route, response, start)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recorder),
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        if self.wrapped is not None:
+            await self.wrapped.aclose()
+
+
+_cassettes: Dict[Tuple[str, str, bool, bool], Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str, mode: str = "replay", timing: bool = False,
+                 strict: bool = True) -> Cassette:
+    """返回同一配置下进程内共享的 Cassette（同步与异步连接池共用一份录制）。"""
+    key = (path, mode, timing, strict)
+    with _cassettes_lock:
+        cassette = _cassettes.get(key)
+        if cassette is None:
+            cassette = _cassettes[key] = Cassette(path, mode, timing=timing, strict=strict)
+        return cassette
@@ -0,0 +1,96 @@
+"""按名称注册、首次访问时构建并缓存的对象工厂
+
+示例脚本原先在导入时就构造 ChatOpenAI、调用 create_agent 并编译监督者图，导入模块只为用其中一个工具
+也要付出 langchain_openai / langgraph / langgraph_supervisor 的全部启动开销。`LazyFactory` 把这些对象
+改为注册构建函数：
+
+- 第一次 `get(name)` 时才调用构建函数（重型依赖在构建函数内部导入），结果缓存并在之后复用
+- 构建函数可以通过 `get()` 依赖其它对象（可重入锁，同一线程内嵌套构建不会死锁）
+- `clear()` 丢弃已构建的对象，下次访问时重建；`ollama_client.configure()` 关闭连接池时会自动调用，
+  避免继续使用绑定在已关闭客户端上的模型
+- `module_getattr()` 生成 PEP 562 的模块 `__getattr__`，保留 `module.agent` 这样的属性访问方式
+
+用法：
+    factory = LazyFactory("src.agents.single_agent")
+
+    @factory.register("agent")
+    def _build_agent():
+        from langchain.agents import create_agent
+        return create_agent(model=factory.get("llm"), tools=[...])
+
+    __getattr__ = factory.module_getattr()
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+Builder = Callable[[], Any]
+
+
+class LazyFactory:
+    """惰性构建并缓存命名对象；线程安全，每个对象最多构建一次（clear 之前）。"""
+
+    def __init__(self, module_name: str) -> None:
+        self.module_name = module_name
+        self._builders: Dict[str, Builder] = {}
+        self._cache: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        # 每个对象最近一次构建的耗时（秒），用于观察首次访问的开销
+        self.build_seconds: Dict[str, float] = {}
+
+    def register(self, name: str, builder: Optional[Builder] = None):
+        """注册构建函数；不传 builder 时作为装饰器使用。"""
+
+        def decorator(func: Builder) -> Builder:
+            with self._lock:
+                self._builders[name] = func
+                self._cache.pop(name, None)
+            return func
+
+        return decorator(builder) if builder is not None else decorator
+
+    def get(self, name: str) -> Any:
+        """返回已缓存的对象，没有时构建。"""
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name in self._cache:
+                return self._cache[name]
+            if name not in self._builders:
+                raise KeyError(f"{self.module_name} 中未注册 {name!r}")
+            start = time.perf_counter()
+            value = self._builders[name]()
+            self.build_seconds[name] = time.perf_counter() - start
+            self._cache[name] = value
+            return value
+
+    def names(self) -> List[str]:
+        return list(self._builders)
+
+    def built(self) -> List[str]:
+        """已构建（缓存中）的对象名。"""
+        return list(self._cache)
+
+    def clear(self, name: Optional[str] = None) -> None:
+        """丢弃缓存的对象（不指定 name 时全部丢弃），下次 get 时重建。"""
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._builders
+
+    def module_getattr(self) -> Callable[[str], Any]:
+        """生成模块级 `__getattr__`：访问未定义的模块属性时按名称惰性构建。"""
+
+        def __getattr__(name: str) -> Any:
+            if name in self._builders:
+                return self.get(name)
+            raise AttributeError(f"module {self.module_name!r} has no attribute {name!r}")
+
+        return __getattr__
@@ -0,0 +1,195 @@
+"""非阻塞结构化日志
+
+`logging.basicConfig` 配置的 FileHandler/StreamHandler 在调用线程里同步格式化并写文件，
+并发对话时每次工具调用的若干行日志都会把文件 I/O 带到请求路径上。`setup_logging()` 改为：
+
+- 根 logger 只挂一个 `QueueHandler`，调用线程只做入队；格式化与写入由 `QueueListener`
+  的后台线程完成
+- 入队时不提前合并 `msg % args`（惰性格式化），被过滤或采样丢弃的记录完全不产生格式化开销；
+  因此日志参数应当是不会再被修改的值
+- 文件输出为每行一个 JSON 对象，`extra={...}` 中的字段原样作为结构化字段输出
+- 文件按大小轮转（RotatingFileHandler）
+- 可对 INFO 及以下级别的高频日志按比例采样，WARNING 及以上始终保留
+
+用法：
+    from src.common.logging_setup import setup_logging
+
+    setup_logging("function_tool.log", info_sample_rate=0.1)
+    logger.info("工具执行结果: %s", result, extra={"tool": name, "elapsed_ms": 12.3})
+
+环境变量（参数未显式传入时生效）：LOG_LEVEL、LOG_JSON（默认 1）、LOG_INFO_SAMPLE_RATE（默认 1.0）、
+LOG_MAX_BYTES（默认 10MB）、LOG_BACKUP_COUNT（默认 5）。
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+# LogRecord 的内置属性，其余属性视为 extra 字段
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "taskName",
+}
+
+PLAIN_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为一行 JSON。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按比例保留 INFO 及以下级别的记录，WARNING 及以上始终放行。
+
+    采用确定性的累积计数而不是随机数：rate=0.1 时每 10 条保留 1 条。
+    prefixes 非空时只对这些 logger 名前缀下的记录采样。
+    """
+
+    def __init__(self, rate: float = 1.0, prefixes: Sequence[str] = ()) -> None:
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+        self.prefixes = tuple(prefixes)
+        self._credit = 0.0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO:
+            return True
+        if self.prefixes and not record.name.startswith(self.prefixes):
+            return True
+        with self._lock:
+            self._credit += self.rate
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            self.dropped += 1
+            return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """入队时不合并 msg 与 args，格式化推迟到监听线程。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # traceback 对象不能跨线程安全地延后格式化，这里先转成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_state_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[LazyQueueHandler] = None
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def setup_logging(
+    log_file: Optional[str] = "function_tool.log",
+    level: Optional[int] = None,
+    json_format: Optional[bool] = None,
+    console: bool = True,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+    info_sample_rate: Optional[float] = None,
+    sample_prefixes: Sequence[str] = (),
+) -> logging.handlers.QueueListener:
+    """在根 logger 上挂载队列日志，返回已启动的 QueueListener。重复调用返回同一个监听器。
+
+    只应由脚本入口调用。根 logger 上已有的 handler（宿主程序配置的）保持不动；
+    与 logging.basicConfig 一样，只有根 logger 尚未配置 handler 或显式传入 level 时才修改其级别。
+    """
+    global _listener, _queue_handler
+    with _state_lock:
+        if _listener is not None:
+            return _listener
+
+        root = logging.getLogger()
+        set_level = level is not None or not root.handlers
+        if level is None:
+            level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+        if json_format is None:
+            json_format = os.getenv("LOG_JSON", "1") != "0"
+        if max_bytes is None:
+            max_bytes = int(_env_float("LOG_MAX_BYTES", 10 * 1024 * 1024))
+        if backup_count is None:
+            backup_count = int(_env_float("LOG_BACKUP_COUNT", 5))
+        if info_sample_rate is None:
+            info_sample_rate = _env_float("LOG_INFO_SAMPLE_RATE", 1.0)
+
+        handlers: List[logging.Handler] = []
+        if log_file:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(
+                JsonFormatter() if json_format else logging.Formatter(PLAIN_FORMAT)
+            )
+            handlers.append(file_handler)
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter(PLAIN_FORMAT))
+            handlers.append(stream_handler)
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        if info_sample_rate < 1.0:
+            queue_handler.addFilter(SamplingFilter(info_sample_rate, sample_prefixes))
+
+        if set_level:
+            root.setLevel(level)
+        queue_handler.setLevel(level)
+        root.addHandler(queue_handler)
+
+        listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        _listener, _queue_handler = listener, queue_handler
+        return listener
+
+
+def shutdown_logging() -> None:
+    """停止监听线程并刷新全部待写日志。"""
+    global _listener, _queue_handler
+    with _state_lock:
+        listener, handler = _listener, _queue_handler
+        _listener = _queue_handler = None
+    if listener is None:
+        return
+    listener.stop()
+    for h in listener.handlers:
+        h.close()
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+
+
+atexit.register(shutdown_logging)
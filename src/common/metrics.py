@@ -0,0 +1,307 @@
+"""Ollama 服务端耗时指标采集与 Prometheus 导出
+
+Ollama 原生接口的响应里带有 `total_duration`、`load_duration`、`prompt_eval_count`、
+`prompt_eval_duration`、`eval_count`、`eval_duration`（单位纳秒，见 rag/ollama_api_format.md），
+OpenAI 兼容接口则返回 `usage`。此前这些字段都被丢弃。
+
+本模块提供一个进程内的指标注册表，按 (endpoint, model) 维度记录直方图与计数器：
+
+- ollama_request_duration_seconds：客户端观测到的端到端耗时
+- ollama_queue_duration_seconds：端到端耗时减去服务端 total_duration（排队 + 网络）
+- ollama_load_duration_seconds / ollama_prompt_eval_duration_seconds / ollama_eval_duration_seconds：
+  模型加载、prefill、decode 耗时
+- ollama_prompt_tokens / ollama_completion_tokens：输入、输出 token 数
+- ollama_stream_first_chunk_seconds / ollama_stream_decode_seconds：流式响应在客户端测得的
+  首个 chunk 延迟（排队 + 加载 + prefill）与首个到最后一个 chunk 的耗时（decode）
+
+`ollama_client` 的共享连接池通过响应钩子自动调用 `record_ollama_response`，
+流式响应读完（或被关闭）时调用 `record_ollama_stream`，所有走共享连接池的向量化与 chat 调用都会被采集。
+
+各接口能提供的字段不同：
+- /api/embeddings（embed / aembed 使用）：只返回向量，只有客户端测得的请求耗时
+- /api/embed（embed_batch 使用）：total / load 耗时与输入 token 数（没有 prefill / decode 之分）
+- 非流式 /v1/chat/completions：只有 usage 中的 token 数，服务端耗时无法拆分，只有端到端耗时
+- 流式 /v1/chat/completions：客户端计时的首个 chunk 延迟与 decode 耗时，最后一个 chunk 的 usage
+- 原生 /api/chat、/api/generate：全部服务端计时字段
+
+导出方式：
+- `render_prometheus()` 返回 Prometheus 文本格式
+- `write_prometheus(path)` 原子写入文本文件（配合 node_exporter textfile collector）；
+  设置 OLLAMA_METRICS_TEXTFILE 环境变量时进程退出前自动写出
+- `start_metrics_server(port)` 在后台线程提供 /metrics 端点
+"""
+
+import atexit
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (1, 8, 32, 128, 512, 2048, 8192, 32768)
+
+LabelValues = Tuple[str, ...]
+
+
+class Histogram:
+    """带标签的累积直方图，线程安全。"""
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [每个桶的计数..., +Inf 计数], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[label_values] = series
+            series[0][idx] += 1
+            series[1][0] += value
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            return {k: (list(v[0]), v[1][0]) for k, v in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.snapshot().items()):
+            base = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _with_le(base, _format_number(bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_with_le(base, '+Inf')} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {_format_number(total)}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Counter:
+    """带标签的单调递增计数器，线程安全。"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.snapshot().items()):
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}{label_text} {_format_number(value)}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _with_le(base: str, le: str) -> str:
+    if base:
+        return base[:-1] + f',le="{le}"}}'
+    return f'{{le="{le}"}}'
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """指标注册表：按名称持有直方图与计数器，并负责统一渲染。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self.enabled = os.getenv("OLLAMA_METRICS", "1") != "0"
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str],
+                  buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Histogram(name, help_text, label_names, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str]) -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Counter(name, help_text, label_names)
+                self._metrics[name] = metric
+            return metric
+
+    def get(self, name: str) -> Optional[Any]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+_LABELS = ("endpoint", "model")
+_NS_FIELDS = (
+    ("total_duration", "ollama_total_duration_seconds", "Ollama 服务端总耗时"),
+    ("load_duration", "ollama_load_duration_seconds", "模型加载耗时"),
+    ("prompt_eval_duration", "ollama_prompt_eval_duration_seconds", "prompt 预填充（prefill）耗时"),
+    ("eval_duration", "ollama_eval_duration_seconds", "生成（decode）耗时"),
+)
+
+
+def record_ollama_response(
+    endpoint: str,
+    model: str,
+    data: Optional[Dict[str, Any]],
+    client_seconds: Optional[float] = None,
+    status: int = 200,
+    registry: MetricsRegistry = REGISTRY,
+) -> None:
+    """记录一次 Ollama 调用的客户端耗时与响应体中的服务端计时字段。"""
+    if not registry.enabled:
+        return
+    model = model or "unknown"
+    registry.counter(
+        "ollama_requests_total", "Ollama 请求数", ("endpoint", "model", "status")
+    ).inc(endpoint, model, str(status))
+    if client_seconds is not None:
+        registry.histogram(
+            "ollama_request_duration_seconds", "客户端观测到的端到端耗时", _LABELS
+        ).observe(client_seconds, endpoint, model)
+    if not data:
+        return
+
+    for field_name, metric_name, help_text in _NS_FIELDS:
+        value = data.get(field_name)
+        if isinstance(value, (int, float)):
+            histogram = registry.histogram(metric_name, help_text, _LABELS)
+            histogram.observe(value / 1e9, endpoint, model)
+
+    total = data.get("total_duration")
+    if client_seconds is not None and isinstance(total, (int, float)):
+        registry.histogram(
+            "ollama_queue_duration_seconds", "端到端耗时减去服务端总耗时（排队与网络）", _LABELS
+        ).observe(max(0.0, client_seconds - total / 1e9), endpoint, model)
+
+    usage = data.get("usage") or {}
+    prompt_tokens = data.get("prompt_eval_count", usage.get("prompt_tokens"))
+    completion_tokens = data.get("eval_count", usage.get("completion_tokens"))
+    if isinstance(prompt_tokens, (int, float)):
+        registry.histogram(
+            "ollama_prompt_tokens", "输入 token 数", _LABELS, TOKEN_BUCKETS
+        ).observe(prompt_tokens, endpoint, model)
+    if isinstance(completion_tokens, (int, float)):
+        registry.histogram(
+            "ollama_completion_tokens", "输出 token 数", _LABELS, TOKEN_BUCKETS
+        ).observe(completion_tokens, endpoint, model)
+
+
+def record_ollama_stream(
+    endpoint: str,
+    model: str,
+    data: Optional[Dict[str, Any]],
+    client_seconds: float,
+    first_chunk_seconds: Optional[float],
+    decode_seconds: Optional[float],
+    status: int = 200,
+    registry: MetricsRegistry = REGISTRY,
+) -> None:
+    """记录一次读完的流式响应：data 为最后一个带 usage / done 的 chunk（没有时为 None）。"""
+    record_ollama_response(endpoint, model, data, client_seconds, status, registry)
+    if not registry.enabled:
+        return
+    model = model or "unknown"
+    if first_chunk_seconds is not None:
+        registry.histogram(
+            "ollama_stream_first_chunk_seconds", "流式响应首个 chunk 延迟（排队、加载与 prefill）",
+            _LABELS,
+        ).observe(first_chunk_seconds, endpoint, model)
+    if decode_seconds is not None:
+        registry.histogram(
+            "ollama_stream_decode_seconds", "流式响应首个到最后一个 chunk 的耗时（decode）", _LABELS
+        ).observe(decode_seconds, endpoint, model)
+
+
+def render_prometheus(registry: MetricsRegistry = REGISTRY) -> str:
+    return registry.render_prometheus()
+
+
+def write_prometheus(path: str, registry: MetricsRegistry = REGISTRY) -> None:
+    """以 Prometheus 文本格式原子写入文件。"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def start_metrics_server(
+    port: int = 9464, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY
+) -> ThreadingHTTPServer:
+    """在后台线程启动 /metrics 端点，返回服务对象（调用 shutdown() 停止）。"""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def _write_textfile_at_exit() -> None:
+    path = os.getenv("OLLAMA_METRICS_TEXTFILE")
+    if path:
+        write_prometheus(path)
+
+
+atexit.register(_write_textfile_at_exit)
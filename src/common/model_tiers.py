@@ -0,0 +1,412 @@
+"""按角色分级使用模型：小模型负责路由与选工具，大模型负责最终回答
+
+示例代理、监督者和 function_tool 的工具循环原先所有步骤都用同一个 `qwen3:4b`，连"交给哪个代理"
+"调用哪个工具"这种只输出一个工具调用的步骤也要付出大模型的 prefill / decode 开销。
+`TieredChatModel` 把一次模型调用拆成两个角色：
+
+- router：绑定了工具、且这一步是在做决策时先用小模型；输出的工具调用通过校验（工具存在、必填参数齐全、
+  类型正确）就直接采用
+- answer：产出回答的步骤直接用大模型，不先让小模型试一遍——未绑定工具、最后一条消息是工具结果或
+  交回控制权（transfer_back_to_*）时都属于这种步骤；小模型在决策步骤意外给出了最终回答（没有工具调用）
+  时也改由大模型重新生成
+- escalation：小模型的输出未通过校验（未知工具、参数错误、无法解析的工具调用、空回复或自定义校验
+  失败）时，同一步自动升级给大模型重做
+
+`TierStats` 按角色累计调用次数、延迟分位数与 input/output tokens，并按原因统计升级次数。
+内层模型调用在回调 metadata 中带 `model_role`，TokenUsageCallback 据此把 token 记到
+`<节点>/<角色>` 下；外层 TieredChatModel 不单独产生模型回调，token 不会重复统计。
+
+配置（前缀区分使用方，如 AGENT_ / TOOL_）：
+    AGENT_ROUTER_MODEL=granite4:3b AGENT_ANSWER_MODEL=qwen3:4b python -m src.agents.multi_agent
+两个变量都未设置或取值相同时不分级，`ModelTiers.build()` 直接返回普通 ChatOpenAI。
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+from src.common import ollama_client
+from src.common.stats import LatencySummary
+
+ROUTER = "router"
+ANSWER = "answer"
+ESCALATION = "escalation"
+
+# 交出控制权的交接工具（handoff.py / langgraph_supervisor 的 transfer_to_，fanout.py 的 assign_）
+_FORWARD_HANDOFF_PREFIXES = ("transfer_to_", "assign_")
+
+# 自定义校验函数：返回 None 表示通过，返回字符串表示拒绝原因
+Validator = Callable[[AIMessage], Optional[str]]
+
+_JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+
+@dataclass
+class ModelTiers:
+    """各角色使用的模型名；router 与 answer 相同时不分级。"""
+
+    router: str
+    answer: str
+
+    @classmethod
+    def from_env(cls, prefix: str, default: str) -> "ModelTiers":
+        """读取 `<prefix>ROUTER_MODEL` / `<prefix>ANSWER_MODEL`，未设置时使用 default。"""
+        return cls(
+            router=os.getenv(f"{prefix}ROUTER_MODEL") or default,
+            answer=os.getenv(f"{prefix}ANSWER_MODEL") or default,
+        )
+
+    @property
+    def tiered(self) -> bool:
+        return self.router != self.answer
+
+    def build(self, stats: Optional["TierStats"] = None, **kwargs: Any) -> BaseChatModel:
+        """构造聊天模型（kwargs 传给 get_chat_model）；不分级时返回普通 ChatOpenAI。"""
+        answer = ollama_client.get_chat_model(self.answer, **kwargs)
+        if not self.tiered:
+            return answer
+        router = ollama_client.get_chat_model(self.router, **kwargs)
+        return TieredChatModel(router=router, answer=answer, stats=stats or TierStats())
+
+
+@dataclass
+class RoleStats:
+    """一个角色累计的调用次数、token 数与逐次延迟。"""
+
+    model: str = ""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    @property
+    def latency(self) -> LatencySummary:
+        return LatencySummary.from_samples(self.latencies)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class TierStats:
+    """线程安全地按角色累计模型调用开销，并按原因统计升级次数。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.roles: Dict[str, RoleStats] = {}
+        self.escalations: Dict[str, int] = {}
+
+    def record(self, role: str, model: str, seconds: float, message: BaseMessage) -> None:
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            stats = self.roles.setdefault(role, RoleStats(model=model))
+            stats.calls += 1
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+            stats.latencies.append(seconds)
+
+    def escalate(self, reason: str) -> None:
+        kind = reason.split(":", 1)[0]
+        with self._lock:
+            self.escalations[kind] = self.escalations.get(kind, 0) + 1
+
+    @property
+    def escalation_rate(self) -> float:
+        """升级次数占小模型决策次数的比例。"""
+        routed = self.roles.get(ROUTER)
+        return sum(self.escalations.values()) / routed.calls if routed and routed.calls else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.roles.clear()
+            self.escalations.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "roles": {role: stats.to_dict() for role, stats in self.roles.items()},
+                "escalations": dict(self.escalations),
+                "escalation_rate": round(self.escalation_rate, 4),
+            }
+
+    def format(self) -> str:
+        with self._lock:
+            lines = [
+                f"{role}({s.model}): 调用 {s.calls} 次, input {s.input_tokens}, "
+                f"output {s.output_tokens}, 延迟 {s.latency.format_ms()}"
+                for role, s in self.roles.items()
+            ]
+            lines.append(f"升级: {self.escalations or 0}")
+        return "\n".join(lines)
+
+
+def _check_type(value: Any, schema: Dict[str, Any]) -> bool:
+    expected = _JSON_TYPES.get(schema.get("type"))
+    if expected is None:
+        return True
+    if isinstance(value, bool) and bool not in expected:
+        return False
+    return isinstance(value, expected)
+
+
+def validate_tool_calls(message: AIMessage, schemas: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """按工具的 JSON Schema 校验模型输出，返回 None 表示通过，否则返回 `原因:详情`。"""
+    if message.invalid_tool_calls:
+        return f"invalid_tool_calls:{message.invalid_tool_calls[0].get('name')}"
+    if not message.tool_calls and not message.text.strip():
+        return "empty"
+    for call in message.tool_calls:
+        parameters = schemas.get(call["name"])
+        if parameters is None:
+            return f"unknown_tool:{call['name']}"
+        args = call.get("args") or {}
+        properties = parameters.get("properties") or {}
+        missing = [name for name in parameters.get("required") or [] if name not in args]
+        if missing:
+            return f"invalid_args:{call['name']} 缺少 {missing}"
+        for name, value in args.items():
+            if name in properties and not _check_type(value, properties[name]):
+                return f"invalid_args:{call['name']}.{name}"
+    return None
+
+
+def _tool_schemas(tools: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+    schemas = {}
+    for tool in tools:
+        function = convert_to_openai_tool(tool)["function"]
+        schemas[function["name"]] = function.get("parameters") or {}
+    return schemas
+
+
+def _model_name(model: BaseChatModel) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or ""
+
+
+def _as_chunk(message: AIMessage) -> AIMessageChunk:
+    """把完整的 AIMessage 转成单个 chunk，供 stream() 输出小模型的决策结果。"""
+    return AIMessageChunk(
+        content=message.content,
+        id=message.id,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        tool_call_chunks=[
+            tool_call_chunk(
+                name=call["name"],
+                args=json.dumps(call["args"], ensure_ascii=False),
+                id=call["id"],
+                index=index,
+            )
+            for index, call in enumerate(message.tool_calls)
+        ],
+    )
+
+
+class TieredChatModel(BaseChatModel):
+    """小模型决策、大模型回答、校验失败自动升级的聊天模型（可直接交给 create_agent 等使用）。
+
+    invoke / ainvoke / stream / astream 直接调度内层模型，内层调用沿用调用方的 config（回调、
+    metadata、运行树），外层不再额外产生一次模型回调。
+    """
+
+    router: BaseChatModel
+    answer: BaseChatModel
+    stats: TierStats = Field(default_factory=TierStats)
+    validator: Optional[Validator] = None
+    # 小模型给出最终回答（没有工具调用）时是否改由大模型重新生成
+    answer_final: bool = True
+    # 最后一条消息是工具结果 / 交回控制权时直接用大模型（这一步通常是组织回答）
+    answer_after_tools: bool = True
+    tools: List[Any] = Field(default_factory=list)
+    tool_kwargs: Dict[str, Any] = Field(default_factory=dict)
+
+    _bound: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _schemas: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.tools:
+            self._bound = {
+                ROUTER: self.router.bind_tools(self.tools, **self.tool_kwargs),
+                ANSWER: self.answer.bind_tools(self.tools, **self.tool_kwargs),
+            }
+            self._schemas = _tool_schemas(self.tools)
+        else:
+            self._bound = {ROUTER: self.router, ANSWER: self.answer}
+
+    @property
+    def _llm_type(self) -> str:
+        return "tiered-chat"
+
+    def bind_tools(
+        self, tools: Sequence[Any], *, parallel_tool_calls: Optional[bool] = None, **kwargs: Any
+    ) -> "TieredChatModel":
+        """两级模型绑定同一组工具；已绑定时合并之前的绑定参数（如 parallel_tool_calls）。"""
+        tool_kwargs = {**self.tool_kwargs, **kwargs}
+        if parallel_tool_calls is not None:
+            tool_kwargs["parallel_tool_calls"] = parallel_tool_calls
+        return TieredChatModel(
+            router=self.router,
+            answer=self.answer,
+            stats=self.stats,
+            validator=self.validator,
+            answer_final=self.answer_final,
+            answer_after_tools=self.answer_after_tools,
+            tools=list(tools),
+            tool_kwargs=tool_kwargs,
+        )
+
+    # ---------------- 调度 ----------------
+
+    def _role_config(self, config: RunnableConfig, role: str) -> RunnableConfig:
+        return {**config, "metadata": {**(config.get("metadata") or {}), "model_role": role}}
+
+    def _model_for(self, role: str) -> Any:
+        return self._bound[ROUTER if role == ROUTER else ANSWER]
+
+    def _record(self, role: str, start: float, message: BaseMessage) -> None:
+        model = self.router if role == ROUTER else self.answer
+        self.stats.record(role, _model_name(model), time.perf_counter() - start, message)
+
+    def _call(self, role: str, messages: List[BaseMessage], config: RunnableConfig,
+              **kwargs: Any) -> AIMessage:
+        start = time.perf_counter()
+        message = self._model_for(role).invoke(messages, self._role_config(config, role), **kwargs)
+        self._record(role, start, message)
+        return message
+
+    async def _acall(self, role: str, messages: List[BaseMessage], config: RunnableConfig,
+                     **kwargs: Any) -> AIMessage:
+        start = time.perf_counter()
+        message = await self._model_for(role).ainvoke(
+            messages, self._role_config(config, role), **kwargs
+        )
+        self._record(role, start, message)
+        return message
+
+    def _first_role(self, messages: List[BaseMessage]) -> str:
+        """这一步先用哪一级：决策步骤先问小模型，产出回答的步骤直接交给大模型。"""
+        if not self.tools:
+            return ANSWER
+        last = messages[-1] if messages else None
+        if self.answer_after_tools and isinstance(last, ToolMessage):
+            # 交出控制权（transfer_to_* / assign_*）后接手的代理还要决策，其余工具结果之后通常是回答
+            return ROUTER if (last.name or "").startswith(_FORWARD_HANDOFF_PREFIXES) else ANSWER
+        return ROUTER
+
+    def _next_role(self, message: AIMessage) -> Optional[str]:
+        """小模型输出可以直接采用时返回 None，否则返回接手的角色（answer / escalation）。"""
+        reason = validate_tool_calls(message, self._schemas)
+        if reason is None and self.validator is not None:
+            reason = self.validator(message)
+        if reason is not None:
+            self.stats.escalate(reason)
+            return ESCALATION
+        if message.tool_calls or not self.answer_final:
+            return None
+        return ANSWER
+
+    def _messages(self, input: Any) -> List[BaseMessage]:
+        return self._convert_input(input).to_messages()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None,
+               **kwargs: Any) -> AIMessage:
+        config = ensure_config(config)
+        messages = self._messages(input)
+        role = self._first_role(messages)
+        if role == ROUTER:
+            message = self._call(ROUTER, messages, config, **kwargs)
+            role = self._next_role(message)
+            if role is None:
+                return message
+        return self._call(role, messages, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AIMessage:
+        config = ensure_config(config)
+        messages = self._messages(input)
+        role = self._first_role(messages)
+        if role == ROUTER:
+            message = await self._acall(ROUTER, messages, config, **kwargs)
+            role = self._next_role(message)
+            if role is None:
+                return message
+        return await self._acall(role, messages, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None,
+               **kwargs: Any) -> Iterator[AIMessageChunk]:
+        """小模型的决策一次性输出；交给大模型的回答逐 chunk 流式输出。"""
+        config = ensure_config(config)
+        messages = self._messages(input)
+        role = self._first_role(messages)
+        if role == ROUTER:
+            message = self._call(ROUTER, messages, config, **kwargs)
+            role = self._next_role(message)
+            if role is None:
+                yield _as_chunk(message)
+                return
+        start = time.perf_counter()
+        merged = None
+        for chunk in self._model_for(role).stream(
+            messages, self._role_config(config, role), **kwargs
+        ):
+            merged = chunk if merged is None else merged + chunk
+            yield chunk
+        if merged is not None:
+            self._record(role, start, merged)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        config = ensure_config(config)
+        messages = self._messages(input)
+        role = self._first_role(messages)
+        if role == ROUTER:
+            message = await self._acall(ROUTER, messages, config, **kwargs)
+            role = self._next_role(message)
+            if role is None:
+                yield _as_chunk(message)
+                return
+        start = time.perf_counter()
+        merged = None
+        async for chunk in self._model_for(role).astream(
+            messages, self._role_config(config, role), **kwargs
+        ):
+            merged = chunk if merged is None else merged + chunk
+            yield chunk
+        if merged is not None:
+            self._record(role, start, merged)
+
+    # generate() / agenerate() 等走 BaseChatModel 默认流程的调用
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        message = self.invoke(messages, config, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        message = await self.ainvoke(messages, config, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
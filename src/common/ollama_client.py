@@ -0,0 +1,552 @@
+"""进程级共享的 Ollama 客户端层
+
+此前每个模块各自创建传输层：RAG 相关代码直接 `requests.post`（无 Session、无连接复用），
+deepseek / debug_ollama / function_learn 各自 new 一个 `httpx.Client`，ChatOpenAI 内部再建一个。
+本模块统一提供：
+
+- 同步 / 异步两个 httpx 连接池（keep-alive，超时与连接数可配置），进程内所有调用共用
+- 基于共享连接池的 OpenAI 客户端与 LangChain `ChatOpenAI` 构造函数
+- Ollama 原生接口（/api/embeddings、/api/embed）与 OpenAI 兼容 chat 接口的轻量封装
+- 面向非 Ollama 端点的可选 HTTP/2 连接池（需安装 h2，否则回退 HTTP/1.1）
+- 响应钩子：自动把 Ollama 返回的服务端计时字段记录到 src.common.metrics；流式响应在读完后
+  记录客户端测得的首个 chunk 延迟与解码耗时，以及最后一个 chunk 中的 usage / 计时字段
+- 可选的录制 / 回放传输层（src.common.cassette），离线复现全部模型调用
+
+配置优先级：`configure()` 显式参数 > 环境变量 > 默认值。支持的环境变量：
+OLLAMA_BASE_URL、OLLAMA_API_KEY、OLLAMA_CONNECT_TIMEOUT、OLLAMA_READ_TIMEOUT、
+OLLAMA_WRITE_TIMEOUT、OLLAMA_POOL_TIMEOUT、OLLAMA_MAX_CONNECTIONS、
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS、OLLAMA_KEEPALIVE_EXPIRY，以及录制 / 回放相关的
+OLLAMA_CASSETTE（磁带文件路径，为空时不启用）、OLLAMA_CASSETTE_MODE（record/replay/auto）、
+OLLAMA_CASSETTE_TIMING（1 表示按录制时的延迟回放）、OLLAMA_CASSETTE_STRICT（默认 1；0 表示精确匹配失败时
+按录制顺序回退）。
+
+异步连接池按事件循环各建一个：`get_async_http_client()` 返回的客户端在发送请求时才按当前运行的
+事件循环取出对应的连接池，因此缓存的 ChatOpenAI / AsyncOpenAI 可以在多次 `asyncio.run` 之间复用。
+"""
+
+import asyncio
+import atexit
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from src.common import metrics
+from src.common.cassette import get_cassette
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """连接池与端点配置。"""
+
+    base_url: str = "http://127.0.0.1:11434"
+    api_key: str = "ollama"
+    connect_timeout: float = 10.0  # 连接超时 10 秒
+    read_timeout: float = 60.0  # 读取超时 60 秒
+    write_timeout: float = 60.0
+    pool_timeout: float = 60.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 45.0
+    cassette_path: str = ""
+    cassette_mode: str = "replay"
+    cassette_timing: bool = False
+    cassette_strict: bool = True
+
+    @classmethod
+    def from_env(cls) -> "ClientSettings":
+        default = cls()
+        return cls(
+            base_url=os.getenv("OLLAMA_BASE_URL", default.base_url).rstrip("/"),
+            api_key=os.getenv("OLLAMA_API_KEY", default.api_key),
+            connect_timeout=_env_float("OLLAMA_CONNECT_TIMEOUT", default.connect_timeout),
+            read_timeout=_env_float("OLLAMA_READ_TIMEOUT", default.read_timeout),
+            write_timeout=_env_float("OLLAMA_WRITE_TIMEOUT", default.write_timeout),
+            pool_timeout=_env_float("OLLAMA_POOL_TIMEOUT", default.pool_timeout),
+            max_connections=_env_int("OLLAMA_MAX_CONNECTIONS", default.max_connections),
+            max_keepalive_connections=_env_int(
+                "OLLAMA_MAX_KEEPALIVE_CONNECTIONS", default.max_keepalive_connections
+            ),
+            keepalive_expiry=_env_float("OLLAMA_KEEPALIVE_EXPIRY", default.keepalive_expiry),
+            cassette_path=os.getenv("OLLAMA_CASSETTE", default.cassette_path),
+            cassette_mode=os.getenv("OLLAMA_CASSETTE_MODE", default.cassette_mode),
+            cassette_timing=os.getenv("OLLAMA_CASSETTE_TIMING", "0") == "1",
+            cassette_strict=os.getenv("OLLAMA_CASSETTE_STRICT", "1") != "0",
+        )
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.base_url}/v1"
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+_STREAMING_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def _metrics_target(response: httpx.Response) -> Optional[str]:
+    """返回需要采集指标的 Ollama 接口路径，非 Ollama 接口返回 None。"""
+    if not metrics.REGISTRY.enabled:
+        return None
+    path = response.request.url.path
+    if path.startswith("/api/") or path.startswith("/v1/"):
+        return path
+    return None
+
+
+def _request_model(request: httpx.Request) -> str:
+    try:
+        return json.loads(request.content or b"{}").get("model", "")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return ""
+
+
+def _record(response: httpx.Response, endpoint: str) -> None:
+    data = None
+    if response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+    model = (data or {}).get("model") if isinstance(data, dict) else None
+    metrics.record_ollama_response(
+        endpoint,
+        model or _request_model(response.request),
+        data if isinstance(data, dict) else None,
+        client_seconds=response.elapsed.total_seconds(),
+        status=response.status_code,
+    )
+
+
+class _StreamTimer:
+    """流式响应的客户端计时：首个 chunk 到达（排队 + 加载 + prefill）与之后的解码耗时。
+
+    同时解析 SSE（`data: {...}`）或 NDJSON 的每一行，保留带 usage 或 done 的最后一条，
+    其中的 token 数与服务端计时字段（原生 /api/chat 流）在流结束时一并记录。
+    """
+
+    def __init__(self, response: httpx.Response, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.model = _request_model(response.request)
+        self.status = response.status_code
+        self.start = response.request.extensions.get("ollama_start") or time.perf_counter()
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.final: Optional[Dict[str, Any]] = None
+        self._buffer = b""
+        self._finished = False
+
+    def feed(self, chunk: bytes) -> None:
+        self.last = time.perf_counter()
+        if self.first is None:
+            self.first = self.last
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        for line in lines:
+            self._parse(line)
+
+    def _parse(self, line: bytes) -> None:
+        line = line.strip()
+        if line.startswith(b"data:"):
+            line = line[5:].strip()
+        if b'"usage"' not in line and b'"done"' not in line:
+            return
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return
+        if isinstance(data, dict) and (data.get("usage") or data.get("done")):
+            self.final = data
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self._parse(self._buffer)
+        end = self.last or time.perf_counter()
+        metrics.record_ollama_stream(
+            self.endpoint,
+            (self.final or {}).get("model") or self.model,
+            self.final,
+            client_seconds=time.perf_counter() - self.start,
+            first_chunk_seconds=None if self.first is None else self.first - self.start,
+            decode_seconds=None if self.first is None else end - self.first,
+            status=self.status,
+        )
+
+
+class _TimedStream(httpx.SyncByteStream):
+    def __init__(self, stream: Any, timer: _StreamTimer) -> None:
+        self._stream = stream
+        self._timer = timer
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._timer.feed(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._timer.finish()
+
+
+class _AsyncTimedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, timer: _StreamTimer) -> None:
+        self._stream = stream
+        self._timer = timer
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._timer.feed(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._timer.finish()
+
+
+def _is_streaming(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith(_STREAMING_CONTENT_TYPES)
+
+
+def _mark_start(request: httpx.Request) -> None:
+    """请求钩子：记录发送时间，流式响应据此计算首个 chunk 延迟。"""
+    request.extensions["ollama_start"] = time.perf_counter()
+
+
+async def _amark_start(request: httpx.Request) -> None:
+    _mark_start(request)
+
+
+def _observe_response(response: httpx.Response) -> None:
+    """同步连接池的响应钩子：读取非流式响应体并记录服务端计时字段。"""
+    endpoint = _metrics_target(response)
+    if endpoint is None:
+        return
+    if _is_streaming(response):
+        # 流式响应不能在钩子里提前读取，包装响应流，读完（或关闭）时再记录
+        response.stream = _TimedStream(response.stream, _StreamTimer(response, endpoint))
+        return
+    response.read()
+    _record(response, endpoint)
+
+
+async def _aobserve_response(response: httpx.Response) -> None:
+    """异步连接池的响应钩子。"""
+    endpoint = _metrics_target(response)
+    if endpoint is None:
+        return
+    if _is_streaming(response):
+        response.stream = _AsyncTimedStream(response.stream, _StreamTimer(response, endpoint))
+        return
+    await response.aread()
+    _record(response, endpoint)
+
+
+_lock = threading.Lock()
+_settings = ClientSettings.from_env()
+_sync_clients: Dict[bool, httpx.Client] = {}
+# 事件循环 -> {http2: 连接池}；已关闭的事件循环上的连接池在下次取用时丢弃
+_async_clients: Dict[asyncio.AbstractEventLoop, Dict[bool, httpx.AsyncClient]] = {}
+_async_proxies: Dict[bool, "_LoopBoundAsyncClient"] = {}
+_openai_clients: Dict[str, Any] = {}
+_close_callbacks: List[Callable[[], None]] = []
+
+
+def get_settings() -> ClientSettings:
+    return _settings
+
+
+def configure(**overrides: Any) -> ClientSettings:
+    """修改连接配置（如 base_url、超时、连接数），并丢弃已创建的连接池以便按新配置重建。"""
+    global _settings
+    if "base_url" in overrides and overrides["base_url"]:
+        overrides["base_url"] = overrides["base_url"].rstrip("/")
+    with _lock:
+        _settings = dataclasses.replace(_settings, **overrides)
+    close_clients()
+    return _settings
+
+
+def _http2_available(http2: bool) -> bool:
+    if not http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("未安装 h2，HTTP/2 连接池回退为 HTTP/1.1（pip install 'httpx[http2]'）")
+        return False
+    return True
+
+
+def _cassette_transport(transport_cls: Any, enable_h2: bool) -> Dict[str, Any]:
+    """启用录制 / 回放时返回包装后的 transport 参数，否则返回空字典。"""
+    if not _settings.cassette_path:
+        return {}
+    cassette = get_cassette(
+        _settings.cassette_path,
+        _settings.cassette_mode,
+        timing=_settings.cassette_timing,
+        strict=_settings.cassette_strict,
+    )
+    wrapped = transport_cls(limits=_settings.limits(), http1=True, http2=enable_h2)
+    if transport_cls is httpx.HTTPTransport:
+        return {"transport": cassette.transport(wrapped)}
+    return {"transport": cassette.async_transport(wrapped)}
+
+
+def get_http_client(http2: bool = False) -> httpx.Client:
+    """返回进程级共享的同步连接池。
+
+    Ollama 端点一律使用 HTTP/1.1；http2=True 仅用于非 Ollama 端点。
+    """
+    with _lock:
+        client = _sync_clients.get(http2)
+        if client is None or client.is_closed:
+            enable_h2 = _http2_available(http2)
+            client = httpx.Client(
+                timeout=_settings.timeout(),
+                limits=_settings.limits(),
+                http1=True,
+                http2=enable_h2,
+                event_hooks={"request": [_mark_start], "response": [_observe_response]},
+                **_cassette_transport(httpx.HTTPTransport, enable_h2),
+            )
+            _sync_clients[http2] = client
+        return client
+
+
+def _loop_http_client(http2: bool) -> httpx.AsyncClient:
+    """返回当前事件循环专用的异步连接池（不存在时创建）。"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for closed in [lp for lp in _async_clients if lp.is_closed()]:
+            # 事件循环已结束，其上的连接无法再使用，也无法在别的循环里关闭，只释放引用
+            del _async_clients[closed]
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(http2)
+        if client is None or client.is_closed:
+            enable_h2 = _http2_available(http2)
+            client = httpx.AsyncClient(
+                timeout=_settings.timeout(),
+                limits=_settings.limits(),
+                http1=True,
+                http2=enable_h2,
+                event_hooks={"request": [_amark_start], "response": [_aobserve_response]},
+                **_cassette_transport(httpx.AsyncHTTPTransport, enable_h2),
+            )
+            clients[http2] = client
+        return client
+
+
+class _LoopBoundAsyncClient(httpx.AsyncClient):
+    """按当前事件循环分派请求的异步客户端
+
+    自身只负责构造请求（超时配置与共享连接池一致），send() 转交给当前事件循环的连接池，
+    响应钩子与录制 / 回放由该连接池处理。
+    """
+
+    def __init__(self, http2: bool) -> None:
+        super().__init__(timeout=_settings.timeout())
+        self._http2 = http2
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await _loop_http_client(self._http2).send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的连接池；客户端本身仍可继续使用（下次请求时重建连接池）。"""
+        loop = asyncio.get_running_loop()
+        with _lock:
+            client = _async_clients.get(loop, {}).pop(self._http2, None)
+        if client is not None:
+            await client.aclose()
+
+
+def get_async_http_client(http2: bool = False) -> httpx.AsyncClient:
+    """返回进程级共享的异步客户端，请求由当前事件循环各自的连接池发送。"""
+    with _lock:
+        client = _async_proxies.get(http2)
+        if client is None:
+            client = _async_proxies[http2] = _LoopBoundAsyncClient(http2)
+        return client
+
+
+def get_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None):
+    """返回复用共享连接池的 OpenAI 同步客户端（默认指向本地 Ollama 的 /v1）。"""
+    from openai import OpenAI
+
+    base_url = base_url or _settings.openai_base_url
+    api_key = api_key or _settings.api_key
+    key = f"sync:{base_url}:{api_key}"
+    with _lock:
+        client = _openai_clients.get(key)
+    if client is None:
+        client = OpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=get_http_client(),
+        )
+        with _lock:
+            client = _openai_clients.setdefault(key, client)
+    return client
+
+
+def get_async_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None):
+    """返回复用共享连接池的 OpenAI 异步客户端。"""
+    from openai import AsyncOpenAI
+
+    base_url = base_url or _settings.openai_base_url
+    api_key = api_key or _settings.api_key
+    key = f"async:{base_url}:{api_key}"
+    with _lock:
+        client = _openai_clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=get_async_http_client(),
+        )
+        with _lock:
+            client = _openai_clients.setdefault(key, client)
+    return client
+
+
+def get_chat_model(model: str, **kwargs: Any):
+    """构造走共享连接池的 LangChain ChatOpenAI（指向本地 Ollama 的 OpenAI 兼容接口）。"""
+    from langchain_openai import ChatOpenAI
+
+    kwargs.setdefault("base_url", _settings.openai_base_url)
+    kwargs.setdefault("api_key", _settings.api_key)
+    kwargs.setdefault("http_client", get_http_client())
+    kwargs.setdefault("http_async_client", get_async_http_client())
+    return ChatOpenAI(model=model, **kwargs)
+
+
+def _url(path: str) -> str:
+    return f"{_settings.base_url}{path}"
+
+
+def post_json(
+    path: str, payload: Dict[str, Any], timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """向 Ollama 发送 JSON POST 请求并返回解析后的 JSON，HTTP 错误抛出 httpx.HTTPStatusError。"""
+    kwargs: Dict[str, Any] = {"json": payload}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    resp = get_http_client().post(_url(path), **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def apost_json(
+    path: str, payload: Dict[str, Any], timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """post_json 的异步版本。"""
+    kwargs: Dict[str, Any] = {"json": payload}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    resp = await get_async_http_client().post(_url(path), **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def embed(text: str, model: str, timeout: Optional[float] = None) -> List[float]:
+    """调用 Ollama /api/embeddings 生成单条文本的向量。
+
+    不改用 /api/embed：后者返回 L2 归一化后的向量，而已有的持久化向量库（如 ./my_local_chroma_kb）
+    都是用 /api/embeddings 的原始向量建的，换接口会让查询向量与库中向量的距离和排序悄悄变化。
+    代价是 /api/embeddings 不返回服务端计时字段，指标中只有客户端测得的请求耗时。
+    """
+    payload = {"model": model, "prompt": text, "options": {"temperature": 0.0}}
+    return post_json("/api/embeddings", payload, timeout=timeout)["embedding"]
+
+
+def embed_batch(
+    texts: List[str], model: str, timeout: Optional[float] = None
+) -> List[List[float]]:
+    """调用 Ollama /api/embed 一次性为多条文本生成向量。"""
+    if not texts:
+        return []
+    payload = {"model": model, "input": texts}
+    return post_json("/api/embed", payload, timeout=timeout)["embeddings"]
+
+
+async def aembed(text: str, model: str, timeout: Optional[float] = None) -> List[float]:
+    """embed 的异步版本。"""
+    payload = {"model": model, "prompt": text, "options": {"temperature": 0.0}}
+    data = await apost_json("/api/embeddings", payload, timeout=timeout)
+    return data["embedding"]
+
+
+def chat_completion(payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """调用 OpenAI 兼容的 /v1/chat/completions（非流式），返回原始 JSON。"""
+    return post_json("/v1/chat/completions", payload, timeout=timeout)
+
+
+def close_clients() -> None:
+    """关闭同步连接池并丢弃所有共享客户端（进程退出时自动调用）。
+
+    异步连接池无法在同步上下文中关闭，这里只释放引用；
+    需要优雅关闭时在事件循环内调用 aclose_clients()。
+    """
+    with _lock:
+        sync_clients = list(_sync_clients.values())
+        _sync_clients.clear()
+        _async_clients.clear()
+        _async_proxies.clear()
+        _openai_clients.clear()
+    for client in sync_clients:
+        client.close()
+    for callback in list(_close_callbacks):
+        callback()
+
+
+def on_close(callback: Callable[[], None]) -> None:
+    """注册在 close_clients()（含 configure()）之后调用的回调，用于丢弃绑定在旧连接池上的对象。"""
+    with _lock:
+        _close_callbacks.append(callback)
+
+
+async def aclose_clients() -> None:
+    """在事件循环内关闭当前事件循环的异步连接池（共享客户端仍可继续使用，下次请求时重建）。"""
+    with _lock:
+        async_clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in async_clients:
+        await client.aclose()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,58 @@
+"""延迟统计工具
+
+为各类基准测试与批量运行器提供统一的分位数计算与汇总，避免每个脚本各写一份。
+"""
+
+import math
+from dataclasses import dataclass, asdict
+from typing import Dict, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """按线性插值计算分位数，q 取值 0~100。空序列返回 0.0。"""
+    if not values:
+        return 0.0
+    data = sorted(values)
+    if len(data) == 1:
+        return float(data[0])
+    rank = (len(data) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(data[low])
+    return float(data[low] + (data[high] - data[low]) * (rank - low))
+
+
+@dataclass
+class LatencySummary:
+    """一组延迟样本（单位：秒）的汇总结果。"""
+
+    count: int
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[float]) -> "LatencySummary":
+        if not samples:
+            return cls(count=0, mean=0.0, p50=0.0, p95=0.0, p99=0.0, max=0.0)
+        return cls(
+            count=len(samples),
+            mean=sum(samples) / len(samples),
+            p50=percentile(samples, 50),
+            p95=percentile(samples, 95),
+            p99=percentile(samples, 99),
+            max=float(max(samples)),
+        )
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+    def format_ms(self) -> str:
+        """以毫秒为单位输出一行可读的摘要。"""
+        return (
+            f"n={self.count} mean={self.mean * 1000:.2f}ms p50={self.p50 * 1000:.2f}ms "
+            f"p95={self.p95 * 1000:.2f}ms p99={self.p99 * 1000:.2f}ms max={self.max * 1000:.2f}ms"
+        )
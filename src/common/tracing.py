@@ -0,0 +1,193 @@
+"""轻量级阶段耗时追踪
+
+以嵌套 span 的形式记录一次调用内各阶段的耗时与属性（块数、字节数、命中数等），
+导出到 JSONL 文件或自定义 exporter。没有配置任何 exporter 时，`span()` 直接返回一个
+共享的空实现，只有一次列表判空的开销。
+
+用法：
+    from src.common import tracing
+
+    tracing.configure_tracing(jsonl_path="rag_trace.jsonl")   # 或设置 TRACING_JSONL_PATH 环境变量
+
+    with tracing.span("rag.search", backend="chroma") as sp:
+        hits = store.search(vec)
+        sp.set_attribute("hits", len(hits))
+
+每个 span 结束时导出一条记录：
+    {"trace_id", "span_id", "parent_id", "name", "start_time", "duration_ms", "attributes", "error"}
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+
+class SpanExporter(Protocol):
+    """span 导出器协议：每个 span 结束时调用一次 export。"""
+
+    def export(self, record: Dict[str, Any]) -> None:
+        ...
+
+
+class JsonlExporter:
+    """把 span 逐行追加写入 JSONL 文件。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class InMemoryExporter:
+    """把 span 保存在内存列表中，便于在脚本或基准中直接分析。"""
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def export(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(record)
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空 span。"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_exporters: List[SpanExporter] = []
+
+
+class Span:
+    """一个计时区间，作为上下文管理器使用；嵌套的 span 自动记录父子关系。"""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id",
+                 "start_time", "_start", "_token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.attributes = attributes
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start_time = 0.0
+        self._start = 0.0
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        _current_span.reset(self._token)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(duration_ms, 3),
+            "attributes": self.attributes,
+            "error": f"{exc_type.__name__}: {exc}" if exc_type else None,
+        }
+        for exporter in list(_exporters):
+            exporter.export(record)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+def span(name: str, **attributes: Any):
+    """创建一个 span；未启用追踪时返回共享的空 span。"""
+    if not _exporters:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """函数装饰器：为整个函数调用创建一个 span。"""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _exporters:
+                return func(*args, **kwargs)
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def is_enabled() -> bool:
+    return bool(_exporters)
+
+
+def add_exporter(exporter: SpanExporter) -> None:
+    _exporters.append(exporter)
+
+
+def configure_tracing(
+    exporter: Optional[SpanExporter] = None, jsonl_path: Optional[str] = None
+) -> None:
+    """启用追踪：可同时指定自定义 exporter 与 JSONL 文件路径。"""
+    if jsonl_path:
+        add_exporter(JsonlExporter(jsonl_path))
+    if exporter is not None:
+        add_exporter(exporter)
+
+
+def disable_tracing() -> None:
+    """关闭追踪并释放所有 exporter。"""
+    exporters = list(_exporters)
+    _exporters.clear()
+    for exporter in exporters:
+        close = getattr(exporter, "close", None)
+        if close:
+            close()
+
+
+if os.getenv("TRACING_JSONL_PATH"):
+    configure_tracing(jsonl_path=os.environ["TRACING_JSONL_PATH"])
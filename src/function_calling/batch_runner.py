@@ -0,0 +1,205 @@
+"""函数调用批量对话运行器
+
+评测与夜间任务需要把成千上万条对话跑过工具调用循环。`function_tool.py` 与
+`function_learn.py` 都提供 `run_conversation(messages)` 及其异步版本 `arun_conversation`，
+本模块在共享连接池上并发驱动 N 条对话，并汇总：
+
+- conversations/s：整批对话的吞吐
+- 每条对话的平均 LLM 调用次数与工具调用次数
+- 单条对话端到端耗时的 p50/p95/p99
+
+用法：
+    python -m src.function_calling.batch_runner --script function_tool -n 200 -c 16 --mode async
+    python -m src.function_calling.batch_runner --script function_learn -n 200 -c 16 \\
+        --questions questions.txt --json report.json
+
+并发上限建议不超过连接池大小（OLLAMA_MAX_CONNECTIONS），否则多出的请求只会在连接池中排队。
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import importlib
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from src.common.logging_setup import setup_logging
+from src.common.stats import LatencySummary
+
+
+@dataclass
+class ConversationResult:
+    """一次完整对话的结果与开销。"""
+
+    messages: List[Any]
+    llm_calls: int = 0
+    tool_calls: int = 0
+    elapsed: float = 0.0
+    fast_path: bool = False
+    error: Optional[str] = None
+
+    @property
+    def answer(self) -> str:
+        if not self.messages:
+            return ""
+        last = self.messages[-1]
+        content = last.get("content") if isinstance(last, dict) else last.content
+        return content or ""
+
+
+@dataclass
+class BatchReport:
+    """一批对话的汇总指标。"""
+
+    conversations: int
+    failures: int
+    elapsed: float
+    llm_calls: int
+    tool_calls: int
+    fast_path_hits: int
+    latency: LatencySummary
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def conversations_per_second(self) -> float:
+        return self.conversations / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def llm_calls_per_conversation(self) -> float:
+        return self.llm_calls / self.conversations if self.conversations else 0.0
+
+    @property
+    def tool_calls_per_conversation(self) -> float:
+        return self.tool_calls / self.conversations if self.conversations else 0.0
+
+    @classmethod
+    def from_results(cls, results: List[ConversationResult], elapsed: float) -> "BatchReport":
+        ok = [r for r in results if r.error is None]
+        return cls(
+            conversations=len(results),
+            failures=len(results) - len(ok),
+            elapsed=elapsed,
+            llm_calls=sum(r.llm_calls for r in results),
+            tool_calls=sum(r.tool_calls for r in results),
+            fast_path_hits=sum(r.fast_path for r in results),
+            latency=LatencySummary.from_samples([r.elapsed for r in ok]),
+            errors=[r.error for r in results if r.error][:10],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversations": self.conversations,
+            "failures": self.failures,
+            "elapsed_seconds": round(self.elapsed, 4),
+            "conversations_per_second": round(self.conversations_per_second, 3),
+            "llm_calls_per_conversation": round(self.llm_calls_per_conversation, 3),
+            "tool_calls_per_conversation": round(self.tool_calls_per_conversation, 3),
+            "fast_path_hits": self.fast_path_hits,
+            "latency": self.latency.to_dict(),
+            "errors": self.errors,
+        }
+
+    def format(self) -> str:
+        return (
+            f"对话数: {self.conversations}（失败 {self.failures}）, 总耗时: {self.elapsed:.2f}s, "
+            f"吞吐: {self.conversations_per_second:.2f} conv/s\n"
+            f"每条对话 LLM 调用: {self.llm_calls_per_conversation:.2f}, "
+            f"工具调用: {self.tool_calls_per_conversation:.2f}, 快速路径命中: {self.fast_path_hits}\n"
+            f"端到端延迟: {self.latency.format_ms()}"
+        )
+
+
+def _failed(messages: List[Any], error: BaseException, elapsed: float) -> ConversationResult:
+    return ConversationResult(
+        messages=messages, elapsed=elapsed, error=f"{type(error).__name__}: {error}"
+    )
+
+
+def run_batch(
+    run_fn: Callable[[List[Any]], ConversationResult],
+    conversations: Iterable[List[Any]],
+    concurrency: int = 8,
+) -> BatchReport:
+    """用线程池并发执行同步的 run_conversation。"""
+
+    def run_one(messages: List[Any]) -> ConversationResult:
+        start = time.perf_counter()
+        try:
+            return run_fn(messages)
+        except Exception as e:  # noqa: BLE001  单条失败不影响整批
+            return _failed(messages, e, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_one, conversations))
+    return BatchReport.from_results(results, time.perf_counter() - start)
+
+
+async def arun_batch(
+    arun_fn: Callable[[List[Any]], Awaitable[ConversationResult]],
+    conversations: Iterable[List[Any]],
+    concurrency: int = 8,
+) -> BatchReport:
+    """用信号量限制并发，在单个事件循环中执行异步的 arun_conversation。"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(messages: List[Any]) -> ConversationResult:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                return await arun_fn(messages)
+            except Exception as e:  # noqa: BLE001
+                return _failed(messages, e, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_one(m) for m in conversations))
+    return BatchReport.from_results(list(results), time.perf_counter() - start)
+
+
+def build_conversations(
+    build_messages: Callable[[str], List[Any]], questions: List[str], n: int
+) -> List[List[Any]]:
+    """循环使用问题列表构造 n 条互相独立的对话。"""
+    return [build_messages(q) for q in itertools.islice(itertools.cycle(questions), n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="函数调用批量对话运行器")
+    parser.add_argument("--script", choices=["function_tool", "function_learn"],
+                        default="function_tool")
+    parser.add_argument("-n", "--conversations", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread")
+    parser.add_argument("--questions", help="问题文件，每行一个；默认使用脚本内置问题")
+    parser.add_argument("--json", dest="json_path", help="把报告写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.script == "function_tool":
+        # 与直接运行 function_tool.py 一致，把工具日志写入 function_tool.log
+        setup_logging("function_tool.log")
+    module = importlib.import_module(f"src.function_calling.{args.script}")
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = [module.DEFAULT_QUESTION]
+    conversations = build_conversations(module.build_messages, questions, args.conversations)
+
+    if args.mode == "async":
+        report = asyncio.run(
+            arun_batch(module.arun_conversation, conversations, args.concurrency)
+        )
+    else:
+        report = run_batch(module.run_conversation, conversations, args.concurrency)
+
+    print(report.format())
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""确定性快速路径路由
+
+“现在几点 / 和 1980 年 1 月 1 日相差多少天”这类请求，完整的工具调用循环需要多次
+`/v1/chat/completions` 往返：模型先决定调用 get_current_time，再决定调用 computing_time，
+最后才组织回答。`FastPathRouter` 在调用模型之前按句拆分用户问题，每个分句都能被高置信度
+意图（正则，或可选的向量相似度）覆盖时，直接执行对应工具，模型只负责最后一步组织语言。
+任何一个分句无法识别（例如同时问了天气），就整体回退到原有的模型循环。
+
+内置意图：
+- current_time：现在几点 / 当前时间 → get_current_time()
+  分句（去掉语气词后）只能由“现在 / 当前 / 几点 / 什么时间”等词组成，带城市、时区或其它内容
+  （“纽约现在几点”“下午几点开会”）一律回退，避免用本地时间给出错误回答
+- time_since：和某个日期相差多少天 → get_current_time() + computing_time(日期, 当前时间)
+  需要日期 + 明确的差值说法 + 单位（相差 / 相隔 / 距今 …… 多少天 / 小时 / 年）；
+  问星期、几号、几点或年龄的分句回退。若分句中有两个日期则直接计算两者之差
+
+`RouterStats` 记录命中率，以及命中/未命中两条路径的端到端耗时与 LLM 调用次数，用于评估节省的延迟。
+"""
+
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from src.common.stats import LatencySummary
+from src.function_calling.tool_executor import ToolCall, ToolCallResult, ToolExecutor
+
+_CLAUSE_SPLIT = re.compile(r"[，,。；;？?！!\n]+")
+_FILLER_RE = re.compile(r"请|告诉我|帮我|一下|并且?|还有|以及|那么|然后|同时|再|吗|呢|吧|的|\s")
+_DATE_RE = re.compile(r"(\d{4})\s*[年\-/.]\s*(\d{1,2})\s*[月\-/.]\s*(\d{1,2})\s*[日号]?")
+
+
+@dataclass(frozen=True)
+class ResultRef:
+    """引用同一计划中前序工具的返回值作为参数。"""
+
+    tool_name: str
+
+
+# (工具名, 参数)，参数值可以是 ResultRef
+ToolSpec = Tuple[str, Dict[str, Any]]
+
+
+@dataclass
+class Intent:
+    """一个可被快速路径直接处理的意图。
+
+    patterns 任一命中即认为分句属于该意图；examples 用于可选的向量相似度匹配；
+    rejects 任一命中则该分句不属于该意图（对正则与向量匹配都生效）；
+    patterns / rejects 匹配的是去掉语气词后的分句。
+    build 从分句中抽取参数并返回要执行的工具列表，无法抽取时返回 None。
+    """
+
+    name: str
+    patterns: Sequence[Pattern]
+    build: Callable[[str], Optional[List[ToolSpec]]]
+    examples: Sequence[str] = ()
+    rejects: Sequence[Pattern] = ()
+
+    def rejected(self, core: str) -> bool:
+        return any(p.search(core) for p in self.rejects)
+
+
+def _format_date(match: "re.Match") -> str:
+    year, month, day = (int(g) for g in match.groups())
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _build_current_time(clause: str) -> Optional[List[ToolSpec]]:
+    return [("get_current_time", {})]
+
+
+def _build_time_since(clause: str) -> Optional[List[ToolSpec]]:
+    dates = [_format_date(m) for m in _DATE_RE.finditer(clause)]
+    if len(dates) >= 2:
+        return [("computing_time", {"start_time": dates[0], "end_time": dates[1]})]
+    if len(dates) == 1:
+        return [
+            ("get_current_time", {}),
+            ("computing_time", {
+                "start_time": dates[0], "end_time": ResultRef("get_current_time"),
+            }),
+        ]
+    return None
+
+
+DEFAULT_INTENTS: List[Intent] = [
+    Intent(
+        name="time_since",
+        patterns=[re.compile(
+            r"\d{4}\s*[年\-/.].*(相差|相隔|间隔|距今|距离现在|距离今天|到现在|到今天|至今|过去)"
+            r"了?有?(多少|几)个?(天|小时|分钟|秒|年|月|周)"
+        )],
+        build=_build_time_since,
+        examples=["和1980年1月1日相差多少天", "1980年1月1日距今多少年"],
+        rejects=[re.compile(r"星期|礼拜|周[几一二三四五六日天末]|几号|几点|岁|时区|UTC|GMT", re.I)],
+    ),
+    Intent(
+        name="current_time",
+        patterns=[re.compile(
+            r"^(现在|当前|目前|此刻|此时)?是?(几点钟?|什么时间|什么时候|时间|时刻)了?$"
+        )],
+        build=_build_current_time,
+        examples=["现在几点钟", "告诉我当前时间", "现在是什么时间"],
+        # 只允许这些字：带城市、时区、日期或事件的“几点”不是在问本地当前时间
+        rejects=[re.compile(r"[^现在当前目此刻时是几点钟什么候间了]")],
+    ),
+]
+
+
+@dataclass
+class RouteMatch:
+    """快速路径命中结果：命中的意图与按依赖排序的执行阶段。"""
+
+    intents: List[str]
+    stages: List[List[ToolSpec]]
+
+    @property
+    def tool_count(self) -> int:
+        return sum(len(stage) for stage in self.stages)
+
+
+@dataclass
+class RouterStats:
+    """命中率与两条路径的耗时、LLM 调用次数。"""
+
+    hits: int = 0
+    misses: int = 0
+    hit_seconds: List[float] = field(default_factory=list)
+    miss_seconds: List[float] = field(default_factory=list)
+    hit_llm_calls: int = 0
+    miss_llm_calls: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        hit = LatencySummary.from_samples(self.hit_seconds)
+        miss = LatencySummary.from_samples(self.miss_seconds)
+        result: Dict[str, Any] = {
+            "requests": self.requests,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 4),
+            "hit_latency": hit.to_dict(),
+            "miss_latency": miss.to_dict(),
+            "llm_calls_per_hit": round(self.hit_llm_calls / self.hits, 2) if self.hits else 0,
+            "llm_calls_per_miss": (
+                round(self.miss_llm_calls / self.misses, 2) if self.misses else 0
+            ),
+        }
+        if self.hit_seconds and self.miss_seconds:
+            result["saved_seconds_per_hit"] = round(miss.mean - hit.mean, 4)
+        return result
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class FastPathRouter:
+    """按分句匹配高置信度意图，全部分句命中时直接给出工具执行计划。"""
+
+    def __init__(
+        self,
+        intents: Optional[Sequence[Intent]] = None,
+        embedder: Optional[Callable[[str], Sequence[float]]] = None,
+        threshold: float = 0.85,
+    ) -> None:
+        self.intents = list(intents or DEFAULT_INTENTS)
+        self.embedder = embedder
+        self.threshold = threshold
+        self.stats = RouterStats()
+        self._lock = threading.Lock()
+        self._example_vectors: Optional[List[Tuple[Intent, Sequence[float]]]] = None
+
+    def _embedding_match(self, clause: str, core: str) -> Optional[Intent]:
+        if self.embedder is None:
+            return None
+        if self._example_vectors is None:
+            self._example_vectors = [
+                (intent, self.embedder(example))
+                for intent in self.intents
+                for example in intent.examples
+            ]
+        vector = self.embedder(clause)
+        best, best_score = None, 0.0
+        for intent, example_vector in self._example_vectors:
+            score = _cosine(vector, example_vector)
+            if score > best_score:
+                best, best_score = intent, score
+        if best is None or best_score < self.threshold or best.rejected(core):
+            return None
+        return best
+
+    def _match_clause(self, clause: str) -> Optional[Tuple[Intent, List[ToolSpec]]]:
+        core = _FILLER_RE.sub("", clause)
+        for intent in self.intents:
+            if intent.rejected(core):
+                continue
+            if any(p.search(core) for p in intent.patterns):
+                specs = intent.build(clause)
+                if specs is not None:
+                    return intent, specs
+        intent = self._embedding_match(clause, core)
+        if intent is not None:
+            specs = intent.build(clause)
+            if specs is not None:
+                return intent, specs
+        return None
+
+    def route(self, text: str) -> Optional[RouteMatch]:
+        """所有有效分句都命中时返回执行计划，否则返回 None（走原有模型循环）。"""
+        intents: List[str] = []
+        specs: List[ToolSpec] = []
+        for clause in _CLAUSE_SPLIT.split(text or ""):
+            if not _FILLER_RE.sub("", clause):
+                continue
+            matched = self._match_clause(clause)
+            if matched is None:
+                return None
+            intent, clause_specs = matched
+            intents.append(intent.name)
+            for spec in clause_specs:
+                if spec not in specs:  # 多个意图都需要当前时间时只执行一次
+                    specs.append(spec)
+        if not specs:
+            return None
+        independent = [s for s in specs if not _has_ref(s)]
+        dependent = [s for s in specs if _has_ref(s)]
+        stages = [stage for stage in (independent, dependent) if stage]
+        return RouteMatch(intents=intents, stages=stages)
+
+    @staticmethod
+    def _stage_calls(stage: List[ToolSpec], values: Dict[str, Any], offset: int) -> List[ToolCall]:
+        calls = []
+        for name, args in stage:
+            resolved = {
+                k: values.get(v.tool_name) if isinstance(v, ResultRef) else v
+                for k, v in args.items()
+            }
+            calls.append(ToolCall(id=f"fastpath_{offset + len(calls)}", name=name, args=resolved))
+        return calls
+
+    def execute(self, match: RouteMatch, executor: ToolExecutor) -> List[ToolCallResult]:
+        """按阶段执行计划，后一阶段的 ResultRef 参数替换为前一阶段的返回值。"""
+        values: Dict[str, Any] = {}
+        results: List[ToolCallResult] = []
+        for stage in match.stages:
+            for result in executor.run(self._stage_calls(stage, values, len(results))):
+                results.append(result)
+                if result.ok:
+                    values[result.name] = result.value
+        return results
+
+    async def aexecute(self, match: RouteMatch, executor: ToolExecutor) -> List[ToolCallResult]:
+        """execute 的异步版本。"""
+        values: Dict[str, Any] = {}
+        results: List[ToolCallResult] = []
+        for stage in match.stages:
+            for result in await executor.arun(self._stage_calls(stage, values, len(results))):
+                results.append(result)
+                if result.ok:
+                    values[result.name] = result.value
+        return results
+
+    def record(self, hit: bool, seconds: float, llm_calls: int) -> None:
+        """记录一次完整对话（命中或回退）的耗时与 LLM 调用次数。"""
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+                self.stats.hit_seconds.append(seconds)
+                self.stats.hit_llm_calls += llm_calls
+            else:
+                self.stats.misses += 1
+                self.stats.miss_seconds.append(seconds)
+                self.stats.miss_llm_calls += llm_calls
+
+
+def _has_ref(spec: ToolSpec) -> bool:
+    return any(isinstance(v, ResultRef) for v in spec[1].values())
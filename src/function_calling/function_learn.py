@@ -1,9 +1,17 @@
+import os
 import time
 import random
 from datetime import datetime
-from openai import OpenAI
-import httpx
-import json
+from typing import Annotated
+
+from src.common import ollama_client
+from src.common.lazy import LazyFactory
+from src.function_calling.batch_runner import ConversationResult
+from src.function_calling.history import HISTORY_TOKEN_BUDGET, HistoryManager
+from src.function_calling.stream_tools import astream_openai_turn, stream_openai_turn
+from src.function_calling.tool_cache import CachePolicy, ToolResultCache
+from src.function_calling.tool_executor import ToolCall, ToolExecutor
+from src.function_calling.tool_registry import ToolRegistry, parse_arguments
 
 """函数调用基础学习模块
 
@@ -18,51 +26,22 @@ import json
 
 使用场景：学习OpenAI函数调用机制的基础示例
 """
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "获取天气信息",
-            "parameters": {
-                "type": "object",
-                "properties": {"city": {"type": "string", "description": "城市名称"}},
-                "required": ["city"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_time",
-            "description": "获取当前时间",
-            "parameters": {"type": "object", "properties": {}, "required": []},
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "computing_time",
-            "description": "计算两个时间之间的秒数差, 秒可以转换成天数、小时数、分钟数、秒数.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "start_time": {"type": "string", "description": "开始时间，格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD"},
-                    "end_time": {"type": "string", "description": "结束时间，格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD"},
-                },
-                "required": ["start_time", "end_time"],
-            },
-        },
-    },
-]
-
-
-def get_weather(city: str):
+# 工具通过注册表声明：JSON Schema 由函数签名生成，参数在执行前统一校验与类型转换
+registry = ToolRegistry()
+
+DATETIME_FORMAT_HINT = "格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD"
+
+
+@registry.register
+def get_weather(city: Annotated[str, "城市名称"]):
+    """获取天气信息"""
     temperature = random.randint(10, 30)
     return f"城市{city}的天气是晴天, 温度是{temperature}度"
 
 
+@registry.register
 def get_current_time():
+    """获取当前时间"""
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
 
@@ -77,7 +56,17 @@ def _parse_datetime(s: str):
     raise ValueError(f"无法解析时间: {s!r}")
 
 
-def computing_time(start_time: str, end_time: str):
+@registry.register(
+    description="计算两个时间之间的秒数差, 秒可以转换成天数、小时数、分钟数、秒数.",
+    hint=(
+        "调用 computing_time 必须同时传入 start_time 和 end_time，"
+        "格式均为 YYYY-MM-DD HH:MM:SS。请先调用 get_current_time 获取当前时间再计算。"
+    ),
+)
+def computing_time(
+    start_time: Annotated[str, f"开始时间，{DATETIME_FORMAT_HINT}"],
+    end_time: Annotated[str, f"结束时间，{DATETIME_FORMAT_HINT}"],
+):
     """计算两个时间的秒数差。支持格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD。"""
     try:
         start_dt = _parse_datetime(start_time)
@@ -91,95 +80,216 @@ def computing_time(start_time: str, end_time: str):
     return delta.total_seconds()
 
 
-tool_map = {
-    "get_weather": get_weather,
-    "get_current_time": get_current_time,
-    "computing_time": computing_time,
+tool_map = registry
+tools = registry.schemas
+
+# 各工具的缓存策略：computing_time 为纯函数永久缓存，天气 5 分钟内复用，当前时间不缓存
+tool_cache_policies = {
+    "get_weather": CachePolicy(cacheable=True, ttl=300),
+    "get_current_time": CachePolicy(cacheable=False, ttl=0),
+    "computing_time": CachePolicy(cacheable=True),
 }
 
-messages = [
-    {
-        "role": "system",
-        "content": "你是一个专业的时间记录者, 涉及到时间和日期的,必须调用工具进行回答",
-    },
-    {"role": "user", "content": "请告诉我现在几点钟, 并告诉我和1980年1月1日相差多少天"},
-]
-
-
-client = OpenAI(
-    base_url="http://127.0.0.1:11434/v1",
-    api_key="ollama",
-    http_client=httpx.Client(
-        timeout=httpx.Timeout(
-            connect=10.0,  # 连接超时 10 秒
-            read=60.0,  # 读取超时 60 秒
-            write=60.0,
-            pool=60.0,
-        ),
-        limits=httpx.Limits(
-            max_connections=100,
-            max_keepalive_connections=20,
-            keepalive_expiry=45.0
-        ),
-        http1=True,  # 强制 HTTP/1.1，避免 HTTP/2 兼容问题
-    ),
-)
+SYSTEM_PROMPT = "你是一个专业的时间记录者, 涉及到时间和日期的,必须调用工具进行回答"
+DEFAULT_QUESTION = "请告诉我现在几点钟, 并告诉我和1980年1月1日相差多少天"
+
+
+def build_messages(question=DEFAULT_QUESTION):
+    """构造一条新对话的初始消息。"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question},
+    ]
+
+
+# 复用进程级共享的 OpenAI 客户端（连接池、超时在 src.common.ollama_client 中统一配置），
+# 第一次对话时才创建，导入本模块不加载 openai
+factory = LazyFactory(__name__)
+ollama_client.on_close(factory.clear)
+__getattr__ = factory.module_getattr()
+factory.register("client", ollama_client.get_openai_client)
+factory.register("async_client", ollama_client.get_async_openai_client)
 
 ollama_model = "qwen3:4b"
 # ollama_model = "llama3-groq-tool-use:8b"
 # ollama_model = "phi4-mini:latest"
 
-last_result = {}
-while True:
-    res = client.chat.completions.create(
+# 同一轮中相互独立的工具调用并发执行
+executor = ToolExecutor(
+    tool_map,
+    default_timeout=30.0,
+    cache=ToolResultCache(tool_cache_policies),
+    validate=registry.validate,
+)
+
+# STREAM_TOOL_CALLS=1 时以流式方式请求模型，参数完整的工具调用在生成过程中即开始执行
+stream_tool_calls = os.getenv("STREAM_TOOL_CALLS", "0") == "1"
+
+
+def _needs_end_time(call):
+    """只传了 start_time 的 computing_time 依赖同一轮 get_current_time 的结果，需要放到最后执行。"""
+    return call.name == "computing_time" and "end_time" not in call.args
+
+
+def _request(messages, history):
+    return dict(
         model=ollama_model,
-        messages=messages,
+        messages=history.compact(messages),
         tools=tools,
         tool_choice="auto",
-        stream=False,
     )
 
-    if res.choices[0].message.tool_calls:
-        print("---> 1")
+
+def _from_response(res):
+    """解析非流式响应，返回 (assistant_tool_calls, content, calls, ready, deferred)。"""
+    assistant_tool_calls = res.choices[0].message.tool_calls
+    content = res.choices[0].message.content
+    calls = [
+        ToolCall(
+            id=tool_call.id,
+            name=tool_call.function.name,
+            args=parse_arguments(tool_call.function.arguments),
+        )
+        for tool_call in assistant_tool_calls or []
+    ]
+    deferred = [c for c in calls if _needs_end_time(c)]
+    ready = [c for c in calls if c not in deferred]
+    return assistant_tool_calls, content, calls, ready, deferred
+
+
+def _from_stream(turn):
+    """解析流式结果：非延后的调用已在生成过程中执行完毕，ready 为空。"""
+    deferred_by_id = {c.id: c for c in turn.deferred}
+    calls = [deferred_by_id.get(c.id, c) for c in turn.calls]
+    return turn.tool_calls, turn.content, calls, [], turn.deferred
+
+
+def _remember(results, last_result):
+    for result in results:
+        if result.ok:
+            last_result["end_time"] = result.value
+
+
+def _fill_end_time(batch, deferred, last_result):
+    for call in batch:
+        # 若调用 computing_time 且模型只传了 start_time，用上一轮 get_current_time 的 end_time 补全
+        if call in deferred and "end_time" in last_result:
+            call.args["end_time"] = last_result["end_time"]
+
+
+def _append_tool_messages(messages, calls, results, verbose):
+    for call in calls:
+        result = results[call.id]
+        # 参数缺失或类型错误时 content 已是注册表生成的结构化错误（含 computing_time 的补参提示）
+        tool_result = result.content
+        if verbose:
+            print("---> 2")
+            cached = "（缓存）" if result.cached else ""
+            print(f"call --> tool: {call.name}{cached}, args: {call.args}, result: {tool_result}")
         messages.append(
             {
-                "role": "assistant",
-                "content": None,
-                "tool_calls": res.choices[0].message.tool_calls,
+                "role": "tool",
+                "content": str(tool_result),
+                "tool_call_id": call.id,
             }
         )
-        for tool_call in res.choices[0].message.tool_calls:
-            tool_name = tool_call.function.name
-            tool_args = json.loads(tool_call.function.arguments or "{}")
-            # 若调用 computing_time 且模型只传了 start_time，用上一轮 get_current_time 的 end_time 补全
-            if tool_name == "computing_time" and "end_time" not in tool_args and "end_time" in last_result:
-                tool_args["end_time"] = last_result["end_time"]
-            try:
-                tool_result = tool_map[tool_name](**tool_args)
-                last_result["end_time"] = tool_result
-            except TypeError as e:
-                if "computing_time" in tool_name:
-                    tool_result = (
-                        "调用 computing_time 必须同时传入 start_time 和 end_time，"
-                        "格式均为 YYYY-MM-DD HH:MM:SS。请先调用 get_current_time 获取当前时间再计算。"
-                    )
-                else:
-                    tool_result = f"调用失败，参数不完整: {e}"
-            print("---> 2")
-            print(f"call --> tool: {tool_name}, args: {tool_args}, result: {tool_result}")
-            messages.append(
-                {
-                    "role": "tool",
-                    "content": str(tool_result),
-                    "tool_call_id": tool_call.id,
-                }
-            )
-    else:
+
+
+def _append_assistant(messages, assistant_tool_calls, verbose):
+    if verbose:
+        print("---> 1")
+    messages.append(
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": assistant_tool_calls,
+        }
+    )
+
+
+def _finish(messages, content, result, start, verbose):
+    if verbose:
         print("---> 3")
-        messages.append(
-            {"role": "assistant", "content": res.choices[0].message.content}
-        )
+    messages.append(
+        {"role": "assistant", "content": content}
+    )
+    if verbose:
         print(messages)
-        break
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_conversation(messages, stream=None, verbose=False):
+    """执行一次完整的工具调用对话。messages 会被原地追加，返回 ConversationResult。"""
+    stream = stream_tool_calls if stream is None else stream
+    history = HistoryManager(token_budget=HISTORY_TOKEN_BUDGET)
+    result = ConversationResult(messages=messages)
+    start = time.perf_counter()
+    last_result = {}
+    while True:
+        request = _request(messages, history)
+        result.llm_calls += 1
+        results = {}
+        if stream:
+            turn = stream_openai_turn(
+                factory.get("client"), executor, defer=_needs_end_time, **request
+            )
+            assistant_tool_calls, content, calls, ready, deferred = _from_stream(turn)
+            results.update(turn.results)
+            _remember([turn.results[c.id] for c in calls if c.id in turn.results], last_result)
+        else:
+            res = factory.get("client").chat.completions.create(stream=False, **request)
+            assistant_tool_calls, content, calls, ready, deferred = _from_response(res)
+
+        if not assistant_tool_calls:
+            return _finish(messages, content, result, start, verbose)
+
+        _append_assistant(messages, assistant_tool_calls, verbose)
+        result.tool_calls += len(calls)
+        for batch in (ready, deferred):
+            _fill_end_time(batch, deferred, last_result)
+            batch_results = executor.run(batch)
+            results.update((r.tool_call_id, r) for r in batch_results)
+            _remember(batch_results, last_result)
+        _append_tool_messages(messages, calls, results, verbose)
+
+
+async def arun_conversation(messages, stream=None, verbose=False):
+    """run_conversation 的异步版本，使用共享异步连接池上的 AsyncOpenAI 客户端。"""
+    stream = stream_tool_calls if stream is None else stream
+    history = HistoryManager(token_budget=HISTORY_TOKEN_BUDGET)
+    result = ConversationResult(messages=messages)
+    start = time.perf_counter()
+    last_result = {}
+    while True:
+        request = _request(messages, history)
+        result.llm_calls += 1
+        results = {}
+        if stream:
+            turn = await astream_openai_turn(
+                factory.get("async_client"), executor, defer=_needs_end_time, **request
+            )
+            assistant_tool_calls, content, calls, ready, deferred = _from_stream(turn)
+            results.update(turn.results)
+            _remember([turn.results[c.id] for c in calls if c.id in turn.results], last_result)
+        else:
+            res = await factory.get("async_client").chat.completions.create(stream=False, **request)
+            assistant_tool_calls, content, calls, ready, deferred = _from_response(res)
+
+        if not assistant_tool_calls:
+            return _finish(messages, content, result, start, verbose)
+
+        _append_assistant(messages, assistant_tool_calls, verbose)
+        result.tool_calls += len(calls)
+        for batch in (ready, deferred):
+            _fill_end_time(batch, deferred, last_result)
+            batch_results = await executor.arun(batch)
+            results.update((r.tool_call_id, r) for r in batch_results)
+            _remember(batch_results, last_result)
+        _append_tool_messages(messages, calls, results, verbose)
+
 
-print("---> 4")
+if __name__ == "__main__":
+    messages = build_messages()
+    run_conversation(messages, verbose=True)
+    print("---> 4")
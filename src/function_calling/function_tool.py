@@ -19,6 +19,7 @@
 使用场景：生产环境下的函数调用实现参考
 """
 
+import os
 import random
 import time
 import logging
@@ -26,28 +27,30 @@ from datetime import datetime
 
 from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 
-# 配置日志
-logging.basicConfig(
-
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('function_tool.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+from src.common import ollama_client
+from src.common.lazy import LazyFactory
+from src.common.logging_setup import setup_logging
+from src.common.model_tiers import ModelTiers, TierStats
+from src.function_calling.batch_runner import ConversationResult
+from src.function_calling.fast_path import FastPathRouter
+from src.function_calling.history import (
+    HISTORY_TOKEN_BUDGET, HistoryManager, message_content, message_role,
 )
+from src.function_calling.stream_tools import astream_langchain_turn, stream_langchain_turn
+from src.function_calling.tool_cache import CachePolicy, ToolResultCache
+from src.function_calling.tool_executor import ToolCall, ToolExecutor
+
 logger = logging.getLogger(__name__)
 
 
 @tool
 def get_weather(city: str):
     """查询指定城市的天气（模拟）。"""
-    logger.info(f"开始查询城市天气: {city}")
+    logger.info("开始查询城市天气: %s", city, extra={"tool": "get_weather"})
     temperature = random.randint(1, 30)
     result = f"城市{city}的天气是晴天, 温度是{temperature}度"
-    logger.info(f"天气查询结果: {result}")
+    logger.info("天气查询结果: %s", result, extra={"tool": "get_weather"})
     return result
 
 
@@ -56,7 +59,7 @@ def get_current_time():
     """获取当前本地时间，格式为 YYYY-MM-DD HH:MM:SS。"""
     logger.info("开始获取当前时间")
     current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    logger.info(f"当前时间: {current_time}")
+    logger.info("当前时间: %s", current_time, extra={"tool": "get_current_time"})
     return current_time
 
 
@@ -74,11 +77,11 @@ def _parse_datetime(s: str):
 @tool
 def computing_time(start_time: str, end_time: str):
     """计算两个时间的秒数差。支持格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD。"""
-    logger.info(f"开始计算时间差: {start_time} 到 {end_time}")
+    logger.info("开始计算时间差: %s 到 %s", start_time, end_time, extra={"tool": "computing_time"})
     try:
         start_dt = _parse_datetime(start_time)
         end_dt = _parse_datetime(end_time)
-        logger.debug(f"解析后的时间: 开始={start_dt}, 结束={end_dt}")
+        logger.debug("解析后的时间: 开始=%s, 结束=%s", start_dt, end_dt)
     except ValueError as e:
         error_msg = (
             f"参数格式错误，支持: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD。"
@@ -88,7 +91,7 @@ def computing_time(start_time: str, end_time: str):
         return error_msg
     delta = end_dt - start_dt
     result = delta.total_seconds()
-    logger.info(f"时间差计算结果: {result} 秒")
+    logger.info("时间差计算结果: %s 秒", result, extra={"tool": "computing_time"})
     return result
 
 
@@ -98,6 +101,14 @@ tool_map = {
     "computing_time": computing_time,
 }
 
+# 各工具的缓存策略：computing_time 为纯函数永久缓存，天气 5 分钟内复用，当前时间不缓存
+tool_cache_policies = {
+    "get_weather": CachePolicy(cacheable=True, ttl=300),
+    "get_current_time": CachePolicy(cacheable=False, ttl=0),
+    "computing_time": CachePolicy(cacheable=True),
+}
+tool_cache = ToolResultCache(tool_cache_policies)
+
 # ollama_model = "functiongemma:latest"
 # ollama_model = "llama3-groq-tool-use:8b"
 # ollama_model = "phi4-mini:latest"
@@ -106,69 +117,224 @@ ollama_model = "qwen3:4b"
 
 last_result = {}
 
-llm = ChatOpenAI(
-    model=ollama_model,
-    temperature=0,
-    api_key="ollama",
-    base_url="http://127.0.0.1:11434/v1",
+# 同一轮的多个工具调用并发执行；天气查询依赖外部服务，单独设置较短的超时
+executor = ToolExecutor(
+    tool_map, default_timeout=30.0, timeouts={"get_weather": 10.0}, cache=tool_cache
 )
-with_tool_llm = llm.bind_tools([get_current_time, get_weather, computing_time])
-messages = [
-    {
-        "role": "system",
-        "content": "你是一个专业的时间记录者, 涉及到时间和日期的,必须调用工具进行回答",
-    },
-    {
-        "role": "user",
-        "content": "请告诉我现在几点钟, 并告诉我和1980年1月1日相差多少天, 还有上海和北京的天气怎么样?",
-    },
-]
-
-start_time = time.time()
-logger.info("开始执行对话流程")
-
-while True:
-    logger.debug("调用 LLM 模型")
-    res = with_tool_llm.invoke(messages)
-    
-    if res.tool_calls:
-        logger.info(f"检测到 {len(res.tool_calls)} 个工具调用")
-        messages.append(res)
-        
-        for tool_call in res.tool_calls:
-            function_name = tool_call.get("name", None)
-            args = tool_call.get("args") or {}
-            tool_call_id = tool_call.get("id", "")
-            
-            logger.info(f"执行工具调用: {function_name}, 参数: {args}")
-            
-            if function_name in tool_map:
-                tool_obj = tool_map[function_name]
-                func_result = tool_obj.invoke(args)
-                logger.info(f"工具执行结果: {func_result}")
-                
-                messages.append(
-                    ToolMessage(
-                        content=str(func_result),
-                        tool_call_id=tool_call_id,
-                    )
-                )
-            else:
-                logger.warning(f"未知的工具名称: {function_name}")
-                messages.append(
-                    ToolMessage(
-                        content=f"未知工具: {function_name}",
-                        tool_call_id=tool_call_id,
-                    )
-                )
-    else:
-        logger.info("LLM 返回最终答案")
-        messages.append(AIMessage(content=res.content))
-        logger.info(f"最终回答: {res.content}")
-        break
-
-end_time = time.time()
-elapsed_time = end_time - start_time
-logger.info(f"对话流程完成，总耗时: {elapsed_time:.2f} 秒")
-print(f"time: {elapsed_time} seconds")
-print(messages)
+
+# STREAM_TOOL_CALLS=1 时以流式方式请求模型，每个工具调用的参数一到齐就立即执行
+stream_tool_calls = os.getenv("STREAM_TOOL_CALLS", "0") == "1"
+
+# FAST_PATH_ROUTER=1 时先尝试确定性快速路径：命中则直接执行工具，模型只负责组织最终回答
+fast_path_router = FastPathRouter() if os.getenv("FAST_PATH_ROUTER", "0") == "1" else None
+
+# llm / with_tool_llm 在第一次对话时才构建（导入本模块不加载 langchain_openai），之后复用
+factory = LazyFactory(__name__)
+ollama_client.on_close(factory.clear)
+__getattr__ = factory.module_getattr()
+
+# 模型分级：设置 TOOL_ROUTER_MODEL / TOOL_ANSWER_MODEL 后，"调用哪个工具"由小模型决定，最终回答由大模型
+# 生成，小模型的工具调用未通过参数校验时同一轮升级给大模型；各角色的延迟与 token 见 tier_stats
+tier_stats = TierStats()
+factory.register(
+    "llm",
+    lambda: ModelTiers.from_env("TOOL_", ollama_model).build(tier_stats, temperature=0),
+)
+factory.register(
+    "with_tool_llm",
+    lambda: factory.get("llm").bind_tools([get_current_time, get_weather, computing_time]),
+)
+
+SYSTEM_PROMPT = "你是一个专业的时间记录者, 涉及到时间和日期的,必须调用工具进行回答"
+DEFAULT_QUESTION = "请告诉我现在几点钟, 并告诉我和1980年1月1日相差多少天, 还有上海和北京的天气怎么样?"
+
+
+def build_messages(question: str = DEFAULT_QUESTION) -> list:
+    """构造一条新对话的初始消息。"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question},
+    ]
+
+
+def append_tool_results(messages, results):
+    """记录工具执行结果，并按顺序追加 ToolMessage。"""
+    for result in results:
+        if result.name not in tool_map:
+            logger.warning("未知的工具名称: %s", result.name, extra={"tool": result.name})
+        elif result.cached:
+            logger.info(
+                "工具执行结果（缓存命中）: %s", result.content,
+                extra={"tool": result.name, "cached": True},
+            )
+        elif result.error:
+            logger.error("工具执行失败: %s", result.error, extra={"tool": result.name})
+        else:
+            logger.info(
+                "工具执行结果: %s（耗时 %.3f 秒）", result.content, result.elapsed,
+                extra={"tool": result.name, "elapsed_ms": round(result.elapsed * 1000, 3)},
+            )
+
+        messages.append(
+            ToolMessage(
+                content=result.content,
+                tool_call_id=result.tool_call_id,
+            )
+        )
+
+
+def _route_fast_path(messages):
+    """快速路径未启用或未命中时返回 None。"""
+    if fast_path_router is None or not messages or message_role(messages[-1]) != "user":
+        return None
+    # messages 可以是 dict 或 LangChain 消息对象，与 HistoryManager 一样统一取文本
+    match = fast_path_router.route(message_content(messages[-1]))
+    if match is not None:
+        logger.info("快速路径命中: %s，跳过模型的工具选择", match.intents)
+    return match
+
+
+def _append_fast_path_calls(messages, results):
+    messages.append(
+        AIMessage(
+            content="",
+            tool_calls=[{"name": r.name, "args": r.args, "id": r.tool_call_id} for r in results],
+        )
+    )
+    append_tool_results(messages, results)
+
+
+def _log_compaction(history):
+    stats = history.last_stats
+    if stats.tokens_after < stats.tokens_before:
+        logger.info(
+            "历史压缩: %d -> %d tokens, 折叠 %d 组工具调用, 丢弃 %d 轮",
+            stats.tokens_before, stats.tokens_after, stats.collapsed_groups, stats.dropped_turns,
+        )
+
+
+def _collect_calls(messages, res):
+    logger.info("检测到 %d 个工具调用", len(res.tool_calls))
+    messages.append(res)
+    calls = [
+        ToolCall(
+            id=tool_call.get("id", ""),
+            name=tool_call.get("name", None),
+            args=tool_call.get("args") or {},
+        )
+        for tool_call in res.tool_calls
+    ]
+    for call in calls:
+        logger.info(
+            "执行工具调用: %s, 参数: %s", call.name, call.args, extra={"tool": call.name}
+        )
+    return calls
+
+
+def _finish(messages, res, result, start):
+    logger.info("LLM 返回最终答案")
+    messages.append(AIMessage(content=res.content))
+    logger.info("最终回答: %s", res.content)
+    result.elapsed = time.perf_counter() - start
+    if fast_path_router is not None:
+        fast_path_router.record(result.fast_path, result.elapsed, result.llm_calls)
+    return result
+
+
+def run_conversation(messages, stream=None):
+    """执行一次完整的工具调用对话。messages 会被原地追加，返回 ConversationResult。
+
+    stream 为 None 时使用 STREAM_TOOL_CALLS 环境变量的设置。
+    """
+    stream = stream_tool_calls if stream is None else stream
+    history = HistoryManager(token_budget=HISTORY_TOKEN_BUDGET)
+    result = ConversationResult(messages=messages)
+    start = time.perf_counter()
+
+    match = _route_fast_path(messages)
+    if match is not None:
+        fast_results = fast_path_router.execute(match, executor)
+        _append_fast_path_calls(messages, fast_results)
+        result.fast_path = True
+        result.tool_calls += len(fast_results)
+
+    while True:
+        logger.debug("调用 LLM 模型")
+        # 快速路径命中后工具结果已齐，只让不带工具的模型组织回答
+        active_llm = factory.get("llm" if result.fast_path else "with_tool_llm")
+        result.llm_calls += 1
+        turn = None
+        if stream:
+            turn = stream_langchain_turn(active_llm, history.compact(messages), executor)
+            res = turn.message
+        else:
+            res = active_llm.invoke(history.compact(messages))
+        _log_compaction(history)
+
+        if not res.tool_calls:
+            return _finish(messages, res, result, start)
+
+        calls = _collect_calls(messages, res)
+        result.tool_calls += len(calls)
+        # 结果按 tool_calls 的原始顺序返回，ToolMessage 依次追加；流式模式下工具已在生成过程中执行
+        if turn is not None:
+            results = [turn.results[call.id] for call in calls]
+        else:
+            results = executor.run(calls)
+        append_tool_results(messages, results)
+
+
+async def arun_conversation(messages, stream=None):
+    """run_conversation 的异步版本：模型走共享异步连接池，工具通过 executor.arun 并发执行。"""
+    stream = stream_tool_calls if stream is None else stream
+    history = HistoryManager(token_budget=HISTORY_TOKEN_BUDGET)
+    result = ConversationResult(messages=messages)
+    start = time.perf_counter()
+
+    match = _route_fast_path(messages)
+    if match is not None:
+        fast_results = await fast_path_router.aexecute(match, executor)
+        _append_fast_path_calls(messages, fast_results)
+        result.fast_path = True
+        result.tool_calls += len(fast_results)
+
+    while True:
+        active_llm = factory.get("llm" if result.fast_path else "with_tool_llm")
+        result.llm_calls += 1
+        turn = None
+        if stream:
+            turn = await astream_langchain_turn(active_llm, history.compact(messages), executor)
+            res = turn.message
+        else:
+            res = await active_llm.ainvoke(history.compact(messages))
+        _log_compaction(history)
+
+        if not res.tool_calls:
+            return _finish(messages, res, result, start)
+
+        calls = _collect_calls(messages, res)
+        result.tool_calls += len(calls)
+        if turn is not None:
+            results = [turn.results[call.id] for call in calls]
+        else:
+            results = await executor.arun(calls)
+        append_tool_results(messages, results)
+
+
+if __name__ == "__main__":
+    # 配置日志：队列异步写入，文件为按大小轮转的 JSON 行，控制台保持原有文本格式。
+    # 只在脚本入口配置，作为库导入时不改动宿主进程的日志设置
+    setup_logging("function_tool.log")
+    logger.info("开始执行对话流程")
+    messages = build_messages()
+    conversation = run_conversation(messages)
+    logger.info("对话流程完成，总耗时: %.2f 秒", conversation.elapsed)
+    logger.info(
+        "工具缓存统计: %s, LLM 调用次数: %d", tool_cache.stats(), conversation.llm_calls
+    )
+    if fast_path_router is not None:
+        logger.info("快速路径统计: %s", fast_path_router.stats.to_dict())
+    if tier_stats.roles:
+        logger.info("模型分级统计: %s", tier_stats.to_dict())
+    print(f"time: {conversation.elapsed} seconds")
+    print(messages)
@@ -0,0 +1,217 @@
+"""对话历史压缩
+
+工具调用循环每一轮都把完整的 `messages` 重新发给模型，助手消息和工具结果不断累积，
+多工具对话的 prefill 成本随轮次近似平方增长。`HistoryManager` 在发送前按 token 预算压缩历史：
+
+1. 开头的 system 消息原样保留，保证前缀稳定，便于服务端复用 prefix cache
+2. 超出预算时，先把已结束轮次的「助手 tool_calls + 对应工具结果」折叠为一条简短的摘要消息
+3. 仍超出预算时，再折叠当前轮中较早的调用组
+4. 仍超出预算时，从最早开始丢弃已经得到最终回答的历史轮次
+5. 当前轮（最后一条 user 消息之后）最近的工具调用组始终保留原样，保证 tool_call_id 成对出现
+
+压缩是历史的确定性函数：同样的历史总是得到同样的结果。但它会改写前缀：某个调用组上一次
+原样发送、这一次被折叠（或旧轮次被丢弃）时，从该位置起的提示都变了，服务端只能复用到改动之前的
+prefix cache。因此只在超出预算时才压缩，并优先折叠已结束的轮次，尽量少改写当前轮。
+完整的 `messages` 仍由调用方保存，压缩结果只用于发送给模型。
+
+预算默认取环境变量 HISTORY_TOKEN_BUDGET（默认 1024），function_tool / function_learn 共用。
+
+同时支持 OpenAI 风格的 dict 消息和 LangChain 消息对象。
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+_CJK_RE = re.compile(r"[\u3000-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_LC_ROLES = {"system": "system", "human": "user", "ai": "assistant", "tool": "tool"}
+MESSAGE_OVERHEAD_TOKENS = 4
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1024"))
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符各计 1 个，其余字符按 4 个字符 1 个 token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_role(message: Any) -> str:
+    if isinstance(message, dict):
+        return message.get("role", "")
+    return _LC_ROLES.get(getattr(message, "type", ""), "")
+
+
+def message_content(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else message.content
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, ensure_ascii=False, default=str)
+
+
+def message_tool_calls(message: Any) -> List[Tuple[str, Any]]:
+    """返回消息中的工具调用 [(工具名, 参数)]，兼容 LangChain 与 OpenAI 两种格式。"""
+    calls = message.get("tool_calls") if isinstance(message, dict) else getattr(
+        message, "tool_calls", None
+    )
+    parsed = []
+    for call in calls or []:
+        if isinstance(call, dict) and "name" in call:  # LangChain ToolCall
+            parsed.append((call["name"], call.get("args") or {}))
+            continue
+        function = call.get("function") if isinstance(call, dict) else call.function
+        if isinstance(function, dict):
+            name, arguments = function.get("name"), function.get("arguments")
+        else:
+            name, arguments = function.name, function.arguments
+        try:
+            args = json.loads(arguments or "{}")
+        except (TypeError, ValueError):
+            args = arguments
+        parsed.append((name, args))
+    return parsed
+
+
+def message_tokens(message: Any, estimator: Callable[[str], int] = estimate_tokens) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimator(message_content(message))
+    for name, args in message_tool_calls(message):
+        tokens += estimator(name or "") + estimator(json.dumps(args, ensure_ascii=False))
+    return tokens
+
+
+def _format_args(args: Any) -> str:
+    if isinstance(args, dict):
+        return ", ".join(f"{k}={v}" for k, v in args.items())
+    return str(args)
+
+
+def _make_assistant(like: Any, content: str) -> Any:
+    """按原消息的格式（dict 或 LangChain 消息）构造一条助手消息。"""
+    if isinstance(like, dict):
+        return {"role": "assistant", "content": content}
+    from langchain_core.messages import AIMessage
+
+    return AIMessage(content=content)
+
+
+@dataclass
+class CompactionStats:
+    """一次压缩的统计信息。"""
+
+    tokens_before: int = 0
+    tokens_after: int = 0
+    messages_before: int = 0
+    messages_after: int = 0
+    collapsed_groups: int = 0
+    dropped_turns: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class HistoryManager:
+    """按 token 预算压缩对话历史。"""
+
+    def __init__(
+        self,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        keep_recent_groups: int = 1,
+        max_result_chars: int = 200,
+        estimator: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        self.token_budget = token_budget
+        self.keep_recent_groups = keep_recent_groups
+        self.max_result_chars = max_result_chars
+        self.estimator = estimator
+        self.last_stats = CompactionStats()
+
+    def count_tokens(self, messages: Sequence[Any]) -> int:
+        return sum(message_tokens(m, self.estimator) for m in messages)
+
+    def summarize_group(self, group: Sequence[Any]) -> Any:
+        """把一组「助手 tool_calls + 工具结果」折叠成一条助手摘要消息。"""
+        results = [message_content(m) for m in group[1:] if message_role(m) == "tool"]
+        lines = []
+        for idx, (name, args) in enumerate(message_tool_calls(group[0])):
+            result = results[idx] if idx < len(results) else ""
+            if len(result) > self.max_result_chars:
+                result = result[: self.max_result_chars] + "…"
+            lines.append(f"{name}({_format_args(args)}) -> {result}")
+        return _make_assistant(group[0], "[已调用工具] " + "; ".join(lines))
+
+    def _split(self, messages: Sequence[Any]) -> Tuple[List[Any], List[List[Any]]]:
+        """拆分为开头的 system 前缀与若干轮（每轮以 user 消息开始）。"""
+        idx = 0
+        while idx < len(messages) and message_role(messages[idx]) == "system":
+            idx += 1
+        prefix = list(messages[:idx])
+        turns: List[List[Any]] = []
+        for message in messages[idx:]:
+            if message_role(message) == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return prefix, turns
+
+    def _collapse(self, turn: List[Any], keep_groups: int) -> Tuple[List[Any], int]:
+        """折叠一轮中除最近 keep_groups 组以外的工具调用组。"""
+        groups: List[Tuple[int, int]] = []
+        i = 0
+        while i < len(turn):
+            if message_role(turn[i]) == "assistant" and message_tool_calls(turn[i]):
+                j = i + 1
+                while j < len(turn) and message_role(turn[j]) == "tool":
+                    j += 1
+                groups.append((i, j))
+                i = j
+            else:
+                i += 1
+        to_collapse = groups[: max(0, len(groups) - keep_groups)]
+        if not to_collapse:
+            return turn, 0
+        out: List[Any] = []
+        cursor = 0
+        for start, end in to_collapse:
+            out.extend(turn[cursor:start])
+            out.append(self.summarize_group(turn[start:end]))
+            cursor = end
+        out.extend(turn[cursor:])
+        return out, len(to_collapse)
+
+    def _total(self, prefix: List[Any], turns: List[List[Any]]) -> int:
+        return self.count_tokens(prefix) + sum(self.count_tokens(t) for t in turns)
+
+    def compact(self, messages: Sequence[Any]) -> List[Any]:
+        """返回压缩后的消息列表；不修改传入的 messages。"""
+        stats = CompactionStats(messages_before=len(messages))
+        stats.tokens_before = self.count_tokens(messages)
+        result = list(messages)
+        if stats.tokens_before > self.token_budget:
+            prefix, turns = self._split(messages)
+            # 先折叠已结束轮次的全部调用组；仍超预算时才折叠当前轮中较早的调用组
+            for idx in range(len(turns) - 1):
+                turns[idx], collapsed = self._collapse(turns[idx], 0)
+                stats.collapsed_groups += collapsed
+            if turns and self._total(prefix, turns) > self.token_budget:
+                turns[-1], collapsed = self._collapse(turns[-1], self.keep_recent_groups)
+                stats.collapsed_groups += collapsed
+            # 仍超预算时从最早开始丢弃已结束的轮次，当前轮始终保留
+            while len(turns) > 1 and self._total(prefix, turns) > self.token_budget:
+                turns.pop(0)
+                stats.dropped_turns += 1
+            result = prefix + [m for turn in turns for m in turn]
+        stats.messages_after = len(result)
+        stats.tokens_after = self.count_tokens(result)
+        self.last_stats = stats
+        return result
+
+
+def compact_history(
+    messages: Sequence[Any], token_budget: int = HISTORY_TOKEN_BUDGET
+) -> List[Any]:
+    """使用默认参数压缩一次历史的便捷函数。"""
+    return HistoryManager(token_budget=token_budget).compact(messages)
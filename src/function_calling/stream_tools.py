@@ -0,0 +1,369 @@
+"""流式工具调用：参数一到齐就开始执行工具
+
+非流式模式下，每一轮都要等完整的 completion 返回后才执行第一个工具。流式模式下，
+`ToolCallStreamParser` 按 index 增量拼接 tool_calls 的 name/arguments 片段，
+一个调用的 JSON 参数一旦完整（能被解析为 JSON 对象，或后一个调用已经开始，或流结束），
+就立即通过 `ToolExecutor.submit` 派发，此时模型仍在生成后面的调用。
+流结束时参数仍不是合法 JSON 的调用不会执行，直接得到结构化的参数错误结果；
+缺失或重复的 tool_call id 会被替换为按 index 生成的唯一 id，结果与 ToolMessage 据此一一对应。
+
+支持两种增量格式：
+- OpenAI SDK 的 `chunk.choices[0].delta.tool_calls`（function_learn.py）
+- LangChain `AIMessageChunk.tool_call_chunks`（function_tool.py）
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.function_calling.tool_executor import ToolCall, ToolCallResult, ToolExecutor
+
+logger = logging.getLogger(__name__)
+
+# (index, id, name, 参数片段)
+Fragment = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+
+@dataclass
+class _PartialCall:
+    index: int
+    id: str = ""
+    name: str = ""
+    arguments: str = ""
+    done: bool = False
+
+    def parsed_args(self) -> Optional[Dict[str, Any]]:
+        """参数已是完整的 JSON 对象时返回解析结果，否则返回 None。"""
+        text = self.arguments.strip()
+        if not text.endswith("}"):
+            return None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return None
+        return value if isinstance(value, dict) else None
+
+
+def openai_fragments(delta_tool_calls: Optional[Iterable[Any]]) -> List[Fragment]:
+    """把 OpenAI 流式 delta.tool_calls 转换为统一的片段格式。"""
+    fragments = []
+    for tc in delta_tool_calls or []:
+        function = getattr(tc, "function", None)
+        fragments.append((
+            tc.index,
+            getattr(tc, "id", None),
+            getattr(function, "name", None) if function else None,
+            getattr(function, "arguments", None) if function else None,
+        ))
+    return fragments
+
+
+def langchain_fragments(tool_call_chunks: Optional[Iterable[Dict[str, Any]]]) -> List[Fragment]:
+    """把 LangChain AIMessageChunk.tool_call_chunks 转换为统一的片段格式。"""
+    return [
+        (chunk.get("index") or 0, chunk.get("id"), chunk.get("name"), chunk.get("args"))
+        for chunk in tool_call_chunks or []
+    ]
+
+
+class ToolCallStreamParser:
+    """增量解析 tool_calls 片段，返回参数已完整的调用。"""
+
+    def __init__(self) -> None:
+        self._calls: Dict[int, _PartialCall] = {}
+        self._ids: Set[str] = set()
+        self.invalid: List[ToolCall] = []
+
+    def _assign_id(self, partial: _PartialCall) -> None:
+        """调用完成时确定 id：缺失或与之前的调用重复时按 index 生成唯一 id。"""
+        call_id = partial.id
+        suffix = 0
+        while not call_id or call_id in self._ids:
+            call_id = f"call_{partial.index}" + (f"_{suffix}" if suffix else "")
+            suffix += 1
+        if call_id != partial.id:
+            logger.info("工具调用 id %r 缺失或重复，改用 %s", partial.id, call_id)
+        partial.id = call_id
+        self._ids.add(call_id)
+
+    def _complete(self, partial: _PartialCall) -> Optional[ToolCall]:
+        if partial.done or not partial.name:
+            return None
+        args = partial.parsed_args()
+        if args is None:
+            if partial.arguments.strip():
+                return None
+            args = {}
+        partial.done = True
+        self._assign_id(partial)
+        return ToolCall(id=partial.id, name=partial.name, args=args)
+
+    def feed(self, fragments: Iterable[Fragment]) -> List[ToolCall]:
+        """喂入一批片段，返回本批中新完成的调用。"""
+        completed = []
+        for index, call_id, name, arguments in fragments:
+            partial = self._calls.get(index)
+            if partial is None:
+                # 新的调用开始，说明之前的调用都已生成完毕（参数为空的调用此时才算完整）
+                for earlier in self._calls.values():
+                    call = self._complete(earlier)
+                    if call is not None:
+                        completed.append(call)
+                partial = self._calls[index] = _PartialCall(index=index)
+            if call_id:
+                partial.id = call_id
+            if name:
+                partial.name += name
+            if arguments:
+                partial.arguments += arguments
+                if partial.parsed_args() is not None:
+                    call = self._complete(partial)
+                    if call is not None:
+                        completed.append(call)
+        return completed
+
+    def finish(self) -> List[ToolCall]:
+        """流结束：返回剩余的可执行调用；参数无法解析的调用放入 invalid，不交给执行器。"""
+        completed = []
+        for partial in self._calls.values():
+            if partial.done:
+                continue
+            call = self._complete(partial)
+            if call is None and partial.name:
+                partial.done = True
+                self._assign_id(partial)
+                self.invalid.append(ToolCall(id=partial.id, name=partial.name, args={}))
+                logger.warning("工具 %s 的参数不是合法 JSON: %r", partial.name, partial.arguments)
+            if call is not None:
+                completed.append(call)
+        return completed
+
+    def id_for(self, index: int) -> Optional[str]:
+        partial = self._calls.get(index)
+        return partial.id if partial is not None else None
+
+    def arguments_for(self, call_id: str) -> str:
+        for partial in self._calls.values():
+            if partial.id == call_id:
+                return partial.arguments
+        return ""
+
+    @property
+    def calls(self) -> List[ToolCall]:
+        """按 index 排列的全部调用。"""
+        return [
+            ToolCall(id=p.id, name=p.name, args=p.parsed_args() or {})
+            for _, p in sorted(self._calls.items())
+        ]
+
+    def raw_tool_calls(self) -> List[Dict[str, Any]]:
+        """OpenAI 格式的 tool_calls，用于追加助手消息。"""
+        return [
+            {
+                "id": p.id,
+                "type": "function",
+                "function": {"name": p.name, "arguments": p.arguments or "{}"},
+            }
+            for _, p in sorted(self._calls.items())
+        ]
+
+
+def invalid_arguments_result(call: ToolCall, raw: str) -> ToolCallResult:
+    """参数不是合法 JSON 对象时的结构化错误结果（工具不会被执行），提示模型重新生成参数。"""
+    error = json.dumps(
+        {"error": "参数不是合法的 JSON 对象", "tool": call.name, "arguments": raw},
+        ensure_ascii=False,
+    )
+    return ToolCallResult(
+        tool_call_id=call.id, name=call.name, args=call.args, content=error, error=error
+    )
+
+
+@dataclass
+class StreamedTurn:
+    """一轮流式调用的结果。
+
+    results 为已派发调用与参数非法调用的结果（按 tool_call_id 索引）；deferred 为被 defer 过滤、
+    尚未执行的调用，由调用方在补全参数后自行执行。dispatch_offsets 记录每个调用
+    相对于请求开始的派发时间（秒），便于观察提前派发带来的收益。
+    """
+
+    content: str = ""
+    calls: List[ToolCall] = field(default_factory=list)
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    results: Dict[str, ToolCallResult] = field(default_factory=dict)
+    deferred: List[ToolCall] = field(default_factory=list)
+    dispatch_offsets: Dict[str, float] = field(default_factory=dict)
+    stream_seconds: float = 0.0
+    message: Any = None
+
+    def assistant_message(self) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": self.content or None}
+        if self.tool_calls:
+            message["tool_calls"] = self.tool_calls
+        return message
+
+
+class _TurnBuilder:
+    """逐块消费流式响应：拼接文本、解析 tool_calls，参数完整的调用通过 submit 立即派发。"""
+
+    def __init__(
+        self,
+        to_fragments: Callable[[Any], List[Fragment]],
+        to_text: Callable[[Any], str],
+        submit: Callable[[ToolCall], Any],
+        defer: Optional[Callable[[ToolCall], bool]],
+    ) -> None:
+        self.turn = StreamedTurn()
+        self.pending: List[Tuple[ToolCall, Any]] = []
+        self.chunks: List[Any] = []
+        self._parser = ToolCallStreamParser()
+        self._to_fragments = to_fragments
+        self._to_text = to_text
+        self._submit = submit
+        self._defer = defer
+        self._text_parts: List[str] = []
+        self._start = time.perf_counter()
+
+    def _dispatch(self, calls: List[ToolCall]) -> None:
+        for call in calls:
+            if self._defer is not None and self._defer(call):
+                self.turn.deferred.append(call)
+                continue
+            self.turn.dispatch_offsets[call.id] = time.perf_counter() - self._start
+            logger.info("流式派发工具: %s, 参数: %s", call.name, call.args)
+            self.pending.append((call, self._submit(call)))
+
+    def feed(self, chunk: Any) -> None:
+        self.chunks.append(chunk)
+        text = self._to_text(chunk)
+        if text:
+            self._text_parts.append(text)
+        self._dispatch(self._parser.feed(self._to_fragments(chunk)))
+
+    def finish(self) -> StreamedTurn:
+        self._dispatch(self._parser.finish())
+        turn = self.turn
+        for call in self._parser.invalid:
+            raw = self._parser.arguments_for(call.id)
+            turn.results[call.id] = invalid_arguments_result(call, raw)
+        turn.stream_seconds = time.perf_counter() - self._start
+        turn.content = "".join(self._text_parts)
+        turn.calls = self._parser.calls
+        turn.tool_calls = self._parser.raw_tool_calls()
+        return turn
+
+    def merged_message(self) -> Any:
+        """把 LangChain 的 AIMessageChunk 合并为完整的 AIMessage。
+
+        tool_calls 的 id 替换为解析器确定的唯一 id，与 turn.results 的键一致。
+        """
+        from langchain_core.messages import AIMessageChunk, message_chunk_to_message
+
+        if not self.chunks:
+            return None
+        merged = self.chunks[0]
+        for chunk in self.chunks[1:]:
+            merged = merged + chunk
+        chunks = getattr(merged, "tool_call_chunks", None)
+        if chunks:
+            merged = AIMessageChunk(
+                content=merged.content,
+                additional_kwargs=merged.additional_kwargs,
+                response_metadata=merged.response_metadata,
+                usage_metadata=merged.usage_metadata,
+                id=merged.id,
+                tool_call_chunks=[
+                    {**chunk, "id": self._parser.id_for(chunk.get("index") or 0) or chunk["id"]}
+                    for chunk in chunks
+                ],
+            )
+        return message_chunk_to_message(merged)
+
+
+def _openai_fragments(chunk: Any) -> List[Fragment]:
+    if not chunk.choices:
+        return []
+    return openai_fragments(chunk.choices[0].delta.tool_calls)
+
+
+def _openai_text(chunk: Any) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _langchain_fragments(chunk: Any) -> List[Fragment]:
+    return langchain_fragments(getattr(chunk, "tool_call_chunks", None))
+
+
+def _langchain_text(chunk: Any) -> str:
+    return chunk.content if isinstance(chunk.content, str) else ""
+
+
+def stream_openai_turn(
+    client: Any,
+    executor: ToolExecutor,
+    defer: Optional[Callable[[ToolCall], bool]] = None,
+    **create_kwargs: Any,
+) -> StreamedTurn:
+    """以流式方式请求一轮 OpenAI chat completion，参数完整的工具调用立即派发。"""
+    builder = _TurnBuilder(_openai_fragments, _openai_text, executor.submit, defer)
+    for chunk in client.chat.completions.create(stream=True, **create_kwargs):
+        builder.feed(chunk)
+    turn = builder.finish()
+    for call, future in builder.pending:
+        turn.results[call.id] = executor.collect(call, future)
+    return turn
+
+
+async def astream_openai_turn(
+    client: Any,
+    executor: ToolExecutor,
+    defer: Optional[Callable[[ToolCall], bool]] = None,
+    **create_kwargs: Any,
+) -> StreamedTurn:
+    """stream_openai_turn 的异步版本，client 为 AsyncOpenAI。"""
+    builder = _TurnBuilder(_openai_fragments, _openai_text, executor.asubmit, defer)
+    async for chunk in await client.chat.completions.create(stream=True, **create_kwargs):
+        builder.feed(chunk)
+    turn = builder.finish()
+    for call, task in builder.pending:
+        turn.results[call.id] = await task
+    return turn
+
+
+def stream_langchain_turn(
+    llm: Any,
+    messages: List[Any],
+    executor: ToolExecutor,
+    defer: Optional[Callable[[ToolCall], bool]] = None,
+) -> StreamedTurn:
+    """以流式方式调用 LangChain 模型（已 bind_tools），turn.message 为合并后的 AIMessage。"""
+    builder = _TurnBuilder(_langchain_fragments, _langchain_text, executor.submit, defer)
+    for chunk in llm.stream(messages):
+        builder.feed(chunk)
+    turn = builder.finish()
+    turn.message = builder.merged_message()
+    for call, future in builder.pending:
+        turn.results[call.id] = executor.collect(call, future)
+    return turn
+
+
+async def astream_langchain_turn(
+    llm: Any,
+    messages: List[Any],
+    executor: ToolExecutor,
+    defer: Optional[Callable[[ToolCall], bool]] = None,
+) -> StreamedTurn:
+    """stream_langchain_turn 的异步版本。"""
+    builder = _TurnBuilder(_langchain_fragments, _langchain_text, executor.asubmit, defer)
+    async for chunk in llm.astream(messages):
+        builder.feed(chunk)
+    turn = builder.finish()
+    turn.message = builder.merged_message()
+    for call, task in builder.pending:
+        turn.results[call.id] = await task
+    return turn
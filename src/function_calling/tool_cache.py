@@ -0,0 +1,112 @@
+"""工具结果缓存
+
+对话循环里经常出现参数完全相同的工具调用：`computing_time` 是纯函数，
+`get_weather(city)` 的结果在几分钟内也可以复用。每个工具通过 `CachePolicy`
+声明是否可缓存及其 TTL，`ToolExecutor` 在执行前按 (工具名, 参数) 查询缓存。
+
+用法：
+    policies = {
+        "computing_time": CachePolicy(cacheable=True),            # 纯函数，永不过期
+        "get_weather": CachePolicy(cacheable=True, ttl=300),      # 5 分钟
+        "get_current_time": CachePolicy(cacheable=False, ttl=0),  # 每次都重新执行
+    }
+    executor = ToolExecutor(tool_map, cache=ToolResultCache(policies))
+
+缓存是进程内的，同一进程中的多轮、多次对话共享；只缓存执行成功的结果。
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """单个工具的缓存策略。ttl 单位为秒，None 表示不过期，0 等同于不可缓存。"""
+
+    cacheable: bool = False
+    ttl: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cacheable and (self.ttl is None or self.ttl > 0)
+
+
+NO_CACHE = CachePolicy()
+
+
+def make_key(name: str, args: Mapping[str, Any]) -> str:
+    """以工具名和按键排序的参数 JSON 作为缓存键。"""
+    return name + ":" + json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ToolResultCache:
+    """按工具策略过期的 LRU 结果缓存，线程安全。"""
+
+    def __init__(
+        self,
+        policies: Mapping[str, CachePolicy],
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.policies = dict(policies)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # 键 -> (过期时间或 None, 结果)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def policy_for(self, name: str) -> CachePolicy:
+        return self.policies.get(name, NO_CACHE)
+
+    def is_cacheable(self, name: str) -> bool:
+        return self.policy_for(name).enabled
+
+    def get(self, name: str, args: Mapping[str, Any]) -> Any:
+        """命中返回缓存的结果，否则返回 `MISSING`。"""
+        if not self.is_cacheable(name):
+            return MISSING
+        key = make_key(name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+        return MISSING
+
+    def put(self, name: str, args: Mapping[str, Any], value: Any) -> None:
+        policy = self.policy_for(name)
+        if not policy.enabled:
+            return
+        expires_at = None if policy.ttl is None else self._clock() + policy.ttl
+        key = make_key(name, args)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,327 @@
+"""并发工具执行器
+
+模型在同一轮回复中返回多个 tool_calls 时，原先的循环逐个 `tool_obj.invoke(args)`，
+慢工具（天气 API 之类）的耗时会串行累加。`ToolExecutor` 把同一轮中相互独立的调用并发执行：
+
+- 同步工具（普通函数、LangChain 同步工具）提交到线程池
+- 异步工具（协程函数、实现了 `_arun`/coroutine 的 LangChain 工具）在事件循环中执行
+- 每个工具可单独配置超时，超时或异常都会转换成结构化结果而不是抛出；
+  超时从提交时刻起算（截止时间记录在 Future 上），逐个收集结果不会让后面调用的等待时间累加
+- 结果始终按 tool_calls 的原始顺序返回，调用方据此依次追加 ToolMessage
+- 可选传入 `ToolResultCache`：可缓存工具先查缓存，同一批中参数相同的调用只执行一次
+- 可选传入 `validate`（如 `ToolRegistry.validate`）：执行前校验并转换参数，失败时直接返回结构化错误
+
+注意：线程池中的同步工具超时后无法被强制终止，只是不再等待其结果。
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from src.function_calling.tool_cache import MISSING, ToolResultCache, make_key
+
+logger = logging.getLogger(__name__)
+
+# (工具名, 参数) -> (转换后的参数, 错误内容)；错误内容为 None 表示校验通过
+Validator = Callable[[str, Mapping[str, Any]], Tuple[Dict[str, Any], Optional[str]]]
+
+
+@dataclass
+class ToolCall:
+    """模型请求的一次工具调用。"""
+
+    id: str
+    name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ToolCallResult:
+    """一次工具调用的执行结果。
+
+    value 为工具原始返回值；content 为回传给模型的字符串；
+    error 非空表示执行失败（未知工具、超时或异常），exception 保留原始异常便于调用方区分处理。
+    """
+
+    tool_call_id: str
+    name: str
+    args: Dict[str, Any]
+    value: Any = None
+    content: str = ""
+    error: Optional[str] = None
+    exception: Optional[BaseException] = None
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _LoopThread:
+    """在后台线程中运行的事件循环，用于在同步上下文中执行异步工具。"""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="tool-executor-loop", daemon=True
+        )
+        self.thread.start()
+
+    def run(self, coro, timeout: Optional[float]) -> Any:
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+_loop_thread: Optional[_LoopThread] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> _LoopThread:
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+        return _loop_thread
+
+
+def is_async_tool(tool: Any) -> bool:
+    """判断工具是否有原生异步实现。"""
+    if inspect.iscoroutinefunction(tool):
+        return True
+    try:
+        from langchain_core.tools import BaseTool, StructuredTool
+    except ImportError:  # pragma: no cover - 未安装 LangChain 时只支持普通函数
+        return False
+    if isinstance(tool, StructuredTool):
+        # @tool 装饰的同步函数 coroutine 为空，其 _arun 只是回退到线程池执行 _run
+        return tool.coroutine is not None
+    if isinstance(tool, BaseTool):
+        # 自定义工具子类覆盖了 _arun 才算真正的异步实现
+        return type(tool)._arun is not BaseTool._arun
+    return False
+
+
+def _call_sync(tool: Any, args: Dict[str, Any]) -> Any:
+    if hasattr(tool, "invoke"):
+        return tool.invoke(args)
+    return tool(**args)
+
+
+async def _call_async(tool: Any, args: Dict[str, Any]) -> Any:
+    if hasattr(tool, "ainvoke"):
+        return await tool.ainvoke(args)
+    return await tool(**args)
+
+
+class ToolExecutor:
+    """并发执行同一轮中的多个工具调用，结果按调用顺序返回。"""
+
+    def __init__(
+        self,
+        tool_map: Mapping[str, Any],
+        max_workers: int = 8,
+        default_timeout: Optional[float] = 30.0,
+        timeouts: Optional[Mapping[str, float]] = None,
+        cache: Optional[ToolResultCache] = None,
+        validate: Optional[Validator] = None,
+    ) -> None:
+        self.tool_map = tool_map
+        self.cache = cache
+        self.validate = validate
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool-executor"
+        )
+
+    def timeout_for(self, name: str) -> Optional[float]:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def _check(self, call: ToolCall) -> Optional[ToolCallResult]:
+        """校验并原地替换为转换后的参数；校验失败时返回错误结果，不执行工具。"""
+        if self.validate is None:
+            return None
+        args, error = self.validate(call.name, call.args)
+        call.args = args
+        if error is None:
+            return None
+        logger.info("工具参数校验失败: %s, 参数: %s", call.name, args)
+        return ToolCallResult(
+            tool_call_id=call.id, name=call.name, args=args, content=error, error=error
+        )
+
+    def _from_cache(self, call: ToolCall) -> Optional[ToolCallResult]:
+        if self.cache is None:
+            return None
+        value = self.cache.get(call.name, call.args)
+        if value is MISSING:
+            return None
+        logger.info("工具缓存命中: %s, 参数: %s", call.name, call.args)
+        return ToolCallResult(
+            tool_call_id=call.id, name=call.name, args=call.args,
+            value=value, content=str(value), cached=True,
+        )
+
+    def _store(self, result: ToolCallResult) -> None:
+        if self.cache is not None and result.ok:
+            self.cache.put(result.name, result.args, result.value)
+
+    def _dedupe_key(self, call: ToolCall) -> Optional[str]:
+        if self.cache is None or not self.cache.is_cacheable(call.name):
+            return None
+        return make_key(call.name, call.args)
+
+    @staticmethod
+    def _reuse(call: ToolCall, result: ToolCallResult) -> ToolCallResult:
+        """把同一批中相同调用的结果复制给另一个 tool_call_id。"""
+        return ToolCallResult(
+            tool_call_id=call.id, name=call.name, args=call.args, value=result.value,
+            content=result.content, error=result.error, exception=result.exception,
+            elapsed=0.0, cached=True,
+        )
+
+    # ---------------- 同步接口 ----------------
+
+    def _execute(self, call: ToolCall) -> ToolCallResult:
+        hit = self._check(call) or self._from_cache(call)
+        if hit is not None:
+            return hit
+        result = ToolCallResult(tool_call_id=call.id, name=call.name, args=call.args)
+        tool = self.tool_map.get(call.name)
+        if tool is None:
+            result.error = result.content = f"未知工具: {call.name}"
+            return result
+        start = time.perf_counter()
+        try:
+            if is_async_tool(tool):
+                timeout = self.timeout_for(call.name)
+                value = _background_loop().run(_call_async(tool, call.args), timeout)
+            else:
+                value = _call_sync(tool, call.args)
+            result.value = value
+            result.content = str(value)
+        except Exception as e:  # noqa: BLE001  工具异常统一转换为结果回传给模型
+            result.exception = e
+            result.error = result.content = f"工具 {call.name} 执行失败: {e}"
+        result.elapsed = time.perf_counter() - start
+        self._store(result)
+        return result
+
+    def submit(self, call: ToolCall) -> "concurrent.futures.Future[ToolCallResult]":
+        """提交单个调用，立即返回 Future（供流式场景在参数到齐后即时派发）。"""
+        timeout = self.timeout_for(call.name)
+        future = self._pool.submit(self._execute, call)
+        future.deadline = None if timeout is None else time.monotonic() + timeout
+        return future
+
+    def collect(
+        self, call: ToolCall, future: "concurrent.futures.Future[ToolCallResult]"
+    ) -> ToolCallResult:
+        """等待单个调用完成，超过提交时确定的截止时间则返回超时结果。"""
+        timeout = self.timeout_for(call.name)
+        deadline = getattr(future, "deadline", None)
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+        else:
+            remaining = timeout
+        try:
+            return future.result(timeout=remaining)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            logger.warning("工具 %s 执行超时（%ss）", call.name, timeout)
+            msg = f"工具 {call.name} 执行超时（{timeout}s）"
+            return ToolCallResult(
+                tool_call_id=call.id, name=call.name, args=call.args,
+                content=msg, error=msg, exception=e, elapsed=timeout or 0.0,
+            )
+
+    def run(self, calls: List[ToolCall]) -> List[ToolCallResult]:
+        """并发执行一批调用，按原始顺序返回结果。"""
+        futures = {}
+        pending = []
+        for call in calls:
+            key = self._dedupe_key(call)
+            first = key is not None and key not in futures
+            if key is None or first:
+                future = self.submit(call)
+                if first:
+                    futures[key] = (call, future)
+                pending.append((call, future, None))
+            else:
+                pending.append((call, futures[key][1], futures[key][0]))
+        results = []
+        for call, future, origin in pending:
+            if origin is None:
+                results.append(self.collect(call, future))
+            else:
+                results.append(self._reuse(call, self.collect(origin, future)))
+        return results
+
+    # ---------------- 异步接口 ----------------
+
+    async def _aexecute(self, call: ToolCall) -> ToolCallResult:
+        hit = self._check(call) or self._from_cache(call)
+        if hit is not None:
+            return hit
+        tool = self.tool_map.get(call.name)
+        if tool is None:
+            msg = f"未知工具: {call.name}"
+            return ToolCallResult(call.id, call.name, call.args, error=msg, content=msg)
+        timeout = self.timeout_for(call.name)
+        start = time.perf_counter()
+        result = ToolCallResult(tool_call_id=call.id, name=call.name, args=call.args)
+        try:
+            if is_async_tool(tool):
+                coro = _call_async(tool, call.args)
+            else:
+                loop = asyncio.get_running_loop()
+                coro = loop.run_in_executor(self._pool, _call_sync, tool, call.args)
+            value = await asyncio.wait_for(coro, timeout)
+            result.value = value
+            result.content = str(value)
+        except asyncio.TimeoutError as e:
+            logger.warning("工具 %s 执行超时（%ss）", call.name, timeout)
+            result.exception = e
+            result.error = result.content = f"工具 {call.name} 执行超时（{timeout}s）"
+        except Exception as e:  # noqa: BLE001
+            result.exception = e
+            result.error = result.content = f"工具 {call.name} 执行失败: {e}"
+        result.elapsed = time.perf_counter() - start
+        self._store(result)
+        return result
+
+    def asubmit(self, call: ToolCall) -> "asyncio.Task[ToolCallResult]":
+        """submit 的异步版本：在当前事件循环中立即开始执行，返回 Task。"""
+        return asyncio.ensure_future(self._aexecute(call))
+
+    async def arun(self, calls: List[ToolCall]) -> List[ToolCallResult]:
+        """run 的异步版本：异步工具直接 await，同步工具放入线程池。"""
+        tasks: Dict[str, asyncio.Task] = {}
+        pending = []
+        for call in calls:
+            key = self._dedupe_key(call)
+            if key is not None and key in tasks:
+                pending.append((call, tasks[key], True))
+                continue
+            task = self.asubmit(call)
+            if key is not None:
+                tasks[key] = task
+            pending.append((call, task, False))
+        results = []
+        for call, task, reused in pending:
+            result = await task
+            results.append(self._reuse(call, result) if reused else result)
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,349 @@
+"""预编译的工具注册表
+
+`function_learn.py` 原先手写 `tools` JSON Schema，与 `tool_map` 手工保持同步；参数用
+`json.loads` 解码后直接 `**tool_args` 传入，缺参或类型不对时靠捕获 `TypeError` 再拼提示。
+`ToolRegistry` 在注册时一次性完成：
+
+- 从函数签名生成 JSON Schema（参数说明写在 `Annotated[str, "说明"]` 中，工具说明取 docstring 首行），
+  `schemas` 在注册表变化前只构建一次，每次请求直接复用
+- 为每个工具编译参数校验器：检查必填参数、按注解做类型转换（"3" -> 3、3 -> "3"、"true" -> True 等），
+  `Literal` 校验枚举值，未声明的多余参数直接丢弃
+- 按名称 O(1) 查找；校验失败时返回结构化的 JSON 错误（含逐项原因与工具自定义提示）给模型，
+  不进入工具函数、也不依赖异常
+
+注册表本身是 `Mapping[str, callable]`，可直接作为 `ToolExecutor` 的 tool_map，并通过
+`validate=registry.validate` 在执行前完成校验与转换：
+
+    registry = ToolRegistry()
+
+    @registry.register
+    def get_weather(city: Annotated[str, "城市名称"]):
+        \"\"\"获取天气信息\"\"\"
+
+    client.chat.completions.create(..., tools=registry.schemas)
+    executor = ToolExecutor(registry, validate=registry.validate)
+"""
+
+import inspect
+import json
+import logging
+import threading
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+               list: "array", dict: "object"}
+_TRUE = frozenset({"true", "1", "yes", "y", "是"})
+_FALSE = frozenset({"false", "0", "no", "n", "否"})
+_EMPTY = inspect.Parameter.empty
+
+Coercer = Callable[[Any], Any]
+
+
+class _Invalid(ValueError):
+    """参数值无法转换为声明的类型（仅在编译后的校验器内部使用）。"""
+
+
+def _to_str(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise _Invalid(f"应为字符串，实际为 {type(value).__name__}")
+
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise _Invalid("应为整数，实际为布尔值")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise _Invalid(f"应为整数，实际为 {value!r}")
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise _Invalid(f"应为数字，实际为 {value!r}")
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+    raise _Invalid(f"应为布尔值，实际为 {value!r}")
+
+
+def _json_container(expected: type) -> Coercer:
+    def coerce(value: Any) -> Any:
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        if not isinstance(value, expected):
+            raise _Invalid(f"应为 {_JSON_TYPES[expected]}，实际为 {type(value).__name__}")
+        return value
+
+    return coerce
+
+
+_COERCERS: Dict[type, Coercer] = {
+    str: _to_str, int: _to_int, float: _to_float, bool: _to_bool,
+    list: _json_container(list), dict: _json_container(dict),
+}
+
+
+def _passthrough(value: Any) -> Any:
+    return value
+
+
+def _compile_type(annotation: Any) -> Tuple[Dict[str, Any], Coercer]:
+    """把类型注解编译为 (JSON Schema 片段, 转换函数)。"""
+    if annotation is _EMPTY or annotation is Any:
+        return {}, _passthrough
+    origin = typing.get_origin(annotation)
+    if origin is typing.Annotated:
+        return _compile_type(typing.get_args(annotation)[0])
+    if origin is typing.Union:
+        members = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(members) == 1:
+            schema, coerce = _compile_type(members[0])
+            return schema, lambda v: None if v is None else coerce(v)
+        return {}, _passthrough
+    if origin is typing.Literal:
+        choices = typing.get_args(annotation)
+        lookup = {str(c): c for c in choices}
+
+        def coerce_literal(value: Any) -> Any:
+            if value in choices:
+                return value
+            if str(value) in lookup:
+                return lookup[str(value)]
+            raise _Invalid(f"可选值为 {list(choices)}，实际为 {value!r}")
+
+        schema: Dict[str, Any] = {"enum": list(choices)}
+        json_type = _JSON_TYPES.get(type(choices[0])) if choices else None
+        if json_type:
+            schema["type"] = json_type
+        return schema, coerce_literal
+    base = origin or annotation
+    if base in _COERCERS:
+        schema = {"type": _JSON_TYPES[base]}
+        if base is list and typing.get_args(annotation):
+            item_schema, _ = _compile_type(typing.get_args(annotation)[0])
+            if item_schema:
+                schema["items"] = item_schema
+        return schema, _COERCERS[base]
+    return {}, _passthrough
+
+
+def _description(annotation: Any) -> Optional[str]:
+    if typing.get_origin(annotation) is typing.Annotated:
+        for meta in typing.get_args(annotation)[1:]:
+            if isinstance(meta, str):
+                return meta
+    return None
+
+
+@dataclass(frozen=True)
+class ParamSpec:
+    """编译后的单个参数。"""
+
+    name: str
+    required: bool
+    default: Any
+    coerce: Coercer
+    schema: Dict[str, Any]
+
+
+@dataclass
+class RegisteredTool:
+    """注册表中的一个工具：原函数、JSON Schema 与编译好的参数校验器。"""
+
+    name: str
+    fn: Callable[..., Any]
+    description: str
+    params: Tuple[ParamSpec, ...]
+    hint: Optional[str] = None
+    schema: Dict[str, Any] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._names = frozenset(p.name for p in self.params)
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {p.name: p.schema for p in self.params},
+                    "required": [p.name for p in self.params if p.required],
+                },
+            },
+        }
+
+    def validate(self, args: Mapping[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """校验并转换参数，返回 (转换后的参数, 错误列表)。错误列表为空表示通过。"""
+        coerced: Dict[str, Any] = {}
+        errors: List[Dict[str, str]] = []
+        for param in self.params:
+            if param.name not in args:
+                if param.required:
+                    errors.append({"param": param.name, "message": "缺少必填参数"})
+                continue
+            try:
+                coerced[param.name] = param.coerce(args[param.name])
+            except _Invalid as e:
+                errors.append({"param": param.name, "message": str(e)})
+        if len(args) > len(coerced) + len(errors):
+            extra = [k for k in args if k not in self._names]
+            if extra:
+                logger.debug("工具 %s 忽略未声明的参数: %s", self.name, extra)
+        return coerced, errors
+
+    def error_content(self, errors: List[Dict[str, str]]) -> str:
+        """回传给模型的结构化错误。"""
+        payload: Dict[str, Any] = {"error": "参数校验失败", "tool": self.name, "details": errors}
+        if self.hint:
+            payload["hint"] = self.hint
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def compile_tool(
+    fn: Callable[..., Any],
+    name: Optional[str] = None,
+    description: Optional[str] = None,
+    hint: Optional[str] = None,
+) -> RegisteredTool:
+    """从函数签名构建 JSON Schema 与参数校验器。"""
+    hints = typing.get_type_hints(fn, include_extras=True)
+    params = []
+    for param in inspect.signature(fn).parameters.values():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        annotation = hints.get(param.name, _EMPTY)
+        schema, coerce = _compile_type(annotation)
+        schema = dict(schema)
+        param_description = _description(annotation)
+        if param_description:
+            schema["description"] = param_description
+        params.append(ParamSpec(
+            name=param.name,
+            required=param.default is _EMPTY,
+            default=param.default,
+            coerce=coerce,
+            schema=schema,
+        ))
+    doc = inspect.getdoc(fn) or ""
+    return RegisteredTool(
+        name=name or fn.__name__,
+        fn=fn,
+        description=description or (doc.splitlines()[0] if doc else ""),
+        params=tuple(params),
+        hint=hint,
+    )
+
+
+def parse_arguments(raw: Any) -> Dict[str, Any]:
+    """解码模型给出的 arguments；无法解析或不是对象时返回空字典，由校验器报告缺参。"""
+    if isinstance(raw, dict):
+        return raw
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        logger.warning("工具参数不是合法 JSON: %s", raw)
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+class ToolRegistry(Mapping[str, Callable[..., Any]]):
+    """按名称注册工具，提供预构建的 schemas 与 O(1) 的校验、分发。"""
+
+    def __init__(self) -> None:
+        self._tools: Dict[str, RegisteredTool] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        fn: Optional[Callable[..., Any]] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        hint: Optional[str] = None,
+    ) -> Any:
+        """注册工具，可直接调用或作为装饰器（带参数或不带参数）使用，返回原函数。"""
+
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            compiled = compile_tool(func, name=name, description=description, hint=hint)
+            with self._lock:
+                self._tools[compiled.name] = compiled
+                self._schemas = None
+            return func
+
+        return decorator(fn) if fn is not None else decorator
+
+    @property
+    def schemas(self) -> List[Dict[str, Any]]:
+        """所有工具的 OpenAI tools 参数。注册表不变时返回同一个列表。"""
+        schemas = self._schemas
+        if schemas is None:
+            with self._lock:
+                schemas = self._schemas = [t.schema for t in self._tools.values()]
+        return schemas
+
+    def tool(self, name: str) -> Optional[RegisteredTool]:
+        return self._tools.get(name)
+
+    def validate(self, name: str, args: Mapping[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """返回 (转换后的参数, 结构化错误)。未注册的工具原样返回，交由执行器报告未知工具。"""
+        compiled = self._tools.get(name)
+        if compiled is None:
+            return dict(args), None
+        coerced, errors = compiled.validate(args)
+        if errors:
+            return coerced, compiled.error_content(errors)
+        return coerced, None
+
+    def dispatch(self, name: str, args: Mapping[str, Any]) -> Any:
+        """同步校验并调用工具；校验失败时返回结构化错误字符串而不调用工具。"""
+        compiled = self._tools.get(name)
+        if compiled is None:
+            return json.dumps({"error": "未知工具", "tool": name}, ensure_ascii=False)
+        coerced, errors = compiled.validate(args)
+        if errors:
+            return compiled.error_content(errors)
+        return compiled.fn(**coerced)
+
+    def __getitem__(self, name: str) -> Callable[..., Any]:
+        return self._tools[name].fn
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
@@ -1,31 +1,355 @@
-from openai import OpenAI
-import httpx
+"""Ollama 调试工具与模型性能探针
+
+- `python -m src.python_basics.debug_ollama`：列出本地模型（原有功能）
+- `python -m src.python_basics.debug_ollama probe -o probe.json`：逐个已安装模型测量
+  - 冷加载（先 keep_alive=0 卸载）与热加载耗时，含服务端报告的 load_duration
+  - 向量模型：不同 batch 大小下 /api/embed 的延迟与 texts/s
+  - 对话模型：不同 prompt 长度下的 TTFT 与解码 tokens/s（流式 /v1/chat/completions，每次请求的 prompt
+    前缀不同，避免命中 Ollama 的前缀缓存）
+  - N 路并发下的总吞吐（对话为 tokens/s，向量为 texts/s）与 TTFT 分位数
+- `python -m src.python_basics.debug_ollama compare old.json new.json`：对比两份结果中的数值指标，
+  用于比较不同 Ollama 版本、主机与量化版本（如 rag_test.py 中的 qwen3:4b-instruct-2507-q4_K_M）
+
+结果 JSON 按键排序写出，同样配置下不同机器 / 版本的结果可以直接 diff。
+冷加载会卸载正在使用的模型，在共享的 Ollama 服务上可以用 --no-cold-load 跳过。
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.common import ollama_client
+from src.common.stats import LatencySummary
+from src.python_basics.deepseek import AsyncChat, summarize
 
 # 连接本地的Ollama服务.
 
-# 创建自定义 httpx Client（兼容旧版）
-client = OpenAI(
-    base_url="http://127.0.0.1:11434/v1",
-    api_key="ollama",
-    http_client=httpx.Client(
-        timeout=httpx.Timeout(
-            connect=10.0,  # 连接超时 10 秒
-            read=60.0,  # 读取超时 60 秒
-            write=60.0,
-            pool=60.0,
-        ),
-        limits=httpx.Limits(
-            max_connections=100, max_keepalive_connections=20, keepalive_expiry=45.0
-        ),
-        http1=True,  # 强制 HTTP/1.1，避免 HTTP/2 兼容问题
-    ),
-)
+# 复用进程级共享的 OpenAI 客户端（连接池、超时在 src.common.ollama_client 中统一配置）
+client = ollama_client.get_openai_client()
+
+PROBE_VERSION = 1
+EMBEDDING = "embedding"
+CHAT = "chat"
+
+FILLER = "请根据以下背景资料回答问题。背景资料是一段用于测量预填充耗时的示例文本。"
+# 名称中带这些关键字的模型在 /api/show 不可用时按向量模型处理
+_EMBEDDING_HINTS = ("embed", "m3e", "bge", "e5")
+
+
+@dataclass
+class ProbeConfig:
+    """探针参数；随结果一起写入 JSON，对比时可确认两份结果的测量条件一致。"""
+
+    batch_sizes: List[int] = field(default_factory=lambda: [1, 8, 32])
+    prompt_tokens: List[int] = field(default_factory=lambda: [16, 256, 1024])
+    concurrency: List[int] = field(default_factory=lambda: [1, 4, 8])
+    max_tokens: int = 64
+    repeat: int = 3
+    cold_load: bool = True
+    timeout: float = 300.0
+
+
+def _get_json(path: str) -> Dict[str, Any]:
+    url = f"{ollama_client.get_settings().base_url}{path}"
+    resp = ollama_client.get_http_client().get(url)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def list_models() -> List[str]:
+    return [m["name"] for m in _get_json("/api/tags").get("models", [])]
+
+
+def model_info(model: str) -> Dict[str, Any]:
+    """返回模型类型（chat / embedding）与 /api/show 中的格式、参数量、量化等级。"""
+    try:
+        show = ollama_client.post_json("/api/show", {"model": model}, timeout=30)
+    except Exception:  # noqa: BLE001  旧版本 Ollama 不返回 capabilities，按名称判断
+        show = {}
+    capabilities = show.get("capabilities")
+    if capabilities:
+        kind = EMBEDDING if "completion" not in capabilities else CHAT
+    else:
+        kind = EMBEDDING if any(h in model.lower() for h in _EMBEDDING_HINTS) else CHAT
+    details = show.get("details") or {}
+    return {
+        "kind": kind,
+        "format": details.get("format"),
+        "family": details.get("family"),
+        "parameter_size": details.get("parameter_size"),
+        "quantization_level": details.get("quantization_level"),
+    }
+
+
+# ---------------- 加载耗时 ----------------
+
+def _load(
+    model: str, kind: str, timeout: float, keep_alive: Optional[int] = None
+) -> Dict[str, float]:
+    """发送一次只加载模型的请求（对话模型为空 prompt 的 /api/generate），返回端到端与服务端加载耗时。"""
+    if kind == EMBEDDING:
+        path, payload = "/api/embed", {"model": model, "input": "warmup"}
+    else:
+        path, payload = "/api/generate", {"model": model, "prompt": ""}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    start = time.perf_counter()
+    data = ollama_client.post_json(path, payload, timeout=timeout)
+    return {
+        "seconds": time.perf_counter() - start,
+        "load_seconds": (data.get("load_duration") or 0) / 1e9,
+    }
+
+
+def measure_load(model: str, kind: str, config: ProbeConfig) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    if config.cold_load:
+        unload = {"model": model, "keep_alive": 0}
+        ollama_client.post_json("/api/generate" if kind == CHAT else "/api/embed", unload,
+                                timeout=config.timeout)
+        result["cold"] = _load(model, kind, config.timeout)
+    warm = [_load(model, kind, config.timeout) for _ in range(config.repeat)]
+    result["warm"] = {
+        "seconds": LatencySummary.from_samples([w["seconds"] for w in warm]).to_dict(),
+        "load_seconds": sum(w["load_seconds"] for w in warm) / len(warm),
+    }
+    return result
+
+
+# ---------------- 向量模型 ----------------
+
+def _texts(n: int, tag: str) -> List[str]:
+    return [f"[{tag}-{i}] {FILLER}" for i in range(n)]
+
+
+def measure_embedding(model: str, config: ProbeConfig) -> Dict[str, Any]:
+    results = {}
+    for batch in config.batch_sizes:
+        latencies = []
+        for r in range(config.repeat):
+            texts = _texts(batch, f"b{batch}r{r}")
+            start = time.perf_counter()
+            ollama_client.embed_batch(texts, model, timeout=config.timeout)
+            latencies.append(time.perf_counter() - start)
+        results[str(batch)] = {
+            "latency": LatencySummary.from_samples(latencies).to_dict(),
+            "texts_per_second": round(batch * len(latencies) / sum(latencies), 3),
+        }
+    return results
+
+
+async def measure_embedding_concurrency(model: str, config: ProbeConfig) -> Dict[str, Any]:
+    results = {}
+    for n in config.concurrency:
+        semaphore = asyncio.Semaphore(n)
+
+        async def one(text: str) -> float:
+            async with semaphore:
+                start = time.perf_counter()
+                await ollama_client.apost_json(
+                    "/api/embed", {"model": model, "input": [text]}, timeout=config.timeout
+                )
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(t) for t in _texts(n * config.repeat, f"c{n}")))
+        elapsed = time.perf_counter() - start
+        results[str(n)] = {
+            "latency": LatencySummary.from_samples(latencies).to_dict(),
+            "texts_per_second": round(len(latencies) / elapsed, 3),
+        }
+    return results
+
+
+# ---------------- 对话模型 ----------------
+
+def build_prompt(tokens: int, tag: str) -> List[Dict[str, str]]:
+    """构造约 tokens 个 token 的用户消息（按一个汉字约一个 token 估算，实际值以服务端 usage 为准）。"""
+    body = (FILLER * (tokens // len(FILLER) + 1))[:max(tokens - 16, 1)]
+    return [{"role": "user", "content": f"[{tag}] {body}\n请用一句话总结以上内容。"}]
+
+
+def _chat_summary(streams: List[Any], elapsed: float) -> Dict[str, Any]:
+    report = summarize(streams, elapsed)
+    prompt_tokens = [s.stats.prompt_tokens for s in streams if s.stats.prompt_tokens]
+    report["prompt_tokens"] = (
+        round(sum(prompt_tokens) / len(prompt_tokens)) if prompt_tokens else None
+    )
+    return report
+
+
+async def measure_chat(model: str, config: ProbeConfig) -> Dict[str, Any]:
+    chat = AsyncChat(model, max_concurrency=1, temperature=0, max_tokens=config.max_tokens)
+    results = {}
+    for tokens in config.prompt_tokens:
+        start = time.perf_counter()
+        streams = [
+            await chat.chat(build_prompt(tokens, f"p{tokens}r{r}")) for r in range(config.repeat)
+        ]
+        results[str(tokens)] = _chat_summary(streams, time.perf_counter() - start)
+    return results
+
+
+async def measure_chat_concurrency(model: str, config: ProbeConfig) -> Dict[str, Any]:
+    results = {}
+    tokens = config.prompt_tokens[0]
+    for n in config.concurrency:
+        chat = AsyncChat(model, max_concurrency=n, temperature=0, max_tokens=config.max_tokens)
+        conversations = [build_prompt(tokens, f"c{n}-{i}") for i in range(n * config.repeat)]
+        start = time.perf_counter()
+        streams = await chat.chat_many(conversations)
+        results[str(n)] = _chat_summary(streams, time.perf_counter() - start)
+    return results
+
+
+# ---------------- 汇总 ----------------
+
+async def _section(result: Dict[str, Any], name: str, func: Any, *args: Any) -> None:
+    """执行一项测量，失败时记录错误而不中断其它模型 / 其它测量。"""
+    try:
+        value = func(*args)
+        result[name] = await value if asyncio.iscoroutine(value) else value
+    except Exception as e:  # noqa: BLE001
+        result[name] = {"error": f"{type(e).__name__}: {e}"}
+
+
+async def probe_model(model: str, config: ProbeConfig) -> Dict[str, Any]:
+    result = model_info(model)
+    await _section(result, "load", measure_load, model, result["kind"], config)
+    if result["kind"] == EMBEDDING:
+        await _section(result, "embedding", measure_embedding, model, config)
+        await _section(result, "concurrency", measure_embedding_concurrency, model, config)
+    else:
+        await _section(result, "chat", measure_chat, model, config)
+        await _section(result, "concurrency", measure_chat_concurrency, model, config)
+    return result
+
+
+async def aprobe(models: Optional[List[str]] = None,
+                 config: Optional[ProbeConfig] = None) -> Dict[str, Any]:
+    """对 models（默认全部已安装模型）逐个测量，返回可直接写成 JSON 的结果。"""
+    config = config or ProbeConfig()
+    models = models or list_models()
+    try:
+        version = _get_json("/api/version").get("version")
+    except Exception:  # noqa: BLE001
+        version = None
+    results = {}
+    for model in models:
+        print(f"测量 {model} ...", flush=True)
+        results[model] = await probe_model(model, config)
+    return {
+        "probe_version": PROBE_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {
+            "base_url": ollama_client.get_settings().base_url,
+            "hostname": platform.node(),
+            "platform": platform.platform(),
+            "ollama_version": version,
+        },
+        "config": asdict(config),
+        "models": results,
+    }
+
+
+def probe(models: Optional[List[str]] = None,
+          config: Optional[ProbeConfig] = None) -> Dict[str, Any]:
+    return asyncio.run(aprobe(models, config))
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    """把嵌套结果展开成 `a.b.c -> 数值`，只保留数值字段。"""
+    if isinstance(data, dict):
+        items: Dict[str, float] = {}
+        for key, value in data.items():
+            items.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        return {prefix: float(data)}
+    return {}
+
+
+def compare(
+    old: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.0
+) -> List[Dict[str, Any]]:
+    """逐项对比两份结果的模型指标，返回变化幅度不小于 threshold（百分比）的项。"""
+    before, after = flatten(old.get("models", {})), flatten(new.get("models", {}))
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key], after[key]
+        change = (b - a) / a * 100 if a else (0.0 if b == a else float("inf"))
+        if abs(change) >= threshold:
+            rows.append({"metric": key, "old": a, "new": b, "change_pct": round(change, 2)})
+    return rows
+
+
+def _list_command(_: argparse.Namespace) -> None:
+    try:
+        models = client.models.list()
+        print("成功列出模型：")
+        for m in models.data:
+            print(f"- {m.id}")
+    except Exception as e:
+        print("列模型失败:", str(e))
+
+
+def _probe_command(args: argparse.Namespace) -> None:
+    config = ProbeConfig(
+        batch_sizes=args.batch_sizes,
+        prompt_tokens=args.prompt_tokens,
+        concurrency=args.concurrency,
+        max_tokens=args.max_tokens,
+        repeat=args.repeat,
+        cold_load=not args.no_cold_load,
+    )
+    result = probe(args.models, config)
+    text = json.dumps(result, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+
+def _compare_command(args: argparse.Namespace) -> None:
+    with open(args.old, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    for row in compare(old, new, args.threshold):
+        print(f"{row['metric']}: {row['old']:.4g} -> {row['new']:.4g} ({row['change_pct']:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ollama 调试工具与模型性能探针")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="列出模型（默认）")
+
+    p = sub.add_parser("probe", help="测量加载、向量化、TTFT / 解码速度与并发吞吐")
+    p.add_argument("--models", nargs="+", help="默认测量全部已安装模型")
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--prompt-tokens", type=int, nargs="+", default=[16, 256, 1024])
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    p.add_argument("--max-tokens", type=int, default=64)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-cold-load", action="store_true", help="不卸载模型，跳过冷加载测量")
+    p.add_argument("-o", "--output", help="结果 JSON 路径，默认输出到终端")
+
+    c = sub.add_parser("compare", help="对比两份 probe 结果")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.0, help="只显示变化幅度不小于该百分比的指标")
+
+    args = parser.parse_args()
+    handlers = {"probe": _probe_command, "compare": _compare_command}
+    handlers.get(args.command, _list_command)(args)
+
 
 # 下面保持原样测试 models.list()
-try:
-    models = client.models.list()
-    print("成功列出模型：")
-    for m in models.data:
-        print(f"- {m.id}")
-except Exception as e:
-    print("列模型失败:", str(e))
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,310 @@
-import os
+import argparse
+import asyncio
 import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
-import httpx
+from src.common import ollama_client
+from src.common.stats import LatencySummary
+
+DEFAULT_MODEL = "qwen3:4b"
+DEFAULT_MESSAGES = [
+    {
+        "role": "system",
+        "content": "你是一个得力的助手, 名字是PI, 出生在2030年11月1日",
+    },
+    {"role": "user", "content": "你的千问么?"},
+]
 
 
 class SyncChat:
     """同步聊天客户端类
-    
+
     用于与本地Ollama服务进行同步聊天交互的客户端封装。
     主要功能：
-    - 初始化OpenAI客户端连接本地Ollama服务
+    - 复用进程级共享的 OpenAI 客户端连接本地Ollama服务
     - 提供流式聊天响应功能
-    - 配置HTTP连接参数和超时设置
+    - HTTP连接参数和超时设置由 src.common.ollama_client 统一配置
     - 处理模型推理过程中的reasoning和content内容
     """
     def __init__(self):
-        self.client = OpenAI(
-            base_url="http://127.0.0.1:11434/v1",
-            api_key="ollama",
-            http_client=httpx.Client(
-                timeout=httpx.Timeout(
-                    connect=10.0,  # 连接超时 10 秒
-                    read=60.0,  # 读取超时 60 秒
-                    write=60.0,
-                    pool=60.0,
-                ),
-                limits=httpx.Limits(
-                    max_connections=100,
-                    max_keepalive_connections=20,
-                    keepalive_expiry=45.0,
-                ),
-                http1=True,  # 强制 HTTP/1.1，避免 HTTP/2 兼容问题
-            ),
-        )
+        self.client = ollama_client.get_openai_client()
 
     def sync_chat_stream(self):
         return self.client.chat.completions.create(
-            model="qwen3:4b",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是一个得力的助手, 名字是PI, 出生在2030年11月1日",
-                },
-                {"role": "user", "content": "你的千问么?"},
-            ],
+            model=DEFAULT_MODEL,
+            messages=DEFAULT_MESSAGES,
             temperature=0.7,
             max_tokens=512,
             stream=True,
         )
 
 
+REASONING = "reasoning"
+CONTENT = "content"
+
+_END = object()
+
+
+@dataclass
+class ChatDelta:
+    """一段流式增量；kind 为 reasoning（推理过程）或 content（正文）。"""
+
+    kind: str
+    text: str
+
+
+@dataclass
+class ChatStreamStats:
+    """一次流式对话的时延统计（秒）。
+
+    ttft 为第一个 token（推理或正文）的延迟，first_content 为第一个正文 token 的延迟；
+    decode_tokens_per_second 按第一个到最后一个 token 之间的间隔计算，不含 prefill。
+    """
+
+    ttft: Optional[float] = None
+    first_content: Optional[float] = None
+    elapsed: float = 0.0
+    reasoning_tokens: int = 0
+    content_tokens: int = 0
+    prompt_tokens: Optional[int] = None  # 服务端在 usage 中报告的输入 / 输出 token 数
+    completion_tokens: Optional[int] = None
+    decode_seconds: float = 0.0
+    max_buffered: int = 0
+    cancelled: bool = False
+    error: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        return self.completion_tokens or (self.reasoning_tokens + self.content_tokens)
+
+    @property
+    def decode_tokens_per_second(self) -> float:
+        return (self.tokens - 1) / self.decode_seconds if self.decode_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ttft": self.ttft,
+            "first_content": self.first_content,
+            "elapsed": round(self.elapsed, 4),
+            "prompt_tokens": self.prompt_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "content_tokens": self.content_tokens,
+            "tokens": self.tokens,
+            "decode_tokens_per_second": round(self.decode_tokens_per_second, 2),
+            "max_buffered": self.max_buffered,
+            "cancelled": self.cancelled,
+            "error": self.error,
+        }
+
+
+class ChatStream:
+    """一次异步流式对话
+
+    后台任务读取模型的流式响应，把 reasoning / content 增量放入容量有限的队列，消费者用 async for 读取。
+    队列满时后台任务暂停读取响应（慢消费者只拖慢自己这一路，不会让内存无限增长）。
+    reasoning / content 分别累计在同名属性中，stats 记录 TTFT 与解码速度；cancel() 随时中止。
+    可能提前退出循环时用 `async with` 或 aclose()：否则后台任务阻塞在满队列上，一直占着并发名额。
+    """
+
+    def __init__(self, chat: "AsyncChat", messages: List[Dict[str, Any]], buffer_size: int):
+        self.messages = messages
+        self.reasoning = ""
+        self.content = ""
+        self.stats = ChatStreamStats()
+        self._chat = chat
+        self._queue: asyncio.Queue = asyncio.Queue(max(1, buffer_size))
+        self._task = asyncio.ensure_future(self._produce())
+        self._finished = False
+
+    async def _produce(self) -> None:
+        stats = self.stats
+        start = time.perf_counter()
+        first = last = None
+        try:
+            async with self._chat.semaphore:
+                response = await self._chat.client.chat.completions.create(
+                    model=self._chat.model,
+                    messages=self.messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **self._chat.params,
+                )
+                try:
+                    async for chunk in response:
+                        if chunk.usage is not None:
+                            stats.prompt_tokens = chunk.usage.prompt_tokens
+                            stats.completion_tokens = chunk.usage.completion_tokens
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        # Ollama 的推理模型把思考过程放在 delta.reasoning（DeepSeek 为 reasoning_content）
+                        reasoning = (getattr(delta, "reasoning", None)
+                                     or getattr(delta, "reasoning_content", None))
+                        for kind, text in ((REASONING, reasoning), (CONTENT, delta.content)):
+                            if not text:
+                                continue
+                            last = time.perf_counter() - start
+                            if first is None:
+                                first = stats.ttft = last
+                            if kind == CONTENT:
+                                stats.content_tokens += 1
+                                if stats.first_content is None:
+                                    stats.first_content = last
+                                self.content += text
+                            else:
+                                stats.reasoning_tokens += 1
+                                self.reasoning += text
+                            await self._queue.put(ChatDelta(kind, text))
+                            stats.max_buffered = max(stats.max_buffered, self._queue.qsize())
+                finally:
+                    await response.close()
+        except asyncio.CancelledError:
+            # 被 cancel() 中止：丢弃未消费的增量，让等待中的消费者立即结束
+            stats.cancelled = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        except Exception as e:  # noqa: BLE001  错误记录在 stats 中，由调用方决定如何处理
+            stats.error = f"{type(e).__name__}: {e}"
+        finally:
+            stats.elapsed = time.perf_counter() - start
+            if first is not None:
+                stats.decode_seconds = last - first
+        await self._queue.put(_END)
+
+    def __aiter__(self) -> "ChatStream":
+        return self
+
+    async def __anext__(self) -> ChatDelta:
+        if self._finished:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is _END:
+            self._finished = True
+            raise StopAsyncIteration
+        return item
+
+    @property
+    def done(self) -> bool:
+        return self._task.done()
+
+    def cancel(self) -> bool:
+        """中止这一路对话（关闭响应、释放并发名额）；已结束时返回 False。"""
+        return self._task.cancel()
+
+    async def aclose(self) -> None:
+        """取消后台任务并等待它关闭响应、释放并发名额（已结束时无操作）。"""
+        if not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                # 任务尚未开始运行就被取消，_produce 没有机会记录
+                self.stats.cancelled = True
+        self._finished = True
+
+    async def __aenter__(self) -> "ChatStream":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def wait(self) -> "ChatStream":
+        """不逐段消费，直接等待整段回答完成（内部仍按队列容量分批读取）。"""
+        async for _ in self:
+            pass
+        await self._task
+        return self
+
+
+class AsyncChat:
+    """异步聊天客户端类
+
+    SyncChat 的异步版本，所有对话共用 src.common.ollama_client 的异步 OpenAI 客户端（同一个 httpx 连接池）：
+    - stream() 立即开始一路流式对话并返回 ChatStream，可同时发起多路
+    - max_concurrency 限制同时向模型发出的请求数（建议不超过 OLLAMA_MAX_CONNECTIONS），多出的在客户端排队
+    - buffer_size 为每一路的增量缓冲容量
+    - cancel_all() 中止所有未完成的对话
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        max_concurrency: int = 8,
+        buffer_size: int = 32,
+        **params: Any,
+    ):
+        self.client = ollama_client.get_async_openai_client()
+        self.model = model
+        self.params = {"temperature": 0.7, "max_tokens": 512, **params}
+        self.buffer_size = buffer_size
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._streams: List[ChatStream] = []
+
+    def stream(self, messages: Optional[List[Dict[str, Any]]] = None) -> ChatStream:
+        self._streams = [s for s in self._streams if not s.done]
+        stream = ChatStream(self, messages or DEFAULT_MESSAGES, self.buffer_size)
+        self._streams.append(stream)
+        return stream
+
+    async def chat(self, messages: Optional[List[Dict[str, Any]]] = None) -> ChatStream:
+        return await self.stream(messages).wait()
+
+    async def chat_many(self, conversations: List[List[Dict[str, Any]]]) -> List[ChatStream]:
+        """并发执行多路对话，按输入顺序返回。"""
+        return list(await asyncio.gather(*(self.chat(m) for m in conversations)))
+
+    def cancel_all(self) -> int:
+        return sum(stream.cancel() for stream in self._streams)
+
+
+def summarize(streams: List[ChatStream], elapsed: float) -> Dict[str, Any]:
+    """汇总多路对话的 TTFT 分位数、解码速度与总吞吐。"""
+    ok = [s.stats for s in streams if s.stats.error is None and not s.stats.cancelled]
+    tokens = sum(s.tokens for s in ok)
+    return {
+        "streams": len(streams),
+        "failures": len(streams) - len(ok),
+        "elapsed": round(elapsed, 4),
+        "ttft": LatencySummary.from_samples([s.ttft for s in ok if s.ttft is not None]).to_dict(),
+        "decode_tokens_per_second": LatencySummary.from_samples(
+            [s.decode_tokens_per_second for s in ok]
+        ).to_dict(),
+        "total_tokens_per_second": round(tokens / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def async_chat_demo(concurrency: int) -> Dict[str, Any]:
+    chat = AsyncChat(max_concurrency=concurrency)
+    start = time.perf_counter()
+    streams = await chat.chat_many([DEFAULT_MESSAGES] * concurrency)
+    report = summarize(streams, time.perf_counter() - start)
+    print(f"[reasoning] {streams[0].reasoning}")
+    print(f"[content] {streams[0].content}")
+    return report
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="同步 / 异步流式聊天示例")
+    parser.add_argument("-c", "--concurrency", type=int, default=0,
+                        help="大于 0 时用 AsyncChat 并发发起 N 路流式对话并输出 TTFT 与解码速度")
+    args = parser.parse_args()
+
     start_time = time.time()
     try:
-        res = SyncChat().sync_chat_stream()
-        for i in res:
-            if not i.choices:
-                continue
-            delta = i.choices[0].delta
-            # Ollama qwen3 等推理模型把内容放在 delta.reasoning，正文在 delta.content
-            part = (delta.content or "") + (getattr(delta, "reasoning", None) or "")
-            if part:
-                print(part, end="")
-        print()  # 结尾换行
+        if args.concurrency > 0:
+            print(asyncio.run(async_chat_demo(args.concurrency)))
+        else:
+            res = SyncChat().sync_chat_stream()
+            for i in res:
+                if not i.choices:
+                    continue
+                delta = i.choices[0].delta
+                # Ollama qwen3 等推理模型把内容放在 delta.reasoning，正文在 delta.content
+                part = (delta.content or "") + (getattr(delta, "reasoning", None) or "")
+                if part:
+                    print(part, end="")
+            print()  # 结尾换行
     except Exception as e:
         print(f"请求失败: {e}")
     print(f"耗时: {time.time() - start_time:.2f}s")
@@ -0,0 +1,237 @@
+"""Markdown 知识库的通用流程：载入 → 语义切分 → Ollama 向量化 → 写入向量库 → 检索问答。
+
+该模块从 sync_embedding.py / sync_embedding_v2.py 中抽取出与存储后端无关的部分，
+具体后端通过 `VectorStore` 协议注入（见 vector_store.py）。
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from src.common import ollama_client, tracing
+from src.rag.vector_store import SearchHit, VectorRecord, VectorStore
+
+
+# 本地Ollama地址，可通过 OLLAMA_BASE_URL 环境变量覆盖
+OLLAMA_BASE_URL = ollama_client.get_settings().base_url
+EMBEDDING_MODEL = "turingdance/m3e-base"  # 本地Ollama的嵌入模型,用于向量化文本
+LLM_MODEL = "granite4:3b"  # 本地Ollama的LLM模型,用于生成答案
+# m3e-base 常见向量维度
+EMBEDDING_DIM = 768
+
+PROMPT_TEMPLATE = """你是公司内部政策助手，请严格依据下列资料回答问题，只能使用资料中的信息，不要编造。
+
+资料：
+{context}
+
+问题：{query}
+"""
+
+
+@dataclass
+class SimpleDoc:
+    page_content: str
+    metadata: dict
+
+
+def embed_text(text: str) -> List[float]:
+    """使用本地 Ollama 的 turingdance/m3e-base 生成向量（走共享连接池）。"""
+    return ollama_client.embed(text, EMBEDDING_MODEL, timeout=60)
+
+
+def load_markdown(file_path: str) -> List[SimpleDoc]:
+    """使用 UnstructuredMarkdownLoader 载入 Markdown 文件。"""
+    from langchain_community.document_loaders import UnstructuredMarkdownLoader
+
+    docs = UnstructuredMarkdownLoader(file_path).load()
+    return [SimpleDoc(page_content=d.page_content, metadata=d.metadata or {}) for d in docs]
+
+
+def chunk_text_semantic(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """按 Markdown 标题与段落边界切分，超长时再按长度与重叠切分，尽量不截断句意。"""
+    if not text.strip():
+        return []
+
+    # 1. 按 Markdown 标题切分（保留标题与其后内容在同一块）
+    header_pattern = re.compile(r"(?m)^(?=#{1,6}\s)", re.MULTILINE)
+    sections = [s.strip() for s in header_pattern.split(text) if s.strip()]
+
+    chunks: List[str] = []
+    for section in sections:
+        if len(section) <= chunk_size:
+            chunks.append(section)
+            continue
+        # 2. 超长段落再按「双换行」拆成段落
+        paragraphs = [p.strip() for p in section.split("\n\n") if p.strip()]
+        current: List[str] = []
+        current_len = 0
+        for para in paragraphs:
+            if current_len + len(para) + 2 <= chunk_size:
+                current.append(para)
+                current_len += len(para) + 2
+            else:
+                if current:
+                    chunks.append("\n\n".join(current))
+                if len(para) <= chunk_size:
+                    current = [para]
+                    current_len = len(para) + 2
+                else:
+                    # 3. 单段仍超长：按句/行边界切，再按长度+重叠
+                    for sub in split_long_paragraph(para, chunk_size, chunk_overlap):
+                        chunks.append(sub)
+                    current = []
+                    current_len = 0
+        if current:
+            chunks.append("\n\n".join(current))
+
+    return chunks
+
+
+def split_long_paragraph(
+    paragraph: str, chunk_size: int = 1000, chunk_overlap: int = 200
+) -> List[str]:
+    """将超长单段按句/行切分，再按 chunk_size 与 chunk_overlap 滑动。"""
+    # 先按句子边界切（中英文句号、换行）
+    parts = re.split(r"(?<=[。！？.!?\n])", paragraph)
+    parts = [p.strip() for p in parts if p.strip()]
+    if not parts:
+        parts = [paragraph]
+
+    result: List[str] = []
+    buf: List[str] = []
+    buf_len = 0
+    for p in parts:
+        if buf_len + len(p) + 1 <= chunk_size:
+            buf.append(p)
+            buf_len += len(p) + 1
+        else:
+            if buf:
+                result.append("".join(buf))
+            # 当前片段仍超长则按固定长度+重叠切
+            if len(p) > chunk_size:
+                step = max(1, chunk_size - chunk_overlap)
+                start = 0
+                while start < len(p):
+                    result.append(p[start: start + chunk_size])
+                    start += step
+                buf = []
+                buf_len = 0
+            else:
+                buf = [p]
+                buf_len = len(p) + 1
+    if buf:
+        result.append("".join(buf))
+    return result
+
+
+def split_documents(
+    docs: List[SimpleDoc], chunk_size: int = 1000, chunk_overlap: int = 200
+) -> List[SimpleDoc]:
+    """对载入的文档逐个切块，保留原始元数据。"""
+    split_docs: List[SimpleDoc] = []
+    for doc in docs:
+        meta = doc.metadata or {}
+        for chunk_text in chunk_text_semantic(doc.page_content, chunk_size, chunk_overlap):
+            if chunk_text.strip():
+                split_docs.append(SimpleDoc(page_content=chunk_text, metadata=meta))
+    return split_docs
+
+
+class KnowledgeBase:
+    """与存储后端无关的 Markdown 知识库同步与问答流程。
+
+    子类（或调用方）只需提供一个实现了 `VectorStore` 协议的 store。
+    """
+
+    def __init__(
+        self, store: VectorStore, chunk_size: int = 1000, chunk_overlap: int = 200
+    ) -> None:
+        # 切分参数
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.store = store
+
+        # 本地 Ollama LLM（OpenAI 兼容接口，复用共享连接池）
+        self.llm = ollama_client.get_chat_model(LLM_MODEL, temperature=0)
+
+    def embedding(self, text: str) -> List[float]:
+        """使用本地 Ollama 的 turingdance/m3e-base 生成向量。"""
+        return embed_text(text)
+
+    def insert_vector(self, file_path: str) -> int:
+        """从 Markdown 文件载入知识库，切分、向量化并写入向量库。
+
+        返回写入的文档块数量。
+        """
+        with tracing.span("rag.insert", file=os.path.basename(file_path)) as insert_span:
+            with tracing.span("rag.load") as sp:
+                docs = load_markdown(file_path)
+                size = sum(len(d.page_content.encode()) for d in docs)
+                sp.set_attributes(docs=len(docs), bytes=size)
+            with tracing.span("rag.chunk", chunk_size=self.chunk_size) as sp:
+                split_docs = split_documents(docs, self.chunk_size, self.chunk_overlap)
+                sp.set_attribute("chunks", len(split_docs))
+            if not split_docs:
+                return 0
+
+            # 使用「文件名 + 序号」作为唯一 id，避免多次 insert 不同文件时 id 冲突导致后写入的文档无法入库
+            base_name = os.path.basename(file_path)
+            with tracing.span("rag.embed", chunks=len(split_docs)) as sp:
+                records = [
+                    VectorRecord(
+                        id=f"{base_name}_{idx}",
+                        vector=self.embedding(doc.page_content),
+                        content=doc.page_content,
+                        metadata=doc.metadata,
+                    )
+                    for idx, doc in enumerate(split_docs, start=1)
+                ]
+                sp.set_attribute("bytes", sum(len(r.content.encode()) for r in records))
+            backend = type(self.store).__name__
+            with tracing.span("rag.store.upsert", backend=backend, rows=len(records)):
+                self.store.upsert(records)
+            insert_span.set_attribute("rows", len(records))
+            return len(records)
+
+    def query_vector(self, query: str, n_results: int = 3) -> Tuple[str, List[SearchHit]]:
+        """从向量库检索并用 LLM 生成答案。
+
+        返回 (answer, hits)。hits 为各后端统一的 SearchHit 列表；拆分出 VectorStore 之前，
+        Chroma 版返回原始结果字典、Milvus 版返回原始结果列表，调用方需改为读取 hit.content 等字段。
+        """
+        with tracing.span("rag.query", top_k=n_results):
+            with tracing.span("rag.embed_query", bytes=len(query.encode())):
+                query_emb = self.embedding(query)
+            with tracing.span("rag.search", backend=type(self.store).__name__) as sp:
+                hits = self.store.search(query_emb, top_k=n_results)
+                sp.set_attribute("hits", len(hits))
+            contents = [h.content for h in hits if h.content]
+            if not contents:
+                return "未检索到相关信息。", hits
+
+            prompt = PROMPT_TEMPLATE.format(context="\n".join(contents), query=query)
+            with tracing.span("rag.generate", model=LLM_MODEL, prompt_chars=len(prompt)) as sp:
+                llm_res = self.llm.invoke(prompt)
+                answer = llm_res.content if hasattr(llm_res, "content") else str(llm_res)
+                sp.set_attribute("answer_chars", len(answer))
+            return answer, hits
+
+    def _chunk_text_semantic(self, text: str) -> List[str]:
+        return chunk_text_semantic(text, self.chunk_size, self.chunk_overlap)
+
+    def _split_long_paragraph(self, paragraph: str) -> List[str]:
+        return split_long_paragraph(paragraph, self.chunk_size, self.chunk_overlap)
+
+    def ask_with_knowledge_base(self, kb_file_name: str, question: str) -> Tuple[int, str]:
+        """给定知识库文件路径或名称，同步向量后对提问进行检索问答。
+
+        若 kb_file_name 非绝对路径，则相对于本脚本所在目录解析。
+        返回 (写入的文档块数, 答案)。
+        """
+        if not os.path.isabs(kb_file_name):
+            kb_file_name = os.path.join(os.path.dirname(__file__), kb_file_name)
+        with tracing.span("rag.ask_with_knowledge_base", question_chars=len(question)):
+            inserted = self.insert_vector(kb_file_name)
+            answer, _ = self.query_vector(question)
+        return inserted, answer
@@ -1,9 +1,18 @@
-import requests
-import chromadb
+import hashlib
+import json
+import os
+import threading
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import httpx
+
+from src.common import ollama_client
 
 # ===================== 1. 配置Ollama参数 =====================
-OLLAMA_BASE_URL = "http://localhost:11434"
+# Ollama 地址与连接池配置统一由 src.common.ollama_client 管理（OLLAMA_BASE_URL 环境变量可覆盖）
+OLLAMA_BASE_URL = ollama_client.get_settings().base_url
 # 可选：嵌入模型（mokaai/m3e-base 做本地知识库时, 使用这个模型）
 EMBEDDING_MODEL = "turingdance/m3e-base"
 # 生成式LLM (不同的模型验证效果)
@@ -14,17 +23,9 @@ LLM_MODEL = "granite4:3b"
 
 # ===================== 2. 封装Ollama API调用函数 =====================
 def get_embedding(text):
-    """调用Ollama Embeddings API生成向量"""
-    url = f"{OLLAMA_BASE_URL}/api/embeddings"
-    data = {
-        "model": EMBEDDING_MODEL,
-        "prompt": text,
-        "options": {"temperature": 0.0}  # 向量化无需随机性
-    }
+    """调用Ollama Embeddings API生成向量（向量化无需随机性，temperature 固定为 0）"""
     try:
-        response = requests.post(url, json=data, timeout=30)
-        response.raise_for_status()  # 抛出HTTP错误
-        return response.json()["embedding"]
+        return ollama_client.embed(text, EMBEDDING_MODEL, timeout=30)
     except Exception as e:
         print(f"向量化失败：{e}")
         return None
@@ -32,7 +33,6 @@ def get_embedding(text):
 
 def generate_answer(prompt):
     """调用 Ollama 的 OpenAI /v1/chat 接口生成回答"""
-    url = f"{OLLAMA_BASE_URL}/v1/chat/completions"
     data = {
         "model": LLM_MODEL,
         "messages": [{"role": "user", "content": prompt}],
@@ -40,9 +40,7 @@ def generate_answer(prompt):
         "stream": False,
     }
     try:
-        response = requests.post(url, json=data, timeout=60)
-        response.raise_for_status()
-        result = response.json()
+        result = ollama_client.chat_completion(data, timeout=60)
         choices = result.get("choices") or []
         if not choices:
             print(f"警告：模型未返回choices，原始响应: {result}")
@@ -52,10 +50,10 @@ def generate_answer(prompt):
         if not answer:
             print(f"警告：模型返回空content，原始响应: {result}")
         return answer
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         print("生成回答失败：请求超时，请检查模型是否已下载")
         return None
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("生成回答失败：无法连接到Ollama服务")
         return None
     except Exception as e:
@@ -63,12 +61,31 @@ def generate_answer(prompt):
         return None
 
 
-def build_collection(texts):
-    """根据传入的知识库文本创建临时向量库集合，并返回集合对象。"""
-    client = chromadb.Client()
-    # 使用随机名称，避免与已有集合冲突
-    collection_name = f"kb_{uuid.uuid4().hex}"
-    collection = client.create_collection(name=collection_name)
+def _chroma_client():
+    """进程内共享的 Chroma 内存客户端（chromadb 导入较慢，只在真正建库时才加载）。"""
+    import chromadb
+
+    return chromadb.Client()
+
+
+def collection_key(texts, embedding_model=None):
+    """以嵌入模型和文本列表计算缓存键：文本或模型任一变化都会得到新的集合。"""
+    payload = json.dumps([embedding_model or EMBEDDING_MODEL, list(texts)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_collection(texts, name=None):
+    """根据传入的知识库文本创建向量库集合，并返回集合对象。
+
+    name 为空时使用随机名称，避免与已有集合冲突；指定 name 时同名的旧集合会先删除再重建。
+    """
+    client = _chroma_client()
+    collection_name = name or f"kb_{uuid.uuid4().hex}"
+    if name:
+        try:
+            client.delete_collection(collection_name)
+        except Exception:  # noqa: BLE001  集合不存在
+            pass
 
     embeddings = []
     valid_texts = []
@@ -84,6 +101,7 @@ def build_collection(texts):
         print("知识库向量化失败：所有文本均向量化失败")
         return None
 
+    collection = client.create_collection(name=collection_name)
     collection.add(
         ids=ids,
         embeddings=embeddings,
@@ -93,15 +111,116 @@ def build_collection(texts):
     return collection
 
 
+class CollectionCache:
+    """已构建集合的 LRU 缓存
+
+    相同的知识库文本（且嵌入模型相同）在多次 rag_answer 之间复用同一个集合，不再重复向量化。
+    集合数超过 max_collections 或文档总数超过 max_documents 时淘汰最久未使用的集合，
+    并从 Chroma 客户端中删除，内存占用不随调用次数增长。
+    向量化与建库在锁外进行：不同知识库可以并行构建，同一知识库的并发请求等待第一个请求的结果，只向量化一次。
+    只缓存全部文本都向量化成功的集合；部分文本失败时本次照常返回不完整的集合，但不缓存，下次调用重新构建。
+    """
+
+    def __init__(self, max_collections=8, max_documents=10000):
+        self.max_collections = max_collections
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        # 键 -> (集合, 文档数)
+        self._entries = OrderedDict()
+        # 键 -> 正在构建的 Future，同一知识库的并发请求共享
+        self._building = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, texts):
+        key = collection_key(texts)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            building = self._building.get(key)
+            owner = building is None
+            if owner:
+                self.misses += 1
+                building = self._building[key] = Future()
+            else:
+                self.hits += 1
+        if not owner:
+            return building.result()
+
+        collection = None
+        try:
+            collection = build_collection(texts, name=f"kb_{key[:32]}")
+            count = collection.count() if collection is not None else 0
+        finally:
+            with self._lock:
+                del self._building[key]
+                # 构建失败或有文本向量化失败（集合不完整）时不缓存，下次重试
+                if collection is not None and count == len(texts):
+                    self._entries[key] = (collection, count)
+                    self._evict(keep=key)
+            building.set_result(collection)
+        return collection
+
+    def _evict(self, keep):
+        # 删除集合很快，放在锁内：否则同名集合可能已被并发请求重建，随后被误删
+        documents = sum(count for _, count in self._entries.values())
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_collections or documents > self.max_documents
+        ):
+            key = next(iter(self._entries))
+            if key == keep:  # 刚构建的集合本身超出预算时保留，下次插入时再淘汰
+                break
+            collection, count = self._entries.pop(key)
+            documents -= count
+            self.evictions += 1
+            self._drop(collection)
+
+    @staticmethod
+    def _drop(collection):
+        try:
+            _chroma_client().delete_collection(collection.name)
+        except Exception as e:  # noqa: BLE001  已被删除的集合无需处理
+            print(f"删除集合 {collection.name} 失败：{e}")
+
+    def clear(self):
+        """删除所有缓存的集合。"""
+        with self._lock:
+            for collection, _ in self._entries.values():
+                self._drop(collection)
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "collections": len(self._entries),
+                "documents": sum(count for _, count in self._entries.values()),
+            }
+
+
+# 进程级缓存；容量可通过环境变量调整
+collection_cache = CollectionCache(
+    max_collections=int(os.getenv("RAG_COLLECTION_CACHE_SIZE", "8")),
+    max_documents=int(os.getenv("RAG_COLLECTION_CACHE_DOCUMENTS", "10000")),
+)
+
+
 # ===================== 3. RAG核心流程：检索 + 生成 =====================
 def rag_answer(question, texts):
     """完整RAG流程：问题向量化 → 检索相关文档 → 生成回答。
 
     参数：
         question: 用户问题字符串
-        texts: 知识库文本列表，每个元素是一条文档
+        texts: 知识库文本列表，每个元素是一条文档；相同的文本列表复用缓存的集合
     """
-    collection = build_collection(texts)
+    collection = collection_cache.get(texts)
     if not collection:
         return "知识库构建失败，请检查向量化服务"
 
@@ -0,0 +1,264 @@
+"""向量库后端抽象
+
+`VectorStore` 协议约定了知识库所需的最小存储能力（add/upsert/delete/search/count），
+Chroma 与 Milvus Lite 各提供一个适配器，使切分、向量化与问答逻辑不再绑定具体后端，
+也便于在同一份数据上横向对比不同后端的性能。
+"""
+
+import hashlib
+import os
+import sys
+import types
+from dataclasses import dataclass, field
+from typing import List, Optional, Protocol, Sequence, runtime_checkable
+
+
+@dataclass
+class VectorRecord:
+    """写入向量库的一条记录。"""
+
+    id: str
+    vector: List[float]
+    content: str
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class SearchHit:
+    """一条检索结果。
+
+    score 的含义取决于后端度量：Chroma 默认返回 L2 距离（越小越相似），
+    Milvus Lite 使用 COSINE 相似度（越大越相似）。
+    """
+
+    id: str
+    score: float
+    content: str
+    metadata: dict = field(default_factory=dict)
+
+
+@runtime_checkable
+class VectorStore(Protocol):
+    """知识库使用的向量存储协议。"""
+
+    def add(self, records: Sequence[VectorRecord]) -> None:
+        """写入新记录，id 已存在时的行为由后端决定。"""
+        ...
+
+    def upsert(self, records: Sequence[VectorRecord]) -> None:
+        """按 id 写入或覆盖记录。"""
+        ...
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """按 id 删除记录。"""
+        ...
+
+    def search(self, vector: List[float], top_k: int = 3) -> List[SearchHit]:
+        """返回与 vector 最相近的 top_k 条记录。"""
+        ...
+
+    def count(self) -> int:
+        """返回当前记录数。"""
+        ...
+
+
+def directory_size(path: str) -> int:
+    """统计文件或目录在磁盘上占用的字节数，用于比较不同后端的存储开销。"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.isfile(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+class ChromaVectorStore:
+    """基于 chromadb.PersistentClient 的向量库适配器。"""
+
+    def __init__(self, collection_name: str, path: str = "./my_local_chroma_kb") -> None:
+        import chromadb
+
+        self.path = path
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+
+    @staticmethod
+    def _columns(records: Sequence[VectorRecord]) -> dict:
+        # Chroma 不接受空 dict 作为 metadata，空元数据以 None 传入
+        return {
+            "ids": [r.id for r in records],
+            "embeddings": [r.vector for r in records],
+            "documents": [r.content for r in records],
+            "metadatas": [r.metadata or None for r in records],
+        }
+
+    def add(self, records: Sequence[VectorRecord]) -> None:
+        if records:
+            self.collection.add(**self._columns(records))
+
+    def upsert(self, records: Sequence[VectorRecord]) -> None:
+        if records:
+            self.collection.upsert(**self._columns(records))
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def search(self, vector: List[float], top_k: int = 3) -> List[SearchHit]:
+        results = self.collection.query(query_embeddings=[vector], n_results=top_k)
+        ids = (results.get("ids") or [[]])[0]
+        docs = (results.get("documents") or [[]])[0]
+        distances = (results.get("distances") or [[]])[0]
+        metadatas = (results.get("metadatas") or [[]])[0]
+        hits: List[SearchHit] = []
+        for i, doc_id in enumerate(ids):
+            hits.append(
+                SearchHit(
+                    id=doc_id,
+                    score=float(distances[i]) if i < len(distances) else 0.0,
+                    content=docs[i] if i < len(docs) else "",
+                    metadata=(metadatas[i] if i < len(metadatas) else None) or {},
+                )
+            )
+        return hits
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+def _ensure_pkg_resources() -> None:
+    """Milvus Lite 依赖 pkg_resources，在 Python 3.12 等环境中可能不可用，用 importlib.metadata 兜底。"""
+    if "pkg_resources" in sys.modules:
+        return
+    try:
+        import pkg_resources  # noqa: F401  # type: ignore[import-not-found]
+    except ModuleNotFoundError:
+        import importlib.metadata
+        _pr = types.ModuleType("pkg_resources")
+        _pr.DistributionNotFound = type("DistributionNotFound", (Exception,), {})
+
+        def _get_distribution(name):
+            try:
+                return importlib.metadata.distribution(name)
+            except importlib.metadata.PackageNotFoundError:
+                raise _pr.DistributionNotFound()
+
+        _pr.get_distribution = _get_distribution
+        sys.modules["pkg_resources"] = _pr
+
+
+class MilvusLiteVectorStore:
+    """基于 Milvus Lite（MilvusClient 本地文件）的向量库适配器。
+
+    Milvus 快速建表使用 int64 主键，这里由字符串 id 稳定地哈希得到主键，
+    原始 id 存在动态字段 doc_id 中，从而支持按字符串 id 覆盖与删除。
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        db_path: str = "./my_local_milvus_kb.db",
+        dimension: int = 768,
+    ) -> None:
+        _ensure_pkg_resources()
+        from pymilvus import MilvusClient
+
+        self.path = db_path
+        self.collection_name = collection_name
+        self.dimension = dimension
+        self.client = MilvusClient(db_path)
+        if not self.client.has_collection(collection_name):
+            self.client.create_collection(
+                collection_name=collection_name,
+                dimension=dimension,
+                metric_type="COSINE",
+                enable_dynamic_field=True,
+            )
+
+    @staticmethod
+    def primary_key(doc_id: str) -> int:
+        """将字符串 id 映射为非负 int64 主键。"""
+        digest = hashlib.sha1(doc_id.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") >> 1
+
+    def _rows(self, records: Sequence[VectorRecord]) -> List[dict]:
+        rows = []
+        for r in records:
+            row = dict(r.metadata or {})
+            row.update({
+                "id": self.primary_key(r.id),
+                "vector": r.vector,
+                "content": r.content,
+                "doc_id": r.id,
+            })
+            rows.append(row)
+        return rows
+
+    def add(self, records: Sequence[VectorRecord]) -> None:
+        if records:
+            self.client.insert(collection_name=self.collection_name, data=self._rows(records))
+
+    def upsert(self, records: Sequence[VectorRecord]) -> None:
+        if records:
+            self.client.upsert(collection_name=self.collection_name, data=self._rows(records))
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                ids=[self.primary_key(i) for i in ids],
+            )
+
+    def search(self, vector: List[float], top_k: int = 3) -> List[SearchHit]:
+        results = self.client.search(
+            collection_name=self.collection_name,
+            data=[vector],
+            limit=top_k,
+            output_fields=["*"],
+            search_params={"metric_type": "COSINE"},
+        )
+        if not results or not results[0]:
+            return []
+        hits: List[SearchHit] = []
+        for h in results[0]:
+            entity = dict(h.get("entity") or {})
+            content = entity.pop("content", "") or ""
+            doc_id = entity.pop("doc_id", None) or str(h.get("id"))
+            entity.pop("vector", None)
+            entity.pop("id", None)
+            hits.append(
+                SearchHit(
+                    id=doc_id,
+                    score=float(h.get("distance", 0.0)),
+                    content=content,
+                    metadata=entity,
+                )
+            )
+        return hits
+
+    def count(self) -> int:
+        res = self.client.query(
+            collection_name=self.collection_name,
+            filter="",
+            output_fields=["count(*)"],
+        )
+        if not res:
+            return 0
+        return int(res[0].get("count(*)", 0))
+
+
+def create_vector_store(
+    backend: str, collection_name: str, path: Optional[str] = None, **kwargs
+) -> VectorStore:
+    """按名称创建向量库适配器，backend 取 "chroma" 或 "milvus"。"""
+    if backend == "chroma":
+        return ChromaVectorStore(collection_name, path=path or "./my_local_chroma_kb")
+    if backend == "milvus":
+        return MilvusLiteVectorStore(
+            collection_name, db_path=path or "./my_local_milvus_kb.db", **kwargs
+        )
+    raise ValueError(f"未知的向量库后端: {backend!r}，可选: chroma, milvus")